@@ -0,0 +1,178 @@
+"""
+Fan-out of concurrent agent calls: threads versus the shared asyncio loop.
+
+Issues N concurrent calls against local stand-ins with a fixed service
+latency, once through the synchronous clients on a thread pool and once
+through the async clients gathered on common.aio's loop. Scenarios are
+Bedrock embeddings, OpenSearch searches and full hybrid searches (embed,
+then both legs; without MMR, whose vectors would make the stand-in's JSON
+encoding the bottleneck). Reports wall time, calls/s, per-call p50/p99 and the
+threads each approach used. The stand-ins run in child processes so their
+server threads don't compete with the client for the GIL.
+
+    python bench/bench_async_fanout.py --calls 100 --latency-ms 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lambdas'))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+os.environ.setdefault("EMBEDDINGS_MODEL_ID", "amazon.titan-embed-text-v2:0")
+
+import boto3
+from botocore.config import Config
+
+from common import aio, embeddings, retrieval
+from common.vector_store import VectorStore
+from standins import ChildStandIn
+
+
+def percentiles(samples):
+    ms = np.asarray(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 1),
+            "p99_ms": round(float(np.percentile(ms, 99)), 1)}
+
+
+class PeakThreads:
+    """
+    Samples threading.active_count() while a block runs
+    """
+    def __enter__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(0.002):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def run_threads(call, n, workers):
+    latencies = []
+
+    def one(i):
+        start = time.perf_counter()
+        call(i)
+        latencies.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(one, range(n)))  # warm the pool, as for asyncio below
+        latencies.clear()
+        with PeakThreads() as threads:
+            wall = timed(lambda: list(pool.map(one, range(n))))
+    return wall, latencies, threads.peak
+
+
+def run_async(acall, n):
+    latencies = []
+
+    async def one(i):
+        start = time.perf_counter()
+        await acall(i)
+        latencies.append(time.perf_counter() - start)
+
+    async def fan_out():
+        await asyncio.gather(*(one(i) for i in range(n)))
+
+    aio.run(fan_out())  # warm the pool so both sides start with open connections
+    latencies.clear()
+    with PeakThreads() as threads:
+        wall = timed(lambda: aio.run(fan_out()))
+    return wall, latencies, threads.peak
+
+
+def row(name, n, wall, latencies, threads):
+    return {"approach": name, "wall_ms": round(wall * 1000, 1), "calls_per_s": round(n / wall, 1),
+            **percentiles(latencies), "peak_threads": threads}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--docs", type=int, default=2000)
+    args = parser.parse_args()
+    n = args.calls
+
+    path = tempfile.mkdtemp(prefix="fanout_bench_")
+    rng = np.random.default_rng(0)
+    VectorStore.build(path, rng.standard_normal((args.docs, args.dim), dtype=np.float32),
+                      [{"_id": f"d{i}", "title": f"doc {i}", "body": f"pricing savings compute {i}",
+                        "file_path": f"docs/{i}.md", "chunk_index": 0} for i in range(args.docs)])
+    query = {"size": 8, "query": {"multi_match": {"query": "pricing", "fields": ["title^2", "body"]}}}
+
+    results = {}
+    # Started before the first aio.run, while this process has no extra threads to fork
+    with ChildStandIn("bedrock", latency_ms=args.latency_ms, dim=args.dim) as bedrock, \
+            ChildStandIn("opensearch", path, latency_ms=args.latency_ms) as opensearch:
+        os.environ["BEDROCK_ENDPOINT_URL"] = bedrock.url
+        retrieval.OS = opensearch.url
+
+        # boto3's default pool holds 10 connections; also show it sized to the fan-out
+        clients = {pool: boto3.client("bedrock-runtime", endpoint_url=bedrock.url,
+                                      config=Config(max_pool_connections=pool)) for pool in (10, n)}
+
+        def embed_with(client):
+            def call(i):
+                embeddings.bedrock = client
+                return embeddings.embed(f"query {i}")
+            return call
+
+        scenarios = {
+            "embed": [
+                ("threads, boto3 pool 10", lambda: run_threads(embed_with(clients[10]), n, n)),
+                (f"threads, boto3 pool {n}", lambda: run_threads(embed_with(clients[n]), n, n)),
+                ("asyncio", lambda: run_async(lambda i: embeddings.aembed(f"query {i}"), n)),
+            ],
+            "opensearch": [
+                ("threads", lambda: run_threads(lambda i: retrieval.os_post("/documents/_search", query), n, n)),
+                ("asyncio", lambda: run_async(lambda i: retrieval.aos_post("/documents/_search", query), n)),
+            ],
+            "hybrid_search": [
+                ("threads", lambda: run_threads(lambda i: retrieval.hybrid_search(
+                    f"pricing {i}", k=8, backend=retrieval.OpenSearchBackend(), diversify=False), n, n)),
+                ("asyncio", lambda: run_async(lambda i: retrieval.ahybrid_search(
+                    f"pricing {i}", k=8, diversify=False), n)),
+            ],
+        }
+        embeddings.bedrock = clients[n]
+        for name, runs in scenarios.items():
+            print(f"\n{name}: {n} concurrent calls, {args.latency_ms:g} ms service latency")
+            print(f"{'approach':>24} {'wall ms':>8} {'calls/s':>8} {'p50 ms':>7} {'p99 ms':>7} {'threads':>8}")
+            results[name] = []
+            for label, run in runs:
+                r = row(label, n, *run())
+                results[name].append(r)
+                print(f"{label:>24} {r['wall_ms']:>8} {r['calls_per_s']:>8} {r['p50_ms']:>7} "
+                      f"{r['p99_ms']:>7} {r['peak_threads']:>8}", flush=True)
+    shutil.rmtree(path, ignore_errors=True)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Filter push-down versus post-filtering in hybrid_search.
+
+Runs filtered searches through the OpenSearch stand-in two ways: with the
+filters pushed into both legs (what hybrid_search does), and the old way,
+an unfiltered k*3 overfetch with the filter applied to the results.
+Reports how many of the k slots each fills, recall against the exact
+filtered top-k, and bytes on the wire per query, across filter
+selectivities.
+
+    python bench/bench_filter_pushdown.py --docs 50000 --selectivity 0.5,0.1,0.01
+"""
+import argparse
+import datetime
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lambdas'))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+from common import retrieval
+from common.vector_store import LocalBackend, VectorStore
+from standins import OpenSearchStandIn
+
+VOCAB = [f"term{i}" for i in range(3000)] + ["pricing", "savings", "compute", "storage"]
+
+
+def build(path, n, dim, selectivities, seed=0):
+    """
+    Docs tagged with one source_type per selectivity, in those proportions
+    """
+    rng = np.random.default_rng(seed)
+    now = datetime.datetime.utcnow()
+    bounds = np.cumsum(selectivities)
+    docs = []
+    for i in range(n):
+        u = rng.random()
+        kind = next((f"type{j}" for j, b in enumerate(bounds) if u < b), "other")
+        docs.append({"_id": f"doc{i}", "title": " ".join(rng.choice(VOCAB, 4)),
+                     "body": " ".join(rng.choice(VOCAB, 60)), "source_type": kind,
+                     "timestamp": (now - datetime.timedelta(hours=int(rng.integers(0, 24 * 365)))).isoformat(),
+                     "file_path": f"docs/{i // 10}.md", "chunk_index": i % 10})
+    VectorStore.build(path, rng.standard_normal((n, dim), dtype=np.float32), docs)
+
+
+class WireMeter:
+    """
+    Wraps os_post to count response bytes
+    """
+    def __init__(self):
+        self.bytes = 0
+        self._post = retrieval.os_post
+
+    def __enter__(self):
+        def post(path, q):
+            resp = self._post(path, q)
+            self.bytes += len(resp.content)
+            return resp
+        retrieval.os_post = post
+        return self
+
+    def __exit__(self, *exc):
+        retrieval.os_post = self._post
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--selectivity", default="0.5,0.1,0.01")
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=30)
+    args = parser.parse_args()
+
+    selectivities = [float(s) for s in args.selectivity.split(",")]
+    path = tempfile.mkdtemp(prefix="filter_bench_")
+    try:
+        build(path, args.docs, args.dim, selectivities)
+        backend = LocalBackend(path)
+        rng = np.random.default_rng(1)
+        queries = [(rng.standard_normal(args.dim).tolist(), " ".join(rng.choice(VOCAB, 3)))
+                   for _ in range(args.queries)]
+        rows = []
+        with OpenSearchStandIn(backend) as standin:
+            retrieval.OS = standin.url
+            for j, sel in enumerate(selectivities):
+                filters = {"source_type": f"type{j}"}
+                row = {"selectivity": sel}
+                for mode in ("pushdown", "postfilter"):
+                    filled, recall, elapsed = [], [], 0.0
+                    with WireMeter() as meter:
+                        for vector, text in queries:
+                            retrieval.embed = lambda _q, v=vector: v
+                            # Exact filtered answer from the in-process backend
+                            truth = {p["title"] for p in retrieval.hybrid_search(
+                                text, k=args.k, backend=backend, filters=filters, diversify=False)}
+                            start = time.perf_counter()
+                            if mode == "pushdown":
+                                got = retrieval.hybrid_search(text, k=args.k, filters=filters, diversify=False)
+                            else:
+                                pool = retrieval.hybrid_search(text, k=args.k * 3, diversify=False)
+                                got = [p for p in pool if p.get("source_type") == filters["source_type"]][:args.k]
+                            elapsed += time.perf_counter() - start
+                            filled.append(len(got) / args.k)
+                            recall.append(len(truth & {p["title"] for p in got}) / max(len(truth), 1))
+                    row[mode] = {"filled": round(float(np.mean(filled)), 3),
+                                 "recall": round(float(np.mean(recall)), 3),
+                                 "kb_per_query": round(meter.bytes / len(queries) / 1024, 1),
+                                 "ms_per_query": round(elapsed / len(queries) * 1000, 2)}
+                rows.append(row)
+                p, f = row["pushdown"], row["postfilter"]
+                print(f"selectivity {sel:>5}: pushdown filled {p['filled']:.2f} recall {p['recall']:.2f} "
+                      f"{p['kb_per_query']} KB | post-filter filled {f['filled']:.2f} "
+                      f"recall {f['recall']:.2f} {f['kb_per_query']} KB", flush=True)
+        print(json.dumps(rows, indent=2))
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Recall@k versus latency for an HNSW index across ef_search values.
+
+Needs a live OpenSearch domain (OS_ENDPOINT, OS_USERNAME, OS_PASSWORD).
+Queries are sampled from vectors already in the index, perturbed slightly,
+and ground truth comes from an exact script_score search. Also prints the
+estimated graph memory per million vectors for each quantization option.
+
+How ef_search is varied follows the index's engine: nmslib reads the index
+setting, lucene searches k candidates per query, and faiss fixes it in the
+mapping, so each faiss value is measured on a scratch copy of the index
+(deleted afterwards) built with that ef_search.
+
+    python bench/bench_hnsw_recall.py --index documents_v2 --ef 16,32,64,128,256
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lambdas'))
+
+from common.index_admin import BYTES_PER_DIM, IndexAdmin, estimate_memory, load_spec
+
+
+def sample_queries(admin, index, field, n, noise, seed=0):
+    resp = admin._request("POST", f"/{index}/_search", {
+        "size": n, "_source": [field],
+        "query": {"function_score": {"query": {"match_all": {}}, "random_score": {"seed": seed, "field": "_seq_no"}}}
+    })
+    vectors = np.array([h["_source"][field] for h in resp["hits"]["hits"]], dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    return vectors + rng.normal(scale=noise, size=vectors.shape).astype(np.float32)
+
+
+def exact_ids(admin, index, field, space_type, vector, k):
+    resp = admin._request("POST", f"/{index}/_search", {
+        "size": k, "_source": False,
+        "query": {"script_score": {
+            "query": {"match_all": {}},
+            "script": {"source": "knn_score", "lang": "knn",
+                       "params": {"field": field, "query_value": vector, "space_type": space_type}}
+        }}
+    })
+    return [h["_id"] for h in resp["hits"]["hits"]]
+
+
+def approx_search(admin, index, field, vector, k, candidates=None):
+    start = time.perf_counter()
+    resp = admin._request("POST", f"/{index}/_search", {
+        "size": k, "_source": False,
+        "query": {"knn": {field: {"vector": vector, "k": candidates or k}}}
+    })
+    wall = time.perf_counter() - start
+    return [h["_id"] for h in resp["hits"]["hits"]], resp.get("took", 0), wall
+
+
+def index_properties(admin, index):
+    mappings = admin._request("GET", f"/{index}/_mapping")
+    return next(iter(mappings.values()))["mappings"]["properties"]
+
+
+def faiss_copy(admin, index, field, properties, ef):
+    """
+    Scratch copy of ``index`` whose faiss graph is searched with ``ef``
+    """
+    name = f"{index}_ef{ef}"
+    mapping = properties[field]
+    method = {**mapping["method"], "parameters": {**mapping["method"].get("parameters", {}), "ef_search": ef}}
+    admin._request("PUT", f"/{name}", {
+        "settings": {"index": {"knn": True, "number_of_replicas": 0}},
+        "mappings": {"properties": {**properties, field: {**mapping, "method": method}}}
+    })
+    admin.reindex(index, name)
+    return name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--spec", default=os.path.join(os.path.dirname(__file__), "..", "infra", "index-spec.json"))
+    parser.add_argument("--index", required=True, help="concrete index, not the alias")
+    parser.add_argument("--ef", default="16,32,64,128,256")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--noise", type=float, default=0.01)
+    args = parser.parse_args()
+
+    spec = load_spec(args.spec)
+    field = spec["vector"].get("field", "embedding_vector")
+    space_type = spec["vector"].get("space_type", "l2")
+
+    print("Estimated graph memory per 1M vectors:")
+    for q in BYTES_PER_DIM:
+        est = estimate_memory({**spec, "vector": {**spec["vector"], "quantization": q}})
+        print(f"  {q:>5}: {est['total_gb']} GB ({est['bytes_per_vector']} B/vector)")
+
+    admin = IndexAdmin()
+    properties = index_properties(admin, args.index)
+    engine = properties[field]["method"].get("engine", "nmslib")
+    queries = sample_queries(admin, args.index, field, args.queries, args.noise)
+    truth = [set(exact_ids(admin, args.index, field, space_type, q.tolist(), args.k)) for q in queries]
+
+    rows = []
+    print(f"\n{args.index} ({engine})")
+    print(f"{'ef_search':>9} {'recall@' + str(args.k):>10} {'took p50':>9} {'wall p50':>9} {'wall p99':>9}")
+    for ef in (int(e) for e in args.ef.split(",")):
+        target, candidates = args.index, None
+        if engine == "nmslib":
+            admin.set_ef_search(args.index, ef)
+        elif engine == "lucene":
+            candidates = max(ef, args.k)
+        else:
+            target = faiss_copy(admin, args.index, field, properties, ef)
+        recalls, took, wall = [], [], []
+        try:
+            for q, expected in zip(queries, truth):
+                ids, t, w = approx_search(admin, target, field, q.tolist(), args.k, candidates)
+                recalls.append(len(expected & set(ids)) / max(len(expected), 1))
+                took.append(t)
+                wall.append(w * 1000)
+        finally:
+            if target != args.index:
+                admin._request("DELETE", f"/{target}")
+        row = {"ef_search": ef, "recall": round(float(np.mean(recalls)), 4),
+               "took_p50_ms": float(np.percentile(took, 50)),
+               "wall_p50_ms": round(float(np.percentile(wall, 50)), 2),
+               "wall_p99_ms": round(float(np.percentile(wall, 99)), 2)}
+        rows.append(row)
+        print(f"{ef:>9} {row['recall']:>10} {row['took_p50_ms']:>9} {row['wall_p50_ms']:>9} {row['wall_p99_ms']:>9}")
+
+    # Leave the index on the spec's setting
+    if engine == "nmslib" and "ef_search" in spec["vector"]:
+        admin.set_ef_search(args.index, spec["vector"]["ef_search"])
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
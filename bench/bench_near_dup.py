@@ -0,0 +1,120 @@
+"""
+Near-duplicate detection at ingest: dedup ratio, accuracy and cost.
+
+Builds a synthetic corpus where a share of documents are re-uploads of
+others (exact copies and lightly edited ones), runs every chunk through
+the MinHash/LSH index the ingest agent uses, and scores its decisions
+against exact shingle Jaccard similarity.
+
+    python bench/bench_near_dup.py --docs 2000 --copy-rate 0.3 --edit-rate 0.01
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lambdas'))
+
+from common.near_dup import NearDupIndex, minhash, shingles
+
+VOCAB = [f"term{i}" for i in range(5000)]
+
+
+def make_chunk(rng, words=160):
+    return " ".join(rng.choice(VOCAB) for _ in range(words))
+
+
+def edit(rng, chunk, rate):
+    words = chunk.split()
+    for i in range(len(words)):
+        if rng.random() < rate:
+            words[i] = rng.choice(VOCAB)
+    return " ".join(words)
+
+
+def corpus(n_docs, chunks_per_doc, copy_rate, edit_rate, seed=0):
+    """
+    Yield (source, chunk index, text, original text or None)
+    """
+    rng = random.Random(seed)
+    originals = []
+    for d in range(n_docs):
+        if originals and rng.random() < copy_rate:
+            base = rng.choice(originals)
+            for i, text in enumerate(base):
+                yield f"docs/copy_{d}.md", i, edit(rng, text, edit_rate), text
+        else:
+            chunks = [make_chunk(rng) for _ in range(chunks_per_doc)]
+            originals.append(chunks)
+            for i, text in enumerate(chunks):
+                yield f"docs/doc_{d}.md", i, text, None
+
+
+def jaccard(a, b):
+    a, b = set(shingles(a)), set(shingles(b))
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--chunks-per-doc", type=int, default=5)
+    parser.add_argument("--copy-rate", type=float, default=0.3)
+    parser.add_argument("--edit-rate", type=float, default=0.01, help="share of words changed in a copy")
+    parser.add_argument("--threshold", type=float, default=0.85)
+    args = parser.parse_args()
+
+    index = NearDupIndex(threshold=args.threshold)
+    texts = {}
+    chunks = skipped = true_pos = false_pos = false_neg = 0
+    false_pos_jaccard = []
+    sig_s = query_s = 0.0
+
+    for source, i, text, original in corpus(args.docs, args.chunks_per_doc, args.copy_rate, args.edit_rate):
+        doc_id = f"{source.replace('/', '_')}_{i}"
+        chunks += 1
+        start = time.perf_counter()
+        sig = minhash(text)
+        sig_s += time.perf_counter() - start
+        start = time.perf_counter()
+        match = index.query(sig)
+        query_s += time.perf_counter() - start
+
+        is_dup = original is not None and jaccard(text, original) >= args.threshold
+        if match:
+            skipped += 1
+            similar = jaccard(text, texts[match[0]])
+            if similar >= args.threshold:
+                true_pos += 1
+            else:
+                false_pos += 1
+                false_pos_jaccard.append(similar)
+            continue
+        if is_dup:
+            false_neg += 1
+        index.add(doc_id, sig, source)
+        texts[doc_id] = text
+
+    index_bytes = len(json.dumps(index.to_json()))
+    result = {
+        "chunks": chunks,
+        "dedup_ratio": round(skipped / chunks, 4),
+        "embed_calls_avoided": skipped,
+        "precision": round(true_pos / max(true_pos + false_pos, 1), 4),
+        "recall": round(true_pos / max(true_pos + false_neg, 1), 4),
+        # Misses near the threshold are expected; far below it would be a bug
+        "false_pos_min_jaccard": round(min(false_pos_jaccard), 3) if false_pos_jaccard else None,
+        "signature_ms_per_chunk": round(sig_s / chunks * 1000, 3),
+        "query_ms_per_chunk": round(query_s / chunks * 1000, 3),
+        "index_chunks": len(index),
+        "index_bytes_per_chunk": round(index_bytes / max(len(index), 1))
+    }
+    for key, value in result.items():
+        print(f"{key:>24}: {value}")
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
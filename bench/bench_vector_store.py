@@ -0,0 +1,140 @@
+"""
+Query latency and memory of the local NumPy retrieval backend.
+
+Builds synthetic stores of increasing size, then times the kNN and BM25
+legs of hybrid_search on the LocalBackend directly and through the
+OpenSearch stand-in (same index, reached over HTTP via OpenSearchBackend).
+
+    python bench/bench_vector_store.py --sizes 10000,100000,1000000 --dim 1024
+"""
+import argparse
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lambdas'))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+from common import retrieval
+from common.vector_store import LocalBackend, VectorStore
+from standins import OpenSearchStandIn
+
+VOCAB = np.array(["ec2", "spot", "gpu", "lambda", "s3", "tiering", "reserved", "savings",
+                  "graviton", "batch", "cost", "pricing", "opensearch", "bedrock", "latency",
+                  "throughput", "memory", "region", "instance", "storage"] +
+                 [f"term{i}" for i in range(2000)])
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def synthetic(n, dim, seed=0, block=50000):
+    rng = np.random.default_rng(seed)
+
+    def vectors():
+        for start in range(0, n, block):
+            yield rng.standard_normal((min(block, n - start), dim), dtype=np.float32)
+
+    def docs():
+        words = np.random.default_rng(seed + 1)
+        for i in range(n):
+            yield {"_id": f"doc{i}", "title": " ".join(words.choice(VOCAB, 4)),
+                   "body": " ".join(words.choice(VOCAB, 60)), "file_path": f"docs/{i // 10}.md",
+                   "chunk_index": i % 10}
+
+    return vectors(), docs()
+
+
+def percentiles(samples):
+    ms = np.asarray(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 2),
+            "p95_ms": round(float(np.percentile(ms, 95)), 2)}
+
+
+def time_backend(backend, queries, texts, size):
+    knn, lexical = [], []
+    for q, text in zip(queries, texts):
+        start = time.perf_counter()
+        backend.knn(q.tolist(), size)
+        knn.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        backend.lexical(text, size)
+        lexical.append(time.perf_counter() - start)
+    return {"knn": percentiles(knn), "lexical": percentiles(lexical)}
+
+
+def run(n, dim, dtype, n_queries, k):
+    path = tempfile.mkdtemp(prefix=f"vs_{n}_{dtype}_")
+    try:
+        vectors, docs = synthetic(n, dim)
+        start = time.perf_counter()
+        VectorStore.build(path, vectors, docs, dtype=dtype)
+        build_s = time.perf_counter() - start
+
+        gc.collect()
+        before = rss_bytes()
+        start = time.perf_counter()
+        backend = LocalBackend(path)
+        open_s = time.perf_counter() - start
+
+        rng = np.random.default_rng(42)
+        queries = rng.standard_normal((n_queries, dim), dtype=np.float32)
+        texts = [" ".join(rng.choice(VOCAB[:20], 3)) for _ in range(n_queries)]
+        size = k * 3
+
+        local = time_backend(backend, queries, texts, size)
+        resident = rss_bytes() - before
+
+        with OpenSearchStandIn(backend) as standin:
+            retrieval.OS = standin.url
+            remote = time_backend(retrieval.OpenSearchBackend(), queries, texts, size)
+
+        return {
+            "chunks": n, "dim": dim, "dtype": dtype,
+            "build_s": round(build_s, 2), "open_s": round(open_s, 2),
+            "matrix_mb": round(backend.store.nbytes() / 2**20, 1),
+            "resident_mb": round(resident / 2**20, 1),
+            "local": local, "opensearch_standin": remote
+        }
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--dtypes", default="float32,float16,int8")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{'chunks':>9} {'dtype':>8} {'matrix MB':>10} {'RSS MB':>8} "
+          f"{'knn p50':>8} {'knn p95':>8} {'bm25 p50':>9} {'os knn p50':>11} {'os bm25 p50':>12}")
+    results = []
+    for n in (int(s) for s in args.sizes.split(",")):
+        for dtype in args.dtypes.split(","):
+            r = run(n, args.dim, dtype, args.queries, args.k)
+            results.append(r)
+            print(f"{r['chunks']:>9} {dtype:>8} {r['matrix_mb']:>10} {r['resident_mb']:>8} "
+                  f"{r['local']['knn']['p50_ms']:>8} {r['local']['knn']['p95_ms']:>8} "
+                  f"{r['local']['lexical']['p50_ms']:>9} "
+                  f"{r['opensearch_standin']['knn']['p50_ms']:>11} "
+                  f"{r['opensearch_standin']['lexical']['p50_ms']:>12}", flush=True)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,556 @@
+"""
+Open-loop load test of the orchestration pipeline, with a capacity report.
+
+Replays goals from a workload file at a series of fixed arrival rates. The
+file is JSONL with a "goal" field, or "title" and "body" fields as in a
+request backlog; plain text lines are goals too. Arrivals follow the
+schedule however slow the pipeline gets, and each goal's latency is
+measured from its scheduled arrival, so queueing shows up in the numbers
+instead of slowing the generator down.
+
+Targets:
+
+- local (default) runs every agent in-process through common.pipeline
+  against stand-ins in child processes. Bedrock can be throttled at a
+  requests-per-minute quota, OpenSearch has a small node's search thread
+  pool (4 threads on a 2 vCPU t3.small.search), and the Hacker News API
+  and S3 are served locally. --map-concurrency is the FanOut Map's MaxConcurrency and
+  --concurrency bounds goals in flight, like the account's Lambda
+  concurrency. Stage latencies come from run_goal's timings.
+- endpoint POSTs each goal to a deployed API's /invoke (--url, --api-key)
+  and records end-to-end latency, errors and throttles; the API does not
+  expose stage timings.
+
+Each rate step reports achieved throughput, p50/p95/p99 per stage and
+error and throttle rates. Stage errors come from the agents' error logs,
+since most agents degrade rather than raise. The summary gives the highest
+rate whose p99 stays within --slo-ms and the rate where it breaks. It also
+names the bottleneck: the stage whose p99 grew most between the first step
+and the breaking one.
+
+    python bench/load_test.py --workload requests.jsonl --rates 1,2,4,8 --step-seconds 30 --slo-ms 5000
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lambdas'))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+DEFAULT_GOALS = [
+    "Analyze current AWS pricing trends",
+    "Compare EC2 spot and on-demand costs for batch GPU workloads",
+    "Summarize recent discussion of serverless cold starts",
+    "Recommend ways to cut our OpenSearch bill",
+]
+
+# What the Bedrock stand-in answers for planning (and, verbatim, synthesis)
+DEFAULT_PLAN = {"tasks": [
+    {"id": "k1", "type": "knowledge", "description": "Search pricing documents",
+     "inputs": {"query": "aws pricing cost optimization"}, "deps": []},
+    {"id": "k2", "type": "knowledge", "description": "Search recent reports",
+     "inputs": {"query": "compute savings plans", "recency": "30d"}, "deps": []},
+    {"id": "d1", "type": "data", "description": "Fetch current data",
+     "inputs": {"feeds": ["hackernews", "aws_pricing"]}, "deps": []},
+]}
+
+# Stages on a goal's critical path, in order; FanOut takes as long as its slowest task
+CRITICAL_PATH = ("queue", "guardrail", "plan", "fanout", "synth")
+STAGE_SERVICES = {
+    "queue": "goal concurrency (Lambda)",
+    "guardrail": "guardrail CPU",
+    "plan": "bedrock",
+    "synth": "bedrock",
+    "task:knowledge": "opensearch",
+    "task:data": "feeds",
+    "task:action": "s3",
+    "total": "the deployed pipeline (no stage timings)",
+}
+
+# Error log lines each agent writes when it degrades instead of raising
+STAGE_ERRORS = [
+    ("plan", ("Planning error", "Failed to parse LLM response")),
+    ("task:knowledge", ("Search failed", "Search error", "Knowledge search error")),
+    ("task:data", ("Data fetch error", "HackerNews fetch error", "Error fetching")),
+    ("synth", ("Synthesis error", "Bedrock error")),
+]
+THROTTLE = re.compile(r"\b429\b|throttl|too ?many ?requests|rejected_execution|rate exceeded", re.IGNORECASE)
+# common.aio logs each retried call
+RETRY = re.compile(r" attempt \d+ got (\d+|None); retrying")
+
+
+def load_goals(path):
+    goals = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                goals.append(line)
+                continue
+            if isinstance(obj, str):
+                goals.append(obj)
+            elif obj.get("goal"):
+                goals.append(obj["goal"])
+            else:
+                goals.append(" ".join(str(obj[k]) for k in ("title", "body") if obj.get(k)))
+    goals = [g for g in goals if g]
+    if not goals:
+        raise SystemExit(f"No goals in {path}")
+    return goals
+
+
+def arrival_offsets(rate, seconds, poisson, rng):
+    """
+    Arrival times in seconds from the start of a step
+    """
+    if not poisson:
+        return list(np.arange(0, seconds, 1 / rate))
+    offsets, t = [], rng.exponential(1 / rate)
+    while t < seconds:
+        offsets.append(t)
+        t += rng.exponential(1 / rate)
+    return offsets
+
+
+def ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+def stage_timings(timings):
+    """
+    Pipeline timings by stage, with FanOut tasks folded into their slowest
+    task of each type
+    """
+    out = {k: timings[k] for k in ("guardrail", "plan", "fanout", "synth", "total") if k in timings}
+    for key, value in timings.items():
+        if key.startswith("task:"):
+            stage = "task:" + key.rsplit(":", 1)[1]
+            out[stage] = max(out.get(stage, 0.0), value)
+    return out
+
+
+def classify(error):
+    return "throttled" if THROTTLE.search(error or "") else "error"
+
+
+class StageErrors(logging.Handler):
+    """
+    Counts agent error log lines by stage, and retried calls by status
+    """
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.reset()
+
+    def reset(self):
+        self.errors, self.throttled, self.retries = Counter(), Counter(), Counter()
+
+    def emit(self, record):
+        msg = record.getMessage()
+        m = RETRY.search(msg)
+        if m:
+            self.retries[m.group(1)] += 1
+            return
+        for stage, prefixes in STAGE_ERRORS:
+            if msg.startswith(prefixes):
+                self.errors[stage] += 1
+                if THROTTLE.search(msg):
+                    self.throttled[stage] += 1
+                return
+
+    def snapshot(self, goals):
+        stages = {stage: {"errors": self.errors[stage], "throttled": self.throttled[stage],
+                          "per_goal": round(self.errors[stage] / goals, 4) if goals else 0.0}
+                  for stage, _ in STAGE_ERRORS if self.errors[stage]}
+        return {"stages": stages, "retries_by_status": dict(self.retries)}
+
+
+class _Uncoalesced:
+    """
+    AsyncSingleFlight without the sharing: a Lambda container serves one
+    goal at a time, so in-process sharing between goals would understate
+    backend load
+    """
+    async def do(self, key, func, *args, **kwargs):
+        return await func(*args, **kwargs)
+
+
+class LocalTarget:
+    """
+    Runs goals through common.pipeline with every agent in this process
+    """
+    def __init__(self, urls, concurrency, map_concurrency, speculative=True, coalesce=False):
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+        os.environ.setdefault("REASONING_MODEL_ID", "anthropic.claude-3-haiku-20240307-v1:0")
+        os.environ.setdefault("EMBEDDINGS_MODEL_ID", "amazon.titan-embed-text-v2:0")
+        os.environ["BEDROCK_ENDPOINT_URL"] = urls["bedrock"]
+        os.environ["HN_API_URL"] = urls["feeds"]
+        os.environ.setdefault("ARTIFACTS_BUCKET", "load-test-artifacts")
+        # One shared pool serves every goal in flight, unlike one per container
+        os.environ["AIO_POOL_SIZE"] = str(max(100, concurrency * 4))
+
+        import boto3
+        from botocore.config import Config
+        from common import bedrock_client, claim_check, embeddings, pipeline, retrieval
+        from common.guardrail_engine import GuardrailViolation
+
+        client = boto3.client("bedrock-runtime", endpoint_url=urls["bedrock"],
+                              config=Config(max_pool_connections=concurrency * 2))
+        s3 = boto3.client("s3", endpoint_url=urls["s3"],
+                          config=Config(max_pool_connections=concurrency * 2, s3={"addressing_style": "path"},
+                                        request_checksum_calculation="when_required"))
+        bedrock_client.bedrock = embeddings.bedrock = client
+        claim_check.s3 = s3
+        retrieval.OS = urls["opensearch"]
+        self.agents = pipeline.load_agents()
+        self.agents["synth"].__globals__["bedrock"] = client
+        # The planner's fallback plan includes an action task, which writes its plan to S3
+        self.agents["action"].__globals__["s3"] = s3
+        self.agents["knowledge"].__globals__["OS"] = urls["opensearch"]
+        if not coalesce:
+            self.agents["knowledge"].__globals__["search_flight"] = _Uncoalesced()
+            self.agents["data"].__globals__["feed_flight"] = _Uncoalesced()
+
+        self.pipeline = pipeline
+        self.blocked = GuardrailViolation
+        self.map_concurrency = map_concurrency
+        self.speculative = speculative
+
+    def __call__(self, goal):
+        try:
+            result = self.pipeline.run_goal(goal, agents=self.agents, speculative=self.speculative,
+                                            max_concurrency=self.map_concurrency)
+        except self.blocked:
+            return {"outcome": "blocked", "timings": {}}
+        except Exception as e:
+            return {"outcome": classify(str(e)), "timings": {}, "error": str(e)}
+        answer = result.get("answer_md") or ""
+        # Synth reports its own failures, and LLM errors, in the answer
+        if result.get("status") == "error" or answer.startswith("Error generating"):
+            return {"outcome": classify(answer), "timings": stage_timings(result["timings"]), "error": answer}
+        return {"outcome": "ok", "timings": stage_timings(result["timings"])}
+
+
+class EndpointTarget:
+    """
+    POSTs goals to a deployed API's /invoke
+    """
+    def __init__(self, url, api_key, concurrency, timeout=30):
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.requests = requests
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=concurrency))
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=concurrency))
+        self.url = url.rstrip("/") + "/invoke"
+        self.headers = {"x-api-key": api_key} if api_key else {}
+        self.timeout = timeout
+
+    def __call__(self, goal):
+        start = time.perf_counter()
+        try:
+            resp = self.session.post(self.url, json={"goal": goal}, headers=self.headers, timeout=self.timeout)
+        except self.requests.RequestException as e:
+            return {"outcome": classify(str(e)), "timings": {}, "error": str(e)}
+        timings = {"total": ms(time.perf_counter() - start)}
+        try:
+            body = resp.json()
+        except ValueError:
+            body = {}
+        if resp.status_code == 429:
+            return {"outcome": "throttled", "timings": timings, "error": resp.text[:200]}
+        if resp.status_code >= 400:
+            return {"outcome": classify(resp.text), "timings": timings, "error": resp.text[:200]}
+        status = body.get("execution_status")
+        if status and status != "SUCCEEDED":
+            error = f"{status}: {body.get('error')}: {body.get('cause')}"
+            blocked = "GuardrailViolation" in (body.get("error") or "")
+            return {"outcome": "blocked" if blocked else classify(error), "timings": timings, "error": error}
+        return {"outcome": "ok", "timings": {**timings, **stage_timings(body.get("timings") or {})}}
+
+
+def standin_stats(urls):
+    """
+    Request and rejection counts per stand-in since the previous call
+    """
+    stats = {}
+    for name, url in urls.items():
+        with urllib.request.urlopen(f"{url}/_standin/stats", timeout=10) as resp:
+            counts = json.loads(resp.read())
+        counts["rejection_rate"] = round(counts["rejected"] / counts["requests"], 4) if counts["requests"] else 0.0
+        stats[name] = counts
+    return stats
+
+
+def run_step(target, goals, rate, seconds, poisson, rng, pool):
+    """
+    Issue one rate step on an open-loop schedule and wait for every goal
+    """
+    def one(goal, scheduled):
+        started = time.perf_counter()
+        record = target(goal)
+        finished = time.perf_counter()
+        record["timings"]["queue"] = ms(started - scheduled)
+        record["timings"]["e2e"] = ms(finished - scheduled)
+        record["finished"] = finished
+        return record
+
+    offsets = arrival_offsets(rate, seconds, poisson, rng)
+    start = time.perf_counter() + 0.05
+    futures = []
+    for offset in offsets:
+        scheduled = start + offset
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        futures.append(pool.submit(one, next(goals), scheduled))
+    records = [f.result() for f in futures]
+    wall = max([r["finished"] for r in records] + [start + seconds]) - start
+    return records, wall
+
+
+def percentiles(values):
+    arr = np.asarray(values)
+    return {"n": len(values),
+            "p50_ms": round(float(np.percentile(arr, 50)), 1),
+            "p95_ms": round(float(np.percentile(arr, 95)), 1),
+            "p99_ms": round(float(np.percentile(arr, 99)), 1)}
+
+
+def summarize(rate, records, wall, cpu_seconds):
+    outcomes = Counter(r["outcome"] for r in records)
+    served = len(records) - outcomes["blocked"]
+    stages = {}
+    for r in records:
+        if r["outcome"] == "blocked":
+            continue
+        for stage, value in r["timings"].items():
+            stages.setdefault(stage, []).append(value)
+    return {
+        "offered_per_s": rate,
+        "goals": len(records),
+        "outcomes": dict(outcomes),
+        "achieved_per_s": round(outcomes["ok"] / wall, 2),
+        "error_rate": round((outcomes["error"] + outcomes["throttled"]) / served, 4) if served else 0.0,
+        "throttle_rate": round(outcomes["throttled"] / served, 4) if served else 0.0,
+        "stages": {stage: percentiles(values) for stage, values in sorted(stages.items())},
+        # Share of one core this process used; near 1.0 the generator itself is saturated
+        "generator_cpu": round(cpu_seconds / wall, 2)
+    }
+
+
+def within_slo(step, slo_ms, max_error_rate):
+    e2e = step["stages"].get("e2e")
+    return e2e is not None and e2e["p99_ms"] <= slo_ms and step["error_rate"] <= max_error_rate
+
+
+def bottleneck(base, at):
+    """
+    The critical-path stage whose p99 grew most from ``base`` to ``at``;
+    for FanOut, the task type that grew most
+    """
+    def p99(step, stage):
+        return step["stages"].get(stage, {}).get("p99_ms", 0.0)
+
+    def grown(candidates):
+        return max(candidates, key=lambda s: (p99(at, s) - p99(base, s), p99(at, s)))
+
+    stages = [s for s in CRITICAL_PATH if s in at["stages"]]
+    if "fanout" not in stages:
+        # Endpoint runs only time the whole request
+        stages = [s for s in ("queue", "total") if s in at["stages"]]
+    if not stages:
+        return None
+    stage = grown(stages)
+    if stage == "fanout":
+        tasks = [s for s in at["stages"] if s.startswith("task:")]
+        if tasks:
+            stage = grown(tasks)
+    return {"stage": stage, "service": STAGE_SERVICES.get(stage),
+            "p99_ms": {"from": p99(base, stage), "to": p99(at, stage)}}
+
+
+def capacity(steps, slo_ms, max_error_rate):
+    steps = sorted(steps, key=lambda s: s["offered_per_s"])
+    breaking = next((s for s in steps if not within_slo(s, slo_ms, max_error_rate)), None)
+    sustained = [s for s in steps if within_slo(s, slo_ms, max_error_rate)
+                 and (breaking is None or s["offered_per_s"] < breaking["offered_per_s"])]
+    at = breaking or steps[-1]
+    errors = at.get("stage_errors", {}).get("stages", {})
+    services = at.get("services", {})
+    report = {
+        "slo_ms": slo_ms,
+        "max_error_rate": max_error_rate,
+        "max_rate_within_slo": sustained[-1]["offered_per_s"] if sustained else None,
+        "throughput_within_slo_per_s": sustained[-1]["achieved_per_s"] if sustained else None,
+        "breaking_rate": breaking["offered_per_s"] if breaking else None,
+        "breaking_p99_ms": breaking["stages"].get("e2e", {}).get("p99_ms") if breaking else None,
+        "breaking_error_rate": breaking["error_rate"] if breaking else None,
+        "bottleneck": bottleneck(steps[0], at),
+        "top_error_stage": max(errors, key=lambda s: errors[s]["errors"]) if errors else None,
+        "most_rejecting_service": (max(services, key=lambda s: services[s]["rejection_rate"])
+                                   if any(v["rejected"] for v in services.values()) else None)
+    }
+    if breaking is None:
+        report["note"] = "p99 stayed within the SLO at every rate tried; raise --rates"
+    return report
+
+
+def print_step(step):
+    e2e = step["stages"].get("e2e", {})
+    o = step["outcomes"]
+    print(f"{step['offered_per_s']:>7g} {step['goals']:>6} {o.get('ok', 0):>5} {o.get('error', 0):>5} "
+          f"{o.get('throttled', 0):>5} {o.get('blocked', 0):>5} {step['achieved_per_s']:>8} "
+          f"{e2e.get('p50_ms', '-'):>8} {e2e.get('p95_ms', '-'):>8} {e2e.get('p99_ms', '-'):>8} "
+          f"{step['generator_cpu']:>5}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workload", help="JSONL or text file of goals (default: a few built-in goals)")
+    parser.add_argument("--target", choices=("local", "endpoint"), default="local")
+    parser.add_argument("--rates", default="1,2,4,8", help="goals per second for each step")
+    parser.add_argument("--step-seconds", type=float, default=30)
+    parser.add_argument("--poisson", action="store_true", help="exponential inter-arrival times")
+    parser.add_argument("--slo-ms", type=float, default=5000, help="p99 end-to-end latency objective")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--keep-going", action="store_true", help="run every rate, not stop at the first breach")
+    parser.add_argument("--concurrency", type=int, default=200, help="goals in flight at once")
+    parser.add_argument("--out", help="also write the report to this JSON file")
+    parser.add_argument("--seed", type=int, default=0)
+    local = parser.add_argument_group("local target")
+    local.add_argument("--map-concurrency", type=int, default=10, help="FanOut Map MaxConcurrency")
+    local.add_argument("--no-speculation", action="store_true")
+    local.add_argument("--coalesce", action="store_true",
+                       help="share identical in-flight searches between goals, as one container would")
+    local.add_argument("--plan", help="JSON file with the plan the Bedrock stand-in returns")
+    local.add_argument("--bedrock-latency-ms", type=float, default=800)
+    local.add_argument("--bedrock-rpm", type=int, default=0, help="InvokeModel quota; 0 for none")
+    local.add_argument("--opensearch-latency-ms", type=float, default=30)
+    local.add_argument("--opensearch-threads", type=int, default=4, help="search thread pool size")
+    local.add_argument("--opensearch-queue", type=int, default=1000, help="search queue size")
+    local.add_argument("--feed-latency-ms", type=float, default=100)
+    local.add_argument("--docs", type=int, default=5000)
+    endpoint = parser.add_argument_group("endpoint target")
+    endpoint.add_argument("--url", default=os.getenv("API_URL"), help="API base URL (default $API_URL)")
+    endpoint.add_argument("--api-key", default=os.getenv("API_KEY"), help="API key (default $API_KEY)")
+    args = parser.parse_args()
+
+    rates = [float(r) for r in args.rates.split(",")]
+    goals = itertools.cycle(load_goals(args.workload) if args.workload else DEFAULT_GOALS)
+    rng = np.random.default_rng(args.seed)
+
+    errors = StageErrors()
+    logging.getLogger().addHandler(errors)
+
+    path, standins, urls = None, [], {}
+    if args.target == "endpoint":
+        if not args.url:
+            parser.error("--target endpoint needs --url or API_URL")
+        target = EndpointTarget(args.url, args.api_key, args.concurrency)
+    else:
+        # Imported here so the endpoint target doesn't need the agents' dependencies
+        from common.vector_store import VectorStore
+        from standins import ChildStandIn
+
+        plan = DEFAULT_PLAN
+        if args.plan:
+            with open(args.plan) as f:
+                plan = json.load(f)
+        path = tempfile.mkdtemp(prefix="load_test_")
+        words = ["aws", "pricing", "cost", "optimization", "compute", "savings", "plans", "spot",
+                 "serverless", "opensearch", "gpu", "batch", "storage", "network", "reserved"]
+        docs = [{"_id": f"d{i}", "title": f"Report {i}",
+                 "body": " ".join(rng.choice(words, 40)), "url": f"https://example.com/docs/{i}",
+                 "source_type": "document", "file_path": f"docs/{i}.md", "chunk_index": 0}
+                for i in range(args.docs)]
+        VectorStore.build(path, rng.standard_normal((args.docs, 32), dtype=np.float32), docs)
+
+        # Started before any client threads exist, since the children are forked
+        standins = [
+            ("bedrock", ChildStandIn("bedrock", latency_ms=args.bedrock_latency_ms, dim=32,
+                                     reply=json.dumps(plan), rpm=args.bedrock_rpm or None)),
+            ("opensearch", ChildStandIn("opensearch", path, latency_ms=args.opensearch_latency_ms,
+                                        workers=args.opensearch_threads, queue=args.opensearch_queue)),
+            ("feeds", ChildStandIn("feeds", latency_ms=args.feed_latency_ms)),
+            ("s3", ChildStandIn("s3")),
+        ]
+        for name, standin in standins:
+            standin.__enter__()
+            urls[name] = standin.url
+        target = LocalTarget(urls, args.concurrency, args.map_concurrency,
+                             speculative=not args.no_speculation, coalesce=args.coalesce)
+
+    steps = []
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            # Warm up: imports, compiled guardrails and connection pools
+            target(next(goals))
+            if urls:
+                standin_stats(urls)
+            errors.reset()
+
+            print(f"{args.target} target, {args.step_seconds:g}s per step, SLO p99 <= {args.slo_ms:g} ms")
+            print(f"{'rate/s':>7} {'goals':>6} {'ok':>5} {'err':>5} {'thr':>5} {'blk':>5} {'done/s':>8} "
+                  f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'cpu':>5}", flush=True)
+            for rate in rates:
+                cpu = time.process_time()
+                records, wall = run_step(target, goals, rate, args.step_seconds, args.poisson, rng, pool)
+                step = summarize(rate, records, wall, time.process_time() - cpu)
+                step["stage_errors"] = errors.snapshot(len(records))
+                errors.reset()
+                if urls:
+                    step["services"] = standin_stats(urls)
+                steps.append(step)
+                print_step(step)
+                if not args.keep_going and not within_slo(step, args.slo_ms, args.max_error_rate):
+                    break
+    finally:
+        for _, standin in standins:
+            standin.__exit__(None, None, None)
+        if path:
+            shutil.rmtree(path, ignore_errors=True)
+
+    stages = [s for s in CRITICAL_PATH + ("task:knowledge", "task:data", "total")
+              if any(s in st["stages"] for st in steps)]
+    print("\np99 ms by stage")
+    print(f"{'rate/s':>7} " + " ".join(f"{s:>14}" for s in stages))
+    for step in steps:
+        print(f"{step['offered_per_s']:>7g} " + " ".join(
+            f"{step['stages'].get(s, {}).get('p99_ms', '-'):>14}" for s in stages))
+
+    report = {"target": args.target, "steps": steps, "capacity": capacity(steps, args.slo_ms, args.max_error_rate)}
+    cap = report["capacity"]
+    sustained = (f"{cap['max_rate_within_slo']:g}/s offered, {cap['throughput_within_slo_per_s']}/s completed"
+                 if cap["max_rate_within_slo"] else "none of the rates tried")
+    breaks = f"{cap['breaking_rate']:g}/s" if cap["breaking_rate"] else "not reached"
+    print(f"\nwithin SLO up to: {sustained}; breaks at: {breaks}")
+    if cap["bottleneck"]:
+        b = cap["bottleneck"]
+        print(f"bottleneck: {b['stage']} ({b['service']}), p99 {b['p99_ms']['from']} -> {b['p99_ms']['to']} ms")
+    if any(step["generator_cpu"] > 0.9 for step in steps):
+        print("warning: the generator used a full core; latencies include its own CPU contention")
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""
+Local stand-ins for the AWS services the agents call, for benchmarks.
+
+OpenSearchStandIn speaks enough of the OpenSearch REST API for
+common.retrieval: ``POST /<index>/_search`` with a ``knn`` or
+``multi_match`` query, optionally with bool filters and a ``function_score``
+recency decay, and ``_source`` field lists, and ``GET /<index>/_mapping``
+with the mapping infra/index-spec.json creates. It answers from a LocalBackend, so comparing it with
+the LocalBackend directly isolates the HTTP and JSON cost of going through
+the OpenSearch protocol.
+
+BedrockStandIn answers ``POST /model/<id>/invoke`` for Titan embeddings and
+Anthropic messages with a fixed latency, standing in for bedrock-runtime.
+FeedStandIn serves the Hacker News item API the data agent reads, and
+S3StandIn keeps objects PUT to it in memory for path-style GETs.
+All accept hundreds of concurrent connections.
+
+For load tests, a stand-in can also model a service's limits: a requests
+per minute quota (Bedrock's throttling) and a fixed number of workers with a
+bounded queue (an OpenSearch node's search thread pool). Requests beyond
+either are answered with 429, as the real service would. ``GET /_standin/stats``
+returns request and rejection counts since the previous stats request.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lambdas'))
+
+
+def _unwrap(query):
+    """
+    Split a common.search_filters query into (inner query, filters, recency)
+    """
+    recency = None
+    if "function_score" in query:
+        fs = query["function_score"]
+        decay = next(iter(fs["functions"][0]["exp"].values()))
+        recency = {k: decay[k] for k in ("scale", "offset", "decay")}
+        query = fs["query"]
+    filters = {}
+    if "knn" in query:
+        spec = next(iter(query["knn"].values()))
+        clauses = spec.get("filter", {}).get("bool", {}).get("filter", [])
+    elif "bool" in query:
+        clauses = query["bool"].get("filter", [])
+        query = query["bool"]["must"][0]
+    else:
+        clauses = []
+    for clause in clauses:
+        if "terms" in clause:
+            filters["source_type"] = clause["terms"]["source_type"]
+        elif "range" in clause:
+            bounds = clause["range"]["timestamp"]
+            filters.update({name: bounds[op] for name, op in (("since", "gte"), ("until", "lte")) if op in bounds})
+        elif "prefix" in clause:
+            filters["file_path_prefix"] = clause["prefix"]["file_path"]
+    return query, filters, recency
+
+
+class _Limits:
+    """
+    A service's capacity: a requests-per-minute quota, and ``workers``
+    requests served at a time with at most ``queue`` more waiting.
+
+    The quota is a token bucket refilled continuously and holding ten
+    seconds' worth, so a burst can't borrow a whole minute's allowance.
+    """
+    def __init__(self, rpm=None, workers=None, queue=0):
+        self.rpm = rpm
+        self.workers = workers
+        self.queue = queue
+        self.lock = threading.Lock()
+        self.burst = max(1.0, (rpm or 0) / 6)
+        self.tokens = self.burst
+        self.refilled = time.monotonic()
+        self.slots = threading.BoundedSemaphore(workers) if workers else None
+        self.in_flight = 0
+        self.counts = {"requests": 0, "rejected": 0, "peak_in_flight": 0}
+
+    def _take_token(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rpm / 60)
+        self.refilled = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def acquire(self):
+        """
+        False if the request should be rejected; otherwise blocks for a worker
+        """
+        with self.lock:
+            self.counts["requests"] += 1
+            if (self.rpm and not self._take_token()) or \
+                    (self.slots and self.in_flight >= self.workers + self.queue):
+                self.counts["rejected"] += 1
+                return False
+            self.in_flight += 1
+            self.counts["peak_in_flight"] = max(self.counts["peak_in_flight"], self.in_flight)
+        if self.slots:
+            self.slots.acquire()
+        return True
+
+    def release(self):
+        if self.slots:
+            self.slots.release()
+        with self.lock:
+            self.in_flight -= 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Body of the 429 sent when a request is over the stand-in's limits
+    rejection = {"error": {"type": "rejected_execution_exception"}, "status": 429}
+    rejection_headers = {}
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream" if isinstance(body, bytes)
+                         else "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _limited(self, respond):
+        """
+        Serve a request within the server's limits: sleep the service latency
+        while holding a worker, then respond
+        """
+        limits = self.server.limits
+        if not limits.acquire():
+            return self._send(429, self.rejection, self.rejection_headers)
+        try:
+            if self.server.latency_ms:
+                time.sleep(self.server.latency_ms / 1000)
+            response = respond()
+        finally:
+            limits.release()
+        self._send(*response)
+
+    def _stats(self):
+        limits = self.server.limits
+        with limits.lock:
+            counts = dict(limits.counts)
+            limits.counts = {"requests": 0, "rejected": 0, "peak_in_flight": limits.in_flight}
+        self._send(200, counts)
+
+    def do_GET(self):
+        if self.path == "/_standin/stats":
+            return self._stats()
+        self._send(404, {"error": f"unsupported path {self.path}"})
+
+
+class _SearchHandler(_Handler):
+    def do_GET(self):
+        if self.path.endswith("/_mapping"):
+            from common.index_admin import build_index_body, load_spec
+            spec = load_spec(os.path.join(os.path.dirname(__file__), '..', 'infra', 'index-spec.json'))
+            index = self.path.strip("/").split("/")[0]
+            return self._send(200, {f"{index}_v1": {"mappings": build_index_body(spec)["mappings"]}})
+        super().do_GET()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.endswith("/_search"):
+            return self._send(404, {"error": f"unsupported path {self.path}"})
+        self._limited(lambda: self._search(body))
+
+    def _search(self, body):
+        backend = self.server.backend
+        query, filters, recency = _unwrap(body.get("query", {}))
+        size = body.get("size", 10)
+        fields = body.get("_source")
+        if "knn" in query:
+            spec = next(iter(query["knn"].values()))
+            with_vectors = not isinstance(fields, list) or "embedding_vector" in fields
+            hits = backend.knn(spec["vector"], size, filters=filters, recency=recency, with_vectors=with_vectors)
+        elif "multi_match" in query:
+            hits = backend.lexical(query["multi_match"]["query"], size, filters=filters, recency=recency)
+        else:
+            return 400, {"error": "unsupported query"}
+        if isinstance(fields, list):
+            hits = [{**h, "_source": {f: h["_source"][f] for f in fields if f in h["_source"]}} for h in hits]
+        return 200, {"hits": {"total": {"value": len(hits)}, "hits": hits}}
+
+
+class _BedrockHandler(_Handler):
+    rejection = {"message": "Too many requests, please wait before trying again."}
+    # botocore reads the error code from this header, then retries the throttle
+    rejection_headers = {"x-amzn-ErrorType": "ThrottlingException"}
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not (self.path.startswith("/model/") and self.path.endswith("/invoke")):
+            return self._send(404, {"message": f"unsupported path {self.path}"})
+        self._limited(lambda: self._invoke(body))
+
+    def _invoke(self, body):
+        if "inputText" in body:
+            # Deterministic pseudo-embedding so repeated texts agree
+            seed = hashlib.sha256(body["inputText"].encode()).digest()
+            dim = self.server.dim
+            vector = [(seed[i % 32] - 127.5) / 127.5 for i in range(dim)]
+            return 200, {"embedding": vector, "inputTextTokenCount": len(body["inputText"].split())}
+        return 200, {"content": [{"type": "text", "text": self.server.reply}], "stop_reason": "end_turn"}
+
+
+class _FeedHandler(_Handler):
+    def do_GET(self):
+        if self.path == "/_standin/stats":
+            return self._stats()
+        if self.path == "/topstories.json":
+            return self._limited(lambda: (200, list(range(1, self.server.stories + 1))))
+        m = re.match(r"^/item/(\d+)\.json$", self.path)
+        if not m:
+            return self._send(404, {"error": f"unsupported path {self.path}"})
+        story_id = int(m.group(1))
+        return self._limited(lambda: (200, {"id": story_id, "type": "story", "score": story_id,
+                                            "title": f"Story {story_id} about cloud costs",
+                                            "url": f"https://example.com/{story_id}",
+                                            "time": 1700000000 + story_id}))
+
+
+class _S3Handler(_Handler):
+    rejection = b"<Error><Code>SlowDown</Code></Error>"
+
+    def do_PUT(self):
+        length = int(self.headers.get("Content-Length", 0))
+        data = self.rfile.read(length)
+        etag = '"' + hashlib.md5(data).hexdigest() + '"'
+
+        def store():
+            self.server.objects[self.path.split("?")[0]] = data
+            return 200, b"", {"ETag": etag}
+        self._limited(store)
+
+    def do_GET(self):
+        if self.path == "/_standin/stats":
+            return self._stats()
+
+        def fetch():
+            data = self.server.objects.get(self.path.split("?")[0])
+            if data is None:
+                return 404, b"<Error><Code>NoSuchKey</Code></Error>"
+            return 200, data
+        self._limited(fetch)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Fan-out benchmarks open a hundred connections at once
+    request_queue_size = 512
+
+
+class _StandIn:
+    def __init__(self, handler, port=0, limits=None, **attrs):
+        self.server = _Server(("127.0.0.1", port), handler)
+        self.server.limits = limits or _Limits()
+        for name, value in attrs.items():
+            setattr(self.server, name, value)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class OpenSearchStandIn(_StandIn):
+    """
+    Threaded HTTP server on localhost backed by a retrieval backend.
+
+    With ``workers`` set, at most that many searches run at once and up to
+    ``queue`` wait; further searches are rejected with 429 like a full
+    search thread pool.
+    """
+    def __init__(self, backend, port=0, latency_ms=0, workers=None, queue=1000):
+        super().__init__(_SearchHandler, port, _Limits(workers=workers, queue=queue),
+                         backend=backend, latency_ms=latency_ms)
+
+
+class BedrockStandIn(_StandIn):
+    """
+    bedrock-runtime InvokeModel with a fixed per-call latency, throttled
+    with ThrottlingException above ``rpm`` requests per minute if set
+    """
+    def __init__(self, latency_ms=50, dim=1024, reply="{}", port=0, rpm=None):
+        super().__init__(_BedrockHandler, port, _Limits(rpm=rpm),
+                         latency_ms=latency_ms, dim=dim, reply=reply)
+
+
+class FeedStandIn(_StandIn):
+    """
+    The Hacker News ``topstories`` and ``item`` endpoints with a fixed latency
+    """
+    def __init__(self, latency_ms=50, stories=10, port=0):
+        super().__init__(_FeedHandler, port, latency_ms=latency_ms, stories=stories)
+
+
+class S3StandIn(_StandIn):
+    """
+    S3 PutObject and GetObject, path-style, with objects kept in memory
+    """
+    def __init__(self, latency_ms=20, port=0):
+        super().__init__(_S3Handler, port, latency_ms=latency_ms, objects={})
+
+
+def _serve(kind, path, kwargs, urls, stop):
+    if kind == "opensearch":
+        from common.vector_store import LocalBackend
+        standin = OpenSearchStandIn(LocalBackend(path), **kwargs)
+    else:
+        standin = {"bedrock": BedrockStandIn, "feeds": FeedStandIn, "s3": S3StandIn}[kind](**kwargs)
+    with standin:
+        urls.put(standin.url)
+        stop.wait()
+
+
+class ChildStandIn:
+    """
+    A stand-in served from its own process, so its server threads don't
+    compete with the client for the GIL. ``kind`` is "bedrock", "feeds", "s3"
+    or "opensearch" (backed by the LocalBackend at ``path``).
+    """
+    def __init__(self, kind, path=None, **kwargs):
+        ctx = multiprocessing.get_context("fork")
+        self._urls, self._stop = ctx.Queue(), ctx.Event()
+        self._proc = ctx.Process(target=_serve, args=(kind, path, kwargs, self._urls, self._stop), daemon=True)
+
+    def __enter__(self):
+        self._proc.start()
+        self.url = self._urls.get(timeout=60)
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._proc.join(timeout=10)
@@ -74,10 +74,11 @@ DOCS_BUCKET=$(aws cloudformation describe-stacks \
 
 # Initialize OpenSearch
 echo "🔍 Initializing OpenSearch index..."
-curl -X PUT "https://$OS_ENDPOINT/documents_v1" \
-    -H 'Content-Type: application/json' \
-    -u "${OS_USERNAME:-admin}:${OS_PASSWORD:-TempPassword123!}" \
-    --data-binary @opensearch-mappings.json
+(cd ../lambdas && \
+    OS_ENDPOINT="$OS_ENDPOINT" \
+    OS_USERNAME="${OS_USERNAME:-admin}" \
+    OS_PASSWORD="${OS_PASSWORD:-TempPassword123!}" \
+    python3 -m common.index_admin rollout --spec ../infra/index-spec.json --version "${INDEX_VERSION:-1}")
 
 # Create API Gateway usage plan
 echo "🔑 Setting up API Gateway usage plan..."
@@ -1,6 +1,23 @@
-import json, uuid, os, boto3
+import json, math, time, uuid, os, sys, boto3
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 s3 = boto3.client("s3")
 sfn = boto3.client("stepfunctions")
+lambda_client = boto3.client("lambda")
+
+# Batches above SYNC_BATCH_LIMIT run asynchronously so API Gateway's 29s
+# timeout is not a factor; their results land in ARTIFACTS_BUCKET.
+MAX_BATCH_GOALS = int(os.getenv("MAX_BATCH_GOALS", "500"))
+SYNC_BATCH_LIMIT = int(os.getenv("SYNC_BATCH_LIMIT", "5"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+# The runner checkpoints results every BATCH_CHUNK_GOALS goals and hands the
+# rest to a fresh invocation when the next chunk might not fit before its
+# timeout. Runtime is estimated as BATCH_GOAL_SECONDS per round of
+# BATCH_CONCURRENCY goals; batches estimated past MAX_BATCH_SECONDS are refused.
+BATCH_CHUNK_GOALS = int(os.getenv("BATCH_CHUNK_GOALS", str(BATCH_CONCURRENCY * 4)))
+BATCH_GOAL_SECONDS = float(os.getenv("BATCH_GOAL_SECONDS", "20"))
+MAX_BATCH_SECONDS = int(os.getenv("MAX_BATCH_SECONDS", "3600"))
+# Headroom over the estimate before starting another chunk
+CHUNK_SAFETY = 2
 
 def handler(event,_):
     plan = {"recommended":"use g5.xlarge spot for batch CV","rationale":"lowest $/GPU-hr today"}
@@ -12,8 +29,114 @@ def invoke_entrypoint(event,_):
     request_id = str(uuid.uuid4())
     input_obj = {"goal": json.loads(event["body"]).get("goal","")}
     arn = os.environ.get("STATE_MACHINE_ARN")
-    sfn.start_sync_execution(stateMachineArn=arn, input=json.dumps(input_obj))
-    return {"statusCode":200,"headers":{"Content-Type":"application/json"},"body": json.dumps({"request_id":request_id,"status":"started"})}
+    execution = sfn.start_sync_execution(stateMachineArn=arn, input=json.dumps(input_obj))
+    body = {"request_id":request_id,"status":"started","execution_status":execution.get("status")}
+    # Failed and timed-out executions say why, so callers and load tests can tell errors from throttles
+    if execution.get("status") != "SUCCEEDED":
+        body.update({"error": execution.get("error"), "cause": execution.get("cause")})
+    return {"statusCode":200,"headers":{"Content-Type":"application/json"},"body": json.dumps(body)}
+
+def estimated_seconds(goals):
+    """Rough runtime of a batch of ``goals`` goals"""
+    return math.ceil(goals / BATCH_CONCURRENCY) * BATCH_GOAL_SECONDS
+
+def _response(status, body):
+    return {"statusCode":status,"headers":{"Content-Type":"application/json"},"body": json.dumps(body)}
+
+def batch_invoke_entrypoint(event,_):
+    request_id = str(uuid.uuid4())
+    try:
+        body = json.loads(event.get("body") or "{}")
+    except json.JSONDecodeError as e:
+        return _response(400, {"error": f"request body is not valid JSON: {str(e)}"})
+    goals = body.get("goals") if isinstance(body, dict) else None
+    if not isinstance(goals, list) or not goals:
+        return _response(400, {"error": "goals must be a non-empty list of strings"})
+    # Results are returned by position, so reject bad entries rather than dropping them
+    invalid = [i for i, g in enumerate(goals) if not isinstance(g, str) or not g.strip()]
+    if invalid:
+        return _response(400, {"error": "goals must be non-blank strings", "invalid_indices": invalid})
+    if len(goals) > MAX_BATCH_GOALS:
+        return _response(400, {"error": f"at most {MAX_BATCH_GOALS} goals per batch"})
+    if estimated_seconds(len(goals)) > MAX_BATCH_SECONDS:
+        return _response(400, {"error": f"batch would run about {estimated_seconds(len(goals)):.0f}s; "
+                                        f"the limit is {MAX_BATCH_SECONDS}s, so split it",
+                               "estimated_seconds": estimated_seconds(len(goals))})
+
+    artifact_key = f"batches/{request_id}.json"
+    if len(goals) > SYNC_BATCH_LIMIT or body.get("store"):
+        lambda_client.invoke(
+            FunctionName=os.environ.get("BATCH_RUNNER_FUNCTION"),
+            InvocationType="Event",
+            Payload=json.dumps({"request_id": request_id, "goals": goals}).encode()
+        )
+        return _response(202, {"request_id": request_id, "status": "started",
+                               "goals": len(goals), "artifact_key": artifact_key})
+
+    # Imported here so the single-goal entrypoints don't load every agent
+    from common import pipeline
+    batch = pipeline.run_batch(goals, max_concurrency=BATCH_CONCURRENCY)
+    return _response(200, {"request_id": request_id, "status": "complete", **batch})
+
+def _load_checkpoint(key):
+    try:
+        obj = s3.get_object(Bucket=os.getenv("ARTIFACTS_BUCKET"), Key=key)
+    except s3.exceptions.NoSuchKey:
+        return None
+    return json.loads(obj["Body"].read())
+
+def _write_checkpoint(key, state):
+    s3.put_object(Bucket=os.getenv("ARTIFACTS_BUCKET"), Key=key,
+                  Body=json.dumps(state).encode(), ContentType="application/json")
+
+def _merge_metrics(total, metrics):
+    if total is None:
+        return {**metrics, "timings": dict(metrics["timings"])}
+    for field in ("goals", "blocked", "tasks_planned", "tasks_executed"):
+        total[field] += metrics[field]
+    for stage, ms in metrics["timings"].items():
+        total["timings"][stage] = round(total["timings"].get(stage, 0) + ms, 1)
+    return total
+
+def batch_handler(event, context):
+    """
+    Run a stored batch in chunks, checkpointing results to ARTIFACTS_BUCKET.
+
+    The artifact is rewritten after every chunk with ``status`` "running"
+    and a ``completed`` count, so a timeout loses at most one chunk. When
+    the next chunk might not fit in the time left, the rest goes to a fresh
+    invocation, which (like a retried one) resumes from the checkpoint.
+    Tasks shared across goals are deduplicated within a chunk.
+    """
+    from common import pipeline
+    request_id = event.get("request_id") or str(uuid.uuid4())
+    goals = event.get("goals", [])
+    key = f"batches/{request_id}.json"
+    state = _load_checkpoint(key) or {"request_id": request_id, "status": "running", "completed": 0,
+                                      "started_at": time.time(), "results": [], "metrics": None}
+
+    ran = False
+    while state["completed"] < len(goals):
+        chunk = goals[state["completed"]:state["completed"] + BATCH_CHUNK_GOALS]
+        if ran and context is not None and \
+                context.get_remaining_time_in_millis() / 1000 < CHUNK_SAFETY * estimated_seconds(len(chunk)):
+            lambda_client.invoke(FunctionName=context.function_name, InvocationType="Event",
+                                 Payload=json.dumps({"request_id": request_id, "goals": goals}).encode())
+            return {"request_id": request_id, "artifact_key": key, "status": "continued",
+                    "completed": state["completed"]}
+        batch = pipeline.run_batch(chunk, max_concurrency=BATCH_CONCURRENCY)
+        ran = True
+        state["results"] += batch["results"]
+        state["completed"] = len(state["results"])
+        state["metrics"] = _merge_metrics(state["metrics"], batch["metrics"])
+        _write_checkpoint(key, state)
+
+    elapsed = time.time() - state["started_at"]
+    if state["metrics"] is not None:
+        state["metrics"]["goals_per_minute"] = round(len(goals) / elapsed * 60, 1) if elapsed else None
+    state["status"] = "complete"
+    _write_checkpoint(key, state)
+    return {"request_id": request_id, "artifact_key": key, "status": "complete", "metrics": state["metrics"]}
 
 def status_entrypoint(event,_):
     rid = event["pathParameters"]["request_id"]
@@ -0,0 +1,199 @@
+import asyncio
+import atexit
+import logging
+import os
+import random
+import threading
+from typing import Any, Awaitable, Dict, Optional, Tuple
+
+import boto3
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+
+from .error_handler import NonRetryableError, RetryableError
+
+logger = logging.getLogger()
+
+# Statuses worth retrying, the same set botocore's standard retry mode uses
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_lock = threading.Lock()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_session = None
+_credentials = None
+
+
+def pool_size() -> int:
+    return int(os.getenv("AIO_POOL_SIZE", "100"))
+
+
+def timeout_seconds() -> float:
+    """
+    Limit for one HTTP attempt; the requests-based clients used 10 seconds
+    """
+    return float(os.getenv("AIO_TIMEOUT_SECONDS", "10"))
+
+
+def deadline_seconds() -> float:
+    """
+    Limit for one call including its retries and backoff, well inside the
+    30-40 second agent Lambda timeouts
+    """
+    return float(os.getenv("AIO_DEADLINE_SECONDS", "20"))
+
+
+def time_left(context, reserve: float = 2.0) -> Optional[float]:
+    """
+    Seconds a handler can hand to ``run`` and still return before its Lambda
+    times out, or None when there is no Lambda context
+    """
+    if context is None or not hasattr(context, "get_remaining_time_in_millis"):
+        return None
+    return max(context.get_remaining_time_in_millis() / 1000 - reserve, 0.1)
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """
+    The process-wide event loop, running on a daemon thread.
+
+    Started on first use and kept for the life of the container, so the
+    connection pool bound to it survives across warm invocations and is
+    shared by every thread that calls ``run``.
+    """
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="aio-loop", daemon=True).start()
+            _loop = loop
+            atexit.register(_close)
+    return _loop
+
+
+def _close():
+    if _session is not None and not _session.closed:
+        asyncio.run_coroutine_threadsafe(_session.close(), _loop).result(5)
+
+
+def run(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    """
+    Run a coroutine on the shared loop from synchronous code and wait for it.
+
+    With ``timeout``, the coroutine is cancelled when it runs out and
+    asyncio.TimeoutError is raised, so no work outlives the caller.
+    """
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is not None:
+        raise RuntimeError("run() called from a coroutine; await it instead")
+    if timeout is not None:
+        coro = asyncio.wait_for(coro, timeout)
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result()
+
+
+async def session():
+    """
+    The shared aiohttp session; callers must be running on the shared loop
+    """
+    global _session
+    if asyncio.get_running_loop() is not _loop:
+        raise RuntimeError("Async clients must run on the shared loop; use common.aio.run")
+    if _session is None or _session.closed:
+        # Imported lazily so synchronous-only functions don't need aiohttp
+        import aiohttp
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=pool_size(), ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=timeout_seconds())
+        )
+    return _session
+
+
+def _frozen_credentials():
+    global _credentials
+    if _credentials is None:
+        _credentials = boto3.Session().get_credentials()
+    # Refreshable credentials rotate underneath; take a consistent snapshot
+    return _credentials.get_frozen_credentials()
+
+
+async def request(method: str, url: str, body: Optional[bytes] = None,
+                  headers: Optional[Dict[str, str]] = None, auth=None,
+                  sign: Optional[Tuple[str, str]] = None, attempts: int = 3,
+                  timeout: Optional[float] = None, deadline: Optional[float] = None) -> Tuple[int, bytes]:
+    """
+    One HTTP call on the shared pool, returning (status, body).
+
+    ``sign`` is a (service, region) pair for SigV4-signed AWS calls.
+    Throttles, 5xx responses and connection errors are retried with jittered
+    backoff; when retries run out, throttles and 5xx raise RetryableError.
+    Each attempt gets ``timeout`` seconds (AIO_TIMEOUT_SECONDS), cut short
+    so the call as a whole, backoff included, ends within ``deadline``
+    seconds (AIO_DEADLINE_SECONDS).
+    """
+    import aiohttp
+    from yarl import URL
+
+    loop = asyncio.get_running_loop()
+    timeout = timeout_seconds() if timeout is None else timeout
+    give_up = loop.time() + (deadline_seconds() if deadline is None else deadline)
+    headers = dict(headers or {})
+    for attempt in range(attempts):
+        send_headers = headers
+        if sign:
+            req = AWSRequest(method=method, url=url, data=body or b"", headers=headers)
+            SigV4Auth(_frozen_credentials(), *sign).add_auth(req)
+            send_headers = dict(req.headers.items())
+        error = None
+        try:
+            sess = await session()
+            limit = aiohttp.ClientTimeout(total=max(min(timeout, give_up - loop.time()), 0.01))
+            # encoded=True keeps escapes such as %3A in model ids exactly as signed
+            async with sess.request(method, URL(url, encoded=True), data=body,
+                                    headers=send_headers, auth=auth, timeout=limit) as resp:
+                status, data = resp.status, await resp.read()
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            status, data, error = None, b"", e
+        if status is not None and status not in RETRY_STATUSES:
+            return status, data
+        delay = min(0.1 * 2 ** attempt, 2.0) * (0.5 + random.random())
+        # Out of attempts, or the backoff alone would run past the deadline
+        if attempt == attempts - 1 or loop.time() + delay >= give_up:
+            if error is not None:
+                raise RetryableError(f"{method} {url}: {str(error) or type(error).__name__}") from error
+            raise RetryableError(f"{method} {url} returned {status}: {data[:200]!r}")
+        logger.warning(f"{method} {url} attempt {attempt + 1} got {status}; retrying in {delay:.2f}s")
+        await asyncio.sleep(delay)
+    raise RetryableError(f"{method} {url} failed after {attempts} attempts")
+
+
+async def aws_json(service: str, url: str, payload: bytes) -> bytes:
+    """
+    Signed POST of a JSON body to an AWS endpoint; non-retryable client
+    errors raise NonRetryableError
+    """
+    region = os.getenv("REGION") or os.getenv("AWS_REGION") or "us-east-1"
+    status, data = await request(
+        "POST", url, body=payload,
+        headers={"Content-Type": "application/json", "Accept": "application/json"},
+        sign=(service, region)
+    )
+    if status >= 400:
+        raise NonRetryableError(f"{service} returned {status}: {data[:200]!r}")
+    return data
+
+
+def bedrock_url(model_id: str) -> str:
+    from urllib.parse import quote
+    region = os.getenv("REGION") or os.getenv("AWS_REGION") or "us-east-1"
+    endpoint = os.getenv("BEDROCK_ENDPOINT_URL") or f"https://bedrock-runtime.{region}.amazonaws.com"
+    return f"{endpoint.rstrip('/')}/model/{quote(model_id, safe='')}/invoke"
+
+
+async def gather_settled(*aws: Awaitable) -> list:
+    """
+    ``asyncio.gather`` that returns exceptions in place of results, so one
+    failed call doesn't cancel its siblings
+    """
+    return list(await asyncio.gather(*aws, return_exceptions=True))
@@ -1,10 +1,10 @@
 import json, os, boto3
+from .aio import aws_json, bedrock_url
 
 bedrock = boto3.client("bedrock-runtime", region_name=os.getenv("REGION"))
 
-def call_llm(system, context_obj, user_msg, model_id=None, max_tokens=1000):
-    model_id = model_id or os.getenv("REASONING_MODEL_ID")
-    body = {
+def _request_body(system, context_obj, user_msg, max_tokens):
+    return {
       "anthropic_version": "bedrock-2023-05-31",
       "max_tokens": max_tokens,
       "messages": [
@@ -12,6 +12,17 @@ def call_llm(system, context_obj, user_msg, model_id=None, max_tokens=1000):
         {"role":"user","content":json.dumps({"context":context_obj,"message":user_msg})}
       ]
     }
+
+def call_llm(system, context_obj, user_msg, model_id=None, max_tokens=1000):
+    model_id = model_id or os.getenv("REASONING_MODEL_ID")
+    body = _request_body(system, context_obj, user_msg, max_tokens)
     resp = bedrock.invoke_model(modelId=model_id, body=json.dumps(body))
     payload = json.loads(resp["body"].read())
-    return payload["content"][0]["text"]
\ No newline at end of file
+    return payload["content"][0]["text"]
+
+async def acall_llm(system, context_obj, user_msg, model_id=None, max_tokens=1000):
+    """Async call_llm on the shared loop and connection pool (see common.aio)"""
+    model_id = model_id or os.getenv("REASONING_MODEL_ID")
+    body = json.dumps(_request_body(system, context_obj, user_msg, max_tokens)).encode()
+    payload = json.loads(await aws_json("bedrock", bedrock_url(model_id), body))
+    return payload["content"][0]["text"]
@@ -0,0 +1,152 @@
+import gzip
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import boto3
+
+logger = logging.getLogger()
+
+s3 = boto3.client("s3")
+
+# Step Functions rejects state payloads above 256 KB, and the Map state
+# collects every task result into FanOutResults, so individual results must
+# stay well below that.
+DEFAULT_THRESHOLD_BYTES = 32 * 1024
+CLAIM_PREFIX = "claims"
+
+# Small fields that stay inline so synth and the Step Functions console still
+# see what a task produced without fetching the full payload.
+SUMMARY_FIELDS = ("task_id", "query", "citations", "results_count", "metadata", "error",
+                  "elapsed_ms")
+
+
+def payload_size(obj: Any) -> int:
+    """
+    Size in bytes of an object once serialized the way Step Functions sees it
+    """
+    return len(json.dumps(obj, separators=(",", ":"), default=str).encode("utf-8"))
+
+
+def _threshold() -> int:
+    return int(os.getenv("CLAIM_CHECK_THRESHOLD_BYTES", DEFAULT_THRESHOLD_BYTES))
+
+
+def _enabled() -> bool:
+    return os.getenv("CLAIM_CHECK_ENABLED", "true").lower() == "true"
+
+
+def summarize(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the inline summary that travels with a claim check
+    """
+    summary = {k: result[k] for k in SUMMARY_FIELDS if k in result}
+    for key, value in result.items():
+        if isinstance(value, list) and key not in summary:
+            summary[f"{key}_count"] = len(value)
+    return summary
+
+
+def offload_if_large(result: Dict[str, Any], threshold: Optional[int] = None,
+                     bucket: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Replace a task result with an S3 claim check when it exceeds the threshold.
+
+    Results under the threshold are returned unchanged apart from a
+    ``payload_bytes`` field. Larger results are gzipped to ARTIFACTS_BUCKET
+    and only a reference plus a summary is passed along.
+    """
+    size = payload_size(result)
+    threshold = _threshold() if threshold is None else threshold
+    bucket = bucket or os.getenv("ARTIFACTS_BUCKET")
+
+    if not _enabled() or size <= threshold or not bucket:
+        return {**result, "payload_bytes": size}
+
+    body = gzip.compress(json.dumps(result, default=str).encode("utf-8"))
+    key = f"{CLAIM_PREFIX}/{result.get('task_id', 'task')}/{uuid.uuid4().hex}.json.gz"
+
+    try:
+        s3.put_object(Bucket=bucket, Key=key, Body=body,
+                      ContentType="application/json", ContentEncoding="gzip")
+    except Exception as e:
+        # Passing the full result along is still better than losing it
+        logger.error(f"Claim check offload failed for {key}: {str(e)}")
+        return {**result, "payload_bytes": size}
+
+    claim = {
+        **summarize(result),
+        "claim_check": {
+            "bucket": bucket,
+            "key": key,
+            "original_bytes": size,
+            "compressed_bytes": len(body)
+        }
+    }
+    claim["payload_bytes"] = payload_size(claim)
+
+    logger.info(
+        f"Offloaded {size} byte result to s3://{bucket}/{key} "
+        f"({len(body)} bytes compressed, {claim['payload_bytes']} bytes inline)"
+    )
+    return claim
+
+
+def is_claim(result: Any) -> bool:
+    return isinstance(result, dict) and "claim_check" in result
+
+
+def resolve(result: Any) -> Any:
+    """
+    Fetch the full result behind a claim check; other values pass through
+    """
+    if not is_claim(result):
+        return result
+
+    ref = result["claim_check"]
+    obj = s3.get_object(Bucket=ref["bucket"], Key=ref["key"])
+    return json.loads(gzip.decompress(obj["Body"].read()))
+
+
+def resolve_all(results: List[Any], max_workers: int = 8) -> List[Any]:
+    """
+    Resolve every claim check in a list in parallel, preserving order.
+
+    A claim that cannot be fetched degrades to its inline summary so one
+    missing artifact does not fail the whole synthesis.
+    """
+    claims = [i for i, r in enumerate(results) if is_claim(r)]
+    if not claims:
+        return list(results)
+
+    def _fetch(i):
+        try:
+            return resolve(results[i])
+        except Exception as e:
+            logger.error(f"Failed to resolve claim {results[i]['claim_check']['key']}: {str(e)}")
+            return {k: v for k, v in results[i].items() if k != "claim_check"}
+
+    resolved = list(results)
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(claims))) as pool:
+        for i, value in zip(claims, pool.map(_fetch, claims)):
+            resolved[i] = value
+    return resolved
+
+
+def resolve_all_timed(results: List[Any], max_workers: int = 8):
+    """
+    resolve_all plus the transition payload size and resolve latency
+    """
+    start = time.perf_counter()
+    resolved = resolve_all(results, max_workers=max_workers)
+    metrics = {
+        "transition_payload_bytes": payload_size(results),
+        "resolved_payload_bytes": payload_size(resolved),
+        "claims_resolved": sum(1 for r in results if is_claim(r)),
+        "resolve_ms": round((time.perf_counter() - start) * 1000, 1)
+    }
+    return resolved, metrics
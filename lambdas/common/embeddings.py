@@ -1,7 +1,14 @@
 import os, json, boto3
+from .aio import aws_json, bedrock_url
 bedrock = boto3.client("bedrock-runtime", region_name=os.getenv("REGION"))
 
 def embed(text: str):
     body = {"inputText": text}
     resp = bedrock.invoke_model(modelId=os.getenv("EMBEDDINGS_MODEL_ID"), body=json.dumps(body))
-    return json.loads(resp["body"].read())["embedding"]
\ No newline at end of file
+    return json.loads(resp["body"].read())["embedding"]
+
+async def aembed(text: str):
+    """Async embed on the shared loop and connection pool (see common.aio)"""
+    body = json.dumps({"inputText": text}).encode()
+    resp = await aws_json("bedrock", bedrock_url(os.getenv("EMBEDDINGS_MODEL_ID")), body)
+    return json.loads(resp)["embedding"]
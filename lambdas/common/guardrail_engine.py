@@ -0,0 +1,306 @@
+import bisect
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from .error_handler import NonRetryableError
+
+logger = logging.getLogger()
+
+DEFAULT_POLICY_PATH = os.path.join(os.path.dirname(__file__), "guardrail_policy.json")
+SCOPES = ("input", "plan", "output")
+
+
+class GuardrailViolation(NonRetryableError):
+    """Text matched a blocking guardrail rule"""
+    pass
+
+
+def _rule_regex(rule: Dict[str, Any]) -> str:
+    """
+    One alternation covering a rule's keywords and patterns
+    """
+    parts = []
+    keywords = sorted(rule.get("keywords", []), key=len, reverse=True)
+    if keywords:
+        # Longest first so "terminate all" wins over a shorter keyword prefix
+        parts.append(r"\b(?:" + "|".join(re.escape(k) for k in keywords) + r")\b")
+    for pattern in rule.get("patterns", []):
+        if re.compile(pattern).groupindex:
+            raise ValueError(f"Rule {rule['id']}: named groups are not allowed in patterns")
+        parts.append(f"(?:{pattern})")
+    if not parts:
+        raise ValueError(f"Rule {rule['id']} has no keywords or patterns")
+    body = "|".join(parts)
+    return body if not rule.get("case_sensitive") else f"(?-i:{body})"
+
+
+# Up to this many literals, one str.find sweep per literal (memchr-based, in
+# C) beats walking an automaton; beyond it the single-pass automaton wins.
+FIND_MAX_LITERALS = 24
+
+# Once the windows of all rules add up to this fraction of the text, one
+# combined-regex pass is cheaper than checking them rule by rule (digit
+# anchors put most of an invoice or a table inside a credit_card window).
+WINDOW_FALLBACK_RATIO = 0.5
+# Collecting an anchor hit costs more per hit than the combined regex costs
+# per character; past one hit per this many characters, stop collecting.
+MIN_CHARS_PER_HIT = 32
+
+
+class _LiteralScanner:
+    """
+    Finds every occurrence of a set of literals.
+
+    Small literal sets are swept with str.find. Larger ones use an
+    Aho-Corasick automaton when pyahocorasick is installed, falling back to
+    a combined literal regex otherwise.
+    """
+    def __init__(self, literals: Dict[str, List[int]]):
+        self.literals = literals
+        self.automaton = None
+        self.regex = None
+        if len(literals) <= FIND_MAX_LITERALS:
+            return
+        try:
+            import ahocorasick
+            self.automaton = ahocorasick.Automaton()
+            for literal, owners in literals.items():
+                self.automaton.add_word(literal, (len(literal), owners))
+            self.automaton.make_automaton()
+        except ImportError:
+            ordered = sorted(literals, key=len, reverse=True)
+            self.regex = re.compile("|".join(re.escape(lit) for lit in ordered))
+
+    def iter(self, text: str):
+        """
+        Yield (start, end, owning rule indices) for each literal hit
+        """
+        if self.automaton is not None:
+            for last, (length, owners) in self.automaton.iter(text):
+                yield last + 1 - length, last + 1, owners
+        elif self.regex is not None:
+            for m in self.regex.finditer(text):
+                yield m.start(), m.end(), self.literals[m.group(0)]
+        else:
+            for literal, owners in self.literals.items():
+                i = text.find(literal)
+                while i != -1:
+                    yield i, i + len(literal), owners
+                    i = text.find(literal, i + 1)
+
+
+class GuardrailEngine:
+    """
+    Policy rules compiled once into a literal automaton plus per-rule regexes.
+
+    Keywords, and the ``anchors`` that regex rules declare (a literal every
+    match must contain, e.g. "@" for email), are located in the lowercased
+    text by a _LiteralScanner (Aho-Corasick for large literal sets). Only
+    the short windows around anchor hits are checked with the rule's regex,
+    so cost tracks the text length rather than the number of rules. Rules
+    without anchors are scanned in full. A combined regex with one named
+    group per rule covers text whose lowercase form changes length, and
+    text so dense with anchors (digits in a table) that the windows would
+    cover most of it anyway.
+    """
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.rules = list(rules)
+        self.regexes = [re.compile(_rule_regex(rule), re.IGNORECASE) for rule in self.rules]
+        self.max_length = []
+        self.unanchored = []
+
+        literals: Dict[str, List[int]] = {}
+        for i, rule in enumerate(self.rules):
+            anchors = list(rule.get("keywords", []))
+            if rule.get("patterns"):
+                # Patterns can only be windowed if the rule names a literal every match contains
+                anchors = (anchors + rule["anchors"]) if rule.get("anchors") else []
+            if not anchors:
+                self.unanchored.append(i)
+            for anchor in anchors:
+                literals.setdefault(anchor.lower(), []).append(i)
+            longest_keyword = max((len(k) for k in rule.get("keywords", [])), default=0)
+            self.max_length.append(max(rule.get("max_length", 256 if rule.get("patterns") else 0),
+                                       longest_keyword))
+        self.scanner = _LiteralScanner(literals)
+
+        self.combined = None
+        if self.rules:
+            combined = "|".join(f"(?P<r{i}>{_rule_regex(rule)})" for i, rule in enumerate(self.rules))
+            self.combined = re.compile(combined, re.IGNORECASE)
+
+    def _finding(self, i: int, start: int, end: int, text: str) -> Dict[str, Any]:
+        rule = self.rules[i]
+        return {
+            "rule": rule["id"],
+            "category": rule.get("category", rule["id"]),
+            "action": rule.get("action", "block"),
+            "start": start,
+            "end": end,
+            "match": text[start:end]
+        }
+
+    def _scan_combined(self, text: str) -> List[Dict[str, Any]]:
+        return [self._finding(int(m.lastgroup[1:]), m.start(), m.end(), text)
+                for m in self.combined.finditer(text)]
+
+    def scan(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Every rule match in the text, in order, without overlaps
+        """
+        if not text or not self.rules:
+            return []
+        lower = text.lower()
+        if len(lower) != len(text):
+            # Offsets in the lowercased text would not line up
+            return self._scan_combined(text)
+
+        hits: Dict[int, List[Tuple[int, int]]] = {}
+        budget = len(text) // MIN_CHARS_PER_HIT
+        for start, end, owners in self.scanner.iter(lower):
+            budget -= 1
+            if budget < 0:
+                return self._scan_combined(text)
+            for i in owners:
+                hits.setdefault(i, []).append((max(0, start - self.max_length[i]), end + self.max_length[i]))
+
+        windows: Dict[int, List[List[int]]] = {i: [[0, len(text)]] for i in self.unanchored}
+        for i, rule_hits in hits.items():
+            # The str.find sweep yields hits literal by literal, not in text order
+            spans = windows.setdefault(i, [])
+            for lo, hi in sorted(rule_hits):
+                if spans and lo <= spans[-1][1]:
+                    spans[-1][1] = max(spans[-1][1], hi)
+                else:
+                    spans.append([lo, min(hi, len(text))])
+            spans[-1][1] = min(spans[-1][1], len(text))
+
+        covered = sum(hi - lo for spans in windows.values() for lo, hi in spans)
+        if covered > WINDOW_FALLBACK_RATIO * len(text):
+            return self._scan_combined(text)
+
+        # Resolve overlaps as finditer over the combined regex would: the
+        # earliest match wins, ties go to the rule listed first, and every
+        # rule resumes searching after the match taken.
+        ends = {i: [hi for _, hi in spans] for i, spans in windows.items()}
+        upcoming = {i: self._next_match(i, spans, ends[i], 0, text) for i, spans in windows.items()}
+        findings = []
+        while True:
+            live = [(m.start(), i) for i, m in upcoming.items() if m is not None]
+            if not live:
+                return findings
+            _, i = min(live)
+            match = upcoming[i]
+            findings.append(self._finding(i, match.start(), match.end(), text))
+            for j, m in upcoming.items():
+                if m is not None and m.start() < match.end():
+                    upcoming[j] = self._next_match(j, windows[j], ends[j], match.end(), text)
+
+    def _next_match(self, i: int, spans: List[List[int]], ends: List[int], pos: int, text: str):
+        """
+        First non-empty match of rule ``i`` at or after ``pos`` inside its
+        windows, starting from the first window that ends after ``pos``
+        """
+        regex = self.regexes[i]
+        for k in range(bisect.bisect_right(ends, pos), len(spans)):
+            lo, hi = spans[k]
+            for m in regex.finditer(text, max(lo, pos), hi):
+                # Re-match against the full text so a window edge can't cut a match short
+                full = regex.match(text, m.start())
+                if full and full.end() > full.start():
+                    return full
+        return None
+
+    def check(self, text: str) -> Dict[str, Any]:
+        """
+        Verdict for a piece of text, with PII/secret matches redacted
+        """
+        findings = self.scan(text)
+        blocked = [f for f in findings if f["action"] == "block"]
+        return {
+            "allowed": not blocked,
+            "reason": f"Unsafe intent: {blocked[0]['match']} ({blocked[0]['rule']})" if blocked else None,
+            "redacted": redact(text, findings),
+            "findings": [{k: v for k, v in f.items() if k != "match"} for f in findings]
+        }
+
+
+def redact(text: str, findings: List[Dict[str, Any]]) -> str:
+    """
+    Replace ``redact`` findings with a category placeholder
+    """
+    out, last = [], 0
+    for f in findings:
+        if f["action"] != "redact":
+            continue
+        out.append(text[last:f["start"]])
+        out.append(f"[REDACTED:{f['category']}]")
+        last = f["end"]
+    if not out:
+        return text
+    out.append(text[last:])
+    return "".join(out)
+
+
+def load_policy(path: Optional[str] = None) -> Dict[str, Any]:
+    with open(path or os.getenv("GUARDRAIL_POLICY_PATH", DEFAULT_POLICY_PATH)) as f:
+        return json.load(f)
+
+
+_engines: Dict[str, GuardrailEngine] = {}
+
+
+def get_engine(scope: str = "input") -> GuardrailEngine:
+    """
+    Engine for the rules that apply to ``scope``, compiled once per container
+    """
+    if scope not in SCOPES:
+        raise ValueError(f"Unknown scope {scope!r}; expected one of {SCOPES}")
+    if scope not in _engines:
+        policy = load_policy()
+        rules = [r for r in policy.get("rules", []) if scope in r.get("scopes", SCOPES)]
+        _engines[scope] = GuardrailEngine(rules)
+        logger.info(f"Compiled {len(rules)} guardrail rules for {scope}")
+    return _engines[scope]
+
+
+def check_goal(goal: str) -> Dict[str, Any]:
+    return get_engine("input").check(goal or "")
+
+
+def screen_tasks(tasks: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Split planned tasks into allowed and blocked.
+
+    Each task's description and inputs are scanned; redactable matches in
+    the inputs are rewritten in place on the allowed tasks.
+    """
+    engine = get_engine("plan")
+    allowed, blocked = [], []
+    for task in tasks:
+        text = json.dumps({"description": task.get("description", ""), "inputs": task.get("inputs", {})})
+        verdict = engine.check(text)
+        if not verdict["allowed"]:
+            blocked.append({"id": task.get("id"), "reason": verdict["reason"]})
+            continue
+        if verdict["redacted"] != text:
+            try:
+                redacted = json.loads(verdict["redacted"])
+                task["description"] = redacted["description"]
+                task["inputs"] = redacted["inputs"]
+            except (ValueError, KeyError):
+                # A match spanning JSON syntax; keep the task as planned
+                pass
+        allowed.append(task)
+    return allowed, blocked
+
+
+def screen_output(text: str) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Redact PII and secrets from synthesized output
+    """
+    verdict = get_engine("output").check(text or "")
+    return verdict["redacted"], verdict["findings"]
@@ -0,0 +1,313 @@
+"""
+Versioned OpenSearch index management.
+
+Indexes are created from a spec (see infra/index-spec.json) as
+``<alias>_v<version>`` and read and written through the alias, so a re-tuned
+index can be built and reindexed beside the live one and swapped in
+atomically.
+
+    python -m common.index_admin rollout --spec ../infra/index-spec.json --version 2
+    python -m common.index_admin estimate --spec ../infra/index-spec.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import requests
+
+logger = logging.getLogger()
+
+DEFAULT_ALIAS = "documents"
+
+# Bytes per stored dimension for each quantization option
+BYTES_PER_DIM = {"none": 4, "fp16": 2, "byte": 1}
+ENGINES = ("faiss", "nmslib", "lucene")
+
+# Seconds between polls of a background reindex task
+TASK_POLL_SECONDS = 5
+
+
+def resolve_index() -> str:
+    """
+    Path prefix every caller should use for the documents index
+    """
+    return f"/{os.getenv('OS_INDEX_ALIAS', DEFAULT_ALIAS)}"
+
+
+def load_spec(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        spec = json.load(f)
+    validate_spec(spec)
+    return spec
+
+
+def validate_spec(spec: Dict[str, Any]) -> None:
+    vector = spec.get("vector", {})
+    engine = vector.get("engine", "faiss")
+    quantization = vector.get("quantization", "none")
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}; expected one of {ENGINES}")
+    if quantization not in BYTES_PER_DIM:
+        raise ValueError(f"Unknown quantization {quantization!r}; expected one of {tuple(BYTES_PER_DIM)}")
+    if quantization == "fp16" and engine != "faiss":
+        raise ValueError("fp16 quantization uses the faiss scalar quantizer; set engine to faiss")
+    if quantization == "byte" and engine != "lucene":
+        raise ValueError("byte vectors require the lucene engine on OpenSearch 2.13")
+    if not spec.get("alias"):
+        raise ValueError("spec needs an alias")
+
+
+def index_name(spec: Dict[str, Any], version: int) -> str:
+    return f"{spec['alias']}_v{version}"
+
+
+def build_index_body(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Settings and mappings for a new index, including the HNSW method
+    """
+    vector = spec["vector"]
+    engine = vector.get("engine", "faiss")
+    quantization = vector.get("quantization", "none")
+
+    method = {
+        "name": "hnsw",
+        "engine": engine,
+        "space_type": vector.get("space_type", "l2"),
+        "parameters": {
+            "m": vector.get("m", 16),
+            "ef_construction": vector.get("ef_construction", 128)
+        }
+    }
+    # faiss reads ef_search from the mapping; nmslib from the index setting below
+    if engine == "faiss" and "ef_search" in vector:
+        method["parameters"]["ef_search"] = vector["ef_search"]
+    if quantization == "fp16":
+        method["parameters"]["encoder"] = {"name": "sq", "parameters": {"type": "fp16"}}
+
+    field = {"type": "knn_vector", "dimension": vector["dimension"], "method": method}
+    if quantization == "byte":
+        field["data_type"] = "byte"
+
+    settings = {
+        "index": {
+            "number_of_shards": spec.get("shards", 1),
+            "number_of_replicas": spec.get("replicas", 0),
+            "knn": True
+        }
+    }
+    # Lucene takes ef_search from the query's k
+    if engine == "nmslib" and "ef_search" in vector:
+        settings["index"]["knn.algo_param.ef_search"] = vector["ef_search"]
+
+    properties = dict(spec.get("properties", {}))
+    properties[vector.get("field", "embedding_vector")] = field
+    return {"settings": settings, "mappings": {"properties": properties}}
+
+
+def estimate_memory(spec: Dict[str, Any], vectors: int = 1_000_000) -> Dict[str, Any]:
+    """
+    Native HNSW graph memory, using the OpenSearch sizing formula
+    1.1 * (bytes_per_dim * dimension + 8 * m) bytes per vector, times replicas
+    """
+    vector = spec["vector"]
+    per_vector = 1.1 * (BYTES_PER_DIM[vector.get("quantization", "none")] * vector["dimension"]
+                        + 8 * vector.get("m", 16))
+    copies = 1 + spec.get("replicas", 0)
+    total = per_vector * vectors * copies
+    return {
+        "vectors": vectors,
+        "bytes_per_vector": round(per_vector, 1),
+        "total_gb": round(total / 2**30, 2)
+    }
+
+
+class IndexAdmin:
+    """
+    Thin client for the index, reindex and alias APIs
+    """
+    def __init__(self, endpoint: Optional[str] = None, auth=None, timeout: float = 30):
+        endpoint = endpoint or os.getenv("OS_ENDPOINT", "")
+        self.base = endpoint if endpoint.startswith("http") else f"https://{endpoint}"
+        if auth is None and os.getenv("OS_USERNAME"):
+            auth = (os.getenv("OS_USERNAME"), os.getenv("OS_PASSWORD", ""))
+        self.session = requests.Session()
+        self.session.auth = auth
+        self.session.headers.update({"Content-Type": "application/json"})
+        self.timeout = timeout
+
+    def _request(self, method, path, body=None, **params):
+        resp = self.session.request(method, self.base + path, params=params or None,
+                                    data=json.dumps(body) if body is not None else None,
+                                    timeout=self.timeout)
+        if resp.status_code >= 400:
+            raise RuntimeError(f"{method} {path} failed ({resp.status_code}): {resp.text[:500]}")
+        return resp.json()
+
+    def exists(self, index: str) -> bool:
+        return self.session.head(f"{self.base}/{index}", timeout=self.timeout).status_code == 200
+
+    def create(self, spec: Dict[str, Any], version: int) -> str:
+        name = index_name(spec, version)
+        if self.exists(name):
+            logger.info(f"Index {name} already exists")
+            return name
+        self._request("PUT", f"/{name}", build_index_body(spec))
+        logger.info(f"Created index {name}")
+        return name
+
+    def alias_targets(self, alias: str) -> List[str]:
+        resp = self.session.get(f"{self.base}/_alias/{alias}", timeout=self.timeout)
+        if resp.status_code == 404:
+            return []
+        return sorted(resp.json())
+
+    def reindex(self, source: str, dest: str) -> Dict[str, Any]:
+        """
+        Bulk copy ``source`` into ``dest`` in parallel slices.
+
+        Copies carry the source ``_version`` (external versioning), so a
+        document in ``dest`` is only replaced by a newer version of itself.
+        Running it again after the alias swap picks up documents created or
+        updated in ``source`` during the first pass without clobbering ones
+        rewritten through the alias since.
+        """
+        body = {
+            "source": {"index": source, "size": 1000},
+            "dest": {"index": dest, "version_type": "external"},
+            # A conflict means dest already holds this version or a newer one
+            "conflicts": "proceed"
+        }
+        # A reindex outlives any request timeout; run it as a task and poll it
+        task = self._request("POST", "/_reindex", body,
+                             slices="auto", refresh="true", wait_for_completion="false")["task"]
+        logger.info(f"Reindex {source} -> {dest} running as task {task}")
+        return self.wait_for_task(task)
+
+    def wait_for_task(self, task: str, poll_seconds: float = TASK_POLL_SECONDS,
+                      max_seconds: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Poll ``_tasks/<task>`` until it completes and return its response
+        """
+        started = time.monotonic()
+        while True:
+            status = self._request("GET", f"/_tasks/{task}")
+            if status.get("completed"):
+                break
+            if max_seconds is not None and time.monotonic() - started > max_seconds:
+                raise TimeoutError(f"Task {task} still running after {max_seconds}s")
+            time.sleep(poll_seconds)
+        if status.get("error"):
+            raise RuntimeError(f"Task {task} failed: {json.dumps(status['error'])[:500]}")
+        resp = status.get("response", {})
+        if resp.get("failures"):
+            raise RuntimeError(f"Task {task} had {len(resp['failures'])} failures: "
+                               f"{json.dumps(resp['failures'][:3])[:500]}")
+        return resp
+
+    def swap_alias(self, alias: str, index: str) -> List[str]:
+        """
+        Point the alias at ``index`` and away from everything else in one call
+        """
+        previous = [i for i in self.alias_targets(alias) if i != index]
+        actions = [{"remove": {"index": old, "alias": alias}} for old in previous]
+        actions.append({"add": {"index": index, "alias": alias, "is_write_index": True}})
+        self._request("POST", "/_aliases", {"actions": actions})
+        logger.info(f"Alias {alias} -> {index} (was {previous or 'unset'})")
+        return previous
+
+    def set_ef_search(self, index: str, ef_search: int) -> None:
+        """
+        Change ef_search on a live nmslib index. faiss fixes it in the
+        mapping, so a faiss index needs a new version to change it.
+        """
+        self._request("PUT", f"/{index}/_settings", {"index": {"knn.algo_param.ef_search": ef_search}})
+
+    def rollout(self, spec: Dict[str, Any], version: int,
+                source: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Create the versioned index, copy the live data in, and swap the alias.
+
+        Versions are counted per index, so the catch-up pass cannot order a
+        document updated in the old index during the copy and again in the
+        new one after the swap: if the old index saw more updates, its copy
+        wins. Deletes made during the copy are not carried over. Pause ingest
+        for the rollout, or re-ingest the affected keys, when that matters.
+        """
+        alias = spec["alias"]
+        dest = self.create(spec, version)
+        sources = [source] if source else [i for i in self.alias_targets(alias) if i != dest]
+
+        for src in sources:
+            self.reindex(src, dest)
+        previous = self.swap_alias(alias, dest)
+        catch_up = {}
+        for src in sources:
+            resp = self.reindex(src, dest)
+            catch_up[src] = {f: resp.get(f, 0) for f in ("created", "updated", "version_conflicts")}
+            logger.info(f"Catch-up from {src}: {catch_up[src]['created']} created, "
+                        f"{catch_up[src]['updated']} updated, {catch_up[src]['version_conflicts']} already current")
+
+        return {"alias": alias, "index": dest, "previous": previous, "reindexed_from": sources,
+                "catch_up": catch_up}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage versioned documents indexes")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    helps = {
+        "rollout": "create the version, reindex into it, swap the alias, then re-copy documents "
+                   "written during the copy by version; updates made to the same document in both "
+                   "indexes around the swap, and deletes during the copy, can be lost, so pause "
+                   "ingest for strict consistency"
+    }
+    for name in ("create", "rollout", "estimate", "body"):
+        p = sub.add_parser(name, help=helps.get(name))
+        p.add_argument("--spec", default=os.path.join(os.path.dirname(__file__), "..", "..", "infra", "index-spec.json"))
+        if name in ("create", "rollout"):
+            p.add_argument("--version", type=int, required=True)
+        if name == "rollout":
+            p.add_argument("--source", help="index to copy from (default: current alias targets)")
+        if name == "estimate":
+            p.add_argument("--vectors", type=int, default=1_000_000)
+
+    p = sub.add_parser("reindex", help="copy source into dest, keeping newer versions already in dest")
+    p.add_argument("source")
+    p.add_argument("dest")
+
+    p = sub.add_parser("swap")
+    p.add_argument("alias")
+    p.add_argument("index")
+
+    sub.add_parser("resolve")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.command == "resolve":
+        out = resolve_index()
+    elif args.command == "reindex":
+        out = IndexAdmin().reindex(args.source, args.dest)
+    elif args.command == "swap":
+        out = {"previous": IndexAdmin().swap_alias(args.alias, args.index)}
+    else:
+        spec = load_spec(args.spec)
+        if args.command == "body":
+            out = build_index_body(spec)
+        elif args.command == "estimate":
+            out = {q: estimate_memory({**spec, "vector": {**spec["vector"], "quantization": q}}, args.vectors)
+                   for q in BYTES_PER_DIM}
+        elif args.command == "create":
+            out = {"index": IndexAdmin().create(spec, args.version)}
+        else:
+            out = IndexAdmin().rollout(spec, args.version, source=args.source)
+
+    print(json.dumps(out, indent=2) if not isinstance(out, str) else out)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import boto3
+import numpy as np
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+s3 = boto3.client("s3")
+
+DEFAULT_INDEX_KEY = "ingest/near-dup-index.json.gz"
+NUM_PERM = 128
+# 16 bands of 8 rows: a pair with Jaccard 0.85 becomes a candidate 99% of
+# the time, one at 0.5 about 6% of the time (and is then rejected on the
+# full signature).
+BANDS = 16
+SHINGLE_WORDS = 5
+SEED = 1
+
+# Mersenne prime for the universal hash family; a * h stays below 2**62, so
+# the arithmetic fits in uint64.
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(SEED)
+_A = _rng.integers(1, _PRIME, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, size=NUM_PERM, dtype=np.uint64)
+
+
+def default_threshold() -> float:
+    return float(os.getenv("NEAR_DUP_THRESHOLD", "0.85"))
+
+
+def default_mode() -> str:
+    """
+    ``skip`` (drop duplicates), ``link`` (index them with the canonical
+    chunk's vector) or ``off``
+    """
+    return os.getenv("NEAR_DUP_MODE", "skip").lower()
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> List[str]:
+    """
+    Overlapping word n-grams of the normalized text
+    """
+    words = re.findall(r"\w+", (text or "").lower())
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def minhash(text: str) -> np.ndarray:
+    """
+    MinHash signature (NUM_PERM uint32 values) of the text's shingle set
+    """
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+         for s in set(shingles(text))),
+        dtype=np.uint64
+    )
+    if not hashes.size:
+        return np.full(NUM_PERM, _PRIME, dtype=np.uint32)
+    hashes %= _PRIME
+    return ((_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    Estimated Jaccard similarity of two signatures
+    """
+    return float(np.mean(a == b))
+
+
+class NearDupIndex:
+    """
+    LSH index over chunk signatures, persisted between invocations.
+
+    Each chunk is keyed by its OpenSearch doc id and remembers the S3 key it
+    came from, so re-uploading a key replaces its entries rather than
+    matching its own previous version. Duplicates that were not indexed are
+    recorded in ``links`` under their own doc id, with the canonical id and
+    the canonical chunk's signature at the time of linking.
+    """
+    def __init__(self, threshold: Optional[float] = None):
+        self.threshold = default_threshold() if threshold is None else threshold
+        self.rows = NUM_PERM // BANDS
+        self.chunks: Dict[str, Dict[str, Any]] = {}
+        self.links: Dict[str, Dict[str, Any]] = {}
+        self.buckets: Dict[Tuple[int, bytes], List[str]] = {}
+        self.etag: Optional[str] = None
+        # Mutations since load, replayed onto a fresh copy if the save races another writer
+        self._ops: List[Tuple[str, tuple]] = []
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def _band_keys(self, sig: np.ndarray):
+        for band in range(BANDS):
+            yield band, sig[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def _apply(self, op: str, args: tuple) -> None:
+        if op == "add":
+            doc_id, sig, source = args
+            self.chunks[doc_id] = {"sig": sig, "source": source}
+            for band_key in self._band_keys(sig):
+                self.buckets.setdefault(band_key, []).append(doc_id)
+        elif op == "link":
+            duplicate, canonical, source, sig = args
+            self.links[duplicate] = {"canonical": canonical, "source": source, "sig": sig}
+        elif op == "remove_source":
+            source, = args
+            gone = {d for d, c in self.chunks.items() if c["source"] == source}
+            for doc_id in gone:
+                for band_key in self._band_keys(self.chunks.pop(doc_id)["sig"]):
+                    members = self.buckets.get(band_key, [])
+                    if doc_id in members:
+                        members.remove(doc_id)
+            for d in [d for d, l in self.links.items() if l["source"] == source]:
+                del self.links[d]
+
+    def _do(self, op: str, *args) -> None:
+        self._apply(op, args)
+        self._ops.append((op, args))
+
+    def add(self, doc_id: str, sig: np.ndarray, source: str) -> None:
+        self._do("add", doc_id, sig, source)
+
+    def link(self, duplicate: str, canonical: str, source: str) -> None:
+        self._do("link", duplicate, canonical, source, self.chunks[canonical]["sig"])
+
+    def remove_source(self, source: str) -> None:
+        self._do("remove_source", source)
+
+    def query(self, sig: np.ndarray) -> Optional[Tuple[str, float]]:
+        """
+        Most similar indexed chunk at or above the threshold, if any
+        """
+        candidates = set()
+        for band_key in self._band_keys(sig):
+            candidates.update(self.buckets.get(band_key, ()))
+        best = None
+        for doc_id in candidates:
+            score = similarity(sig, self.chunks[doc_id]["sig"])
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (doc_id, score)
+        return best
+
+    def orphans(self) -> List[str]:
+        """
+        Skipped duplicates whose canonical chunk is gone or has changed.
+
+        Re-uploading a canonical key reuses its doc ids, so the chunk now
+        under the canonical id is compared with the signature recorded at
+        link time; below the threshold, the shared content is gone.
+        """
+        out = []
+        for d, l in self.links.items():
+            chunk = self.chunks.get(l["canonical"])
+            if chunk is None or (l.get("sig") is not None
+                                 and similarity(chunk["sig"], l["sig"]) < self.threshold):
+                out.append(d)
+        return out
+
+    def orphan_sources(self) -> List[str]:
+        """
+        Keys to re-ingest so their orphaned duplicates get indexed
+        """
+        return sorted({self.links[d]["source"] for d in self.orphans()})
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._ops)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "version": 1,
+            "num_perm": NUM_PERM,
+            "bands": BANDS,
+            "shingle_words": SHINGLE_WORDS,
+            "seed": SEED,
+            "chunks": {d: {"sig": base64.b64encode(c["sig"].tobytes()).decode("ascii"),
+                           "source": c["source"]} for d, c in self.chunks.items()},
+            "links": {d: {**l, "sig": base64.b64encode(l["sig"].tobytes()).decode("ascii")
+                          if l.get("sig") is not None else None} for d, l in self.links.items()}
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any], threshold: Optional[float] = None) -> "NearDupIndex":
+        index = cls(threshold)
+        params = (data.get("num_perm"), data.get("bands"), data.get("shingle_words"), data.get("seed"))
+        if params != (NUM_PERM, BANDS, SHINGLE_WORDS, SEED):
+            # Signatures from other parameters aren't comparable; start over
+            logger.warning(f"Near-duplicate index built with {params}; rebuilding")
+            return index
+        for doc_id, c in data.get("chunks", {}).items():
+            sig = np.frombuffer(base64.b64decode(c["sig"]), dtype=np.uint32)
+            index._apply("add", (doc_id, sig, c["source"]))
+        for d, l in data.get("links", {}).items():
+            # Links saved before signatures were recorded only detect a missing canonical
+            sig = np.frombuffer(base64.b64decode(l["sig"]), dtype=np.uint32) if l.get("sig") else None
+            index.links[d] = {**l, "sig": sig}
+        return index
+
+    @classmethod
+    def load(cls, bucket: str, key: str = DEFAULT_INDEX_KEY,
+             threshold: Optional[float] = None) -> "NearDupIndex":
+        """
+        Read the index from S3; a missing object is an empty index
+        """
+        try:
+            obj = s3.get_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return cls(threshold)
+            raise
+        index = cls.from_json(json.loads(gzip.decompress(obj["Body"].read())), threshold)
+        index.etag = obj["ETag"]
+        return index
+
+    def save(self, bucket: str, key: str = DEFAULT_INDEX_KEY, attempts: int = 5) -> None:
+        """
+        Write the index back with a conditional put.
+
+        Concurrent ingest invocations each load, update and save the index;
+        if another writer got there first, its version is reloaded and this
+        invocation's changes are replayed on top.
+        """
+        if not self.dirty:
+            return
+        current = self
+        for attempt in range(attempts):
+            body = gzip.compress(json.dumps(current.to_json()).encode("utf-8"))
+            condition = {"IfMatch": current.etag} if current.etag else {"IfNoneMatch": "*"}
+            try:
+                resp = s3.put_object(Bucket=bucket, Key=key, Body=body,
+                                     ContentType="application/json", ContentEncoding="gzip",
+                                     **condition)
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") not in ("PreconditionFailed",
+                                                                    "ConditionalRequestConflict"):
+                    raise
+                logger.info(f"Near-duplicate index changed under us; replaying "
+                            f"{len(self._ops)} updates (attempt {attempt + 1})")
+                current = NearDupIndex.load(bucket, key, self.threshold)
+                for op, args in self._ops:
+                    current._apply(op, args)
+                continue
+            logger.info(f"Saved near-duplicate index: {len(current)} chunks, "
+                        f"{len(current.links)} links, {len(body)} bytes")
+            self.chunks, self.links, self.buckets = current.chunks, current.links, current.buckets
+            self.etag = resp.get("ETag")
+            self._ops = []
+            return
+        raise RuntimeError(f"Could not save near-duplicate index after {attempts} attempts")
+
+
+class DedupStats:
+    """
+    Counts for one ingest invocation
+    """
+    def __init__(self):
+        self.chunks = 0
+        self.duplicates = 0
+        self.linked = 0
+        self.embed_calls_avoided = 0
+
+    def record(self, other: Dict[str, int]) -> None:
+        for field in ("chunks", "duplicates", "linked", "embed_calls_avoided"):
+            setattr(self, field, getattr(self, field) + other.get(field, 0))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "chunks": self.chunks,
+            "duplicates": self.duplicates,
+            "linked": self.linked,
+            "dedup_ratio": round(self.duplicates / self.chunks, 4) if self.chunks else 0.0,
+            "embed_calls_avoided": self.embed_calls_avoided
+        }
+
+
+def log_stats(stats: Dict[str, Any]) -> None:
+    """
+    One structured line per invocation, for aggregation in CloudWatch Logs Insights
+    """
+    logger.info("NEAR_DUP " + json.dumps(stats))
@@ -0,0 +1,226 @@
+import importlib.util
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from . import speculation
+from .singleflight import dedupe_tasks, task_key
+
+logger = logging.getLogger()
+
+LAMBDAS_DIR = os.path.join(os.path.dirname(__file__), '..')
+
+# Agent name -> (lambda directory, handler function), mirroring infra/template.yaml
+AGENT_HANDLERS = {
+    "guardrail": ("guardrail", "handler"),
+    "screen": ("guardrail", "screen_goals"),
+    "plan": ("planner", "handler"),
+    "knowledge": ("knowledge", "handler"),
+    "data": ("data", "handler"),
+    "action": ("action", "handler"),
+    "synth": ("synth", "handler"),
+}
+
+
+def load_agents(root: Optional[str] = None) -> Dict[str, Callable]:
+    """
+    Import every agent handler in-process.
+
+    Each lambda ships its own ``handler.py``, so the modules are loaded under
+    distinct names instead of through the normal import system.
+    """
+    root = root or LAMBDAS_DIR
+    agents, modules = {}, {}
+    for name, (directory, func) in AGENT_HANDLERS.items():
+        if directory not in modules:
+            path = os.path.join(root, directory, "handler.py")
+            spec = importlib.util.spec_from_file_location(f"agent_{directory}", path)
+            modules[directory] = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(modules[directory])
+        agents[name] = getattr(modules[directory], func)
+    return agents
+
+
+def _timed(timings: Dict[str, float], stage: str, func: Callable, *args):
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        timings[stage] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def run_task(agents: Dict[str, Callable], task: Dict[str, Any],
+             timings: Dict[str, float]) -> Dict[str, Any]:
+    """
+    One FanOut iteration: the Route choice plus the agent it selects
+    """
+    stage = f"task:{task.get('id')}:{task.get('type')}"
+    if "precomputed" in task:
+        timings[stage] = 0.0
+        return task["precomputed"]
+    agent = agents.get(task.get("type"))
+    if agent is None:
+        raise ValueError(f"Unknown task type: {task.get('type')}")
+    return _timed(timings, stage, agent, task, None)
+
+
+def run_goal(goal: str, agents: Optional[Dict[str, Callable]] = None,
+             speculative: bool = True, max_concurrency: int = 10) -> Dict[str, Any]:
+    """
+    Run the Orchestrator state machine for one goal without Step Functions.
+
+    Follows the same Guardrail -> Plan -> FanOut -> Synthesize flow. With
+    ``speculative`` set, a knowledge search on the goal runs concurrently with
+    the planner and is reused when the plan contains a matching task.
+    Returns the synth output plus per-stage ``timings`` in milliseconds.
+    """
+    agents = agents or load_agents()
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+
+    state = _timed(timings, "guardrail", agents["guardrail"], {"goal": goal}, None)
+    goal = state.get("goal", goal)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        spec_future = None
+        if speculative:
+            spec_future = pool.submit(
+                _timed, timings, "speculative_knowledge",
+                agents["knowledge"], speculation.speculative_task(goal), None
+            )
+
+        planned = _timed(timings, "plan", agents["plan"], {"goal": goal}, None)
+        tasks, _ = dedupe_tasks((planned.get("plan") or {}).get("tasks", []))
+
+        outcome = None
+        if spec_future is not None:
+            try:
+                spec_result = spec_future.result()
+            except Exception as e:
+                logger.warning(f"Speculative search failed: {str(e)}")
+                spec_result = None
+            outcome = speculation.apply_speculation(
+                tasks, goal, spec_result, plan_ms=timings["plan"]
+            )
+            speculation.stats.record(outcome)
+            speculation.log_outcome(outcome)
+
+        fanout_start = time.perf_counter()
+        results = list(pool.map(lambda t: run_task(agents, t, timings), tasks))
+        timings["fanout"] = round((time.perf_counter() - fanout_start) * 1000, 1)
+
+    answer = _timed(timings, "synth", agents["synth"], {"goal": goal, "FanOutResults": results}, None)
+    timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+
+    return {
+        "goal": goal,
+        **answer,
+        "timings": timings,
+        "speculation": outcome
+    }
+
+
+def screen_goals(agents: Dict[str, Callable], goals: List[str]) -> List[Dict[str, Any]]:
+    """
+    Guardrail verdicts for a batch, in one pass when the agent supports it
+    """
+    if "screen" in agents:
+        return agents["screen"](goals)
+
+    verdicts = []
+    for goal in goals:
+        try:
+            agents["guardrail"]({"goal": goal}, None)
+            verdicts.append({"goal": goal, "allowed": True, "reason": None})
+        except Exception as e:
+            verdicts.append({"goal": goal, "allowed": False, "reason": str(e)})
+    return verdicts
+
+
+def run_batch(goals: List[str], agents: Optional[Dict[str, Callable]] = None,
+              max_concurrency: int = 8) -> Dict[str, Any]:
+    """
+    Plan and execute many goals in one call.
+
+    The guardrail screens the whole batch once, goals are planned with bounded
+    concurrency, and tasks that repeat across goals (same type and inputs) run
+    once with the result shared by every goal that planned them. Returns
+    per-goal results in input order plus batch throughput metrics.
+    """
+    agents = agents or load_agents()
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+
+    verdicts = _timed(timings, "guardrail", screen_goals, agents, goals)
+    # Plan the screened (PII-redacted) form of each goal
+    goals = [v.get("goal") or g for g, v in zip(goals, verdicts)]
+    allowed = [i for i, v in enumerate(verdicts) if v["allowed"]]
+
+    # Repeated goals are planned and synthesized once
+    distinct = list(dict.fromkeys(goals[i] for i in allowed))
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        def _plan(goal):
+            try:
+                planned = agents["plan"]({"goal": goal}, None)
+                return dedupe_tasks((planned.get("plan") or {}).get("tasks", []))[0]
+            except Exception as e:
+                logger.error(f"Planning failed for goal {goal!r}: {str(e)}")
+                return []
+
+        plan_start = time.perf_counter()
+        plans = dict(zip(distinct, pool.map(_plan, distinct)))
+        timings["plan"] = round((time.perf_counter() - plan_start) * 1000, 1)
+
+        # Shared retrieval and data work across goals runs once
+        unique: Dict[str, Dict[str, Any]] = {}
+        for tasks in plans.values():
+            for task in tasks:
+                unique.setdefault(task_key(task), task)
+
+        def _execute(task):
+            try:
+                return run_task(agents, task, {})
+            except Exception as e:
+                return {"task_id": task.get("id"), "error": str(e)}
+
+        fanout_start = time.perf_counter()
+        keys = list(unique)
+        shared = dict(zip(keys, pool.map(lambda k: _execute(unique[k]), keys)))
+        timings["fanout"] = round((time.perf_counter() - fanout_start) * 1000, 1)
+
+        def _synth(goal):
+            results = [{**shared[task_key(t)], "task_id": t.get("id")} for t in plans[goal]]
+            try:
+                return agents["synth"]({"goal": goal, "FanOutResults": results}, None)
+            except Exception as e:
+                return {"answer_md": f"Error generating synthesis: {str(e)}", "citations": [], "status": "error"}
+
+        synth_start = time.perf_counter()
+        answers = dict(zip(distinct, pool.map(_synth, distinct)))
+        timings["synth"] = round((time.perf_counter() - synth_start) * 1000, 1)
+
+    results = []
+    for goal, verdict in zip(goals, verdicts):
+        if verdict["allowed"]:
+            results.append({"goal": goal, **answers[goal]})
+        else:
+            results.append({"goal": goal, "status": "blocked", "reason": verdict["reason"]})
+
+    elapsed = time.perf_counter() - start
+    timings["total"] = round(elapsed * 1000, 1)
+    total_tasks = sum(len(plans[goals[i]]) for i in allowed)
+
+    return {
+        "results": results,
+        "metrics": {
+            "goals": len(goals),
+            "blocked": len(goals) - len(allowed),
+            "tasks_planned": total_tasks,
+            "tasks_executed": len(unique),
+            "goals_per_minute": round(len(goals) / elapsed * 60, 1) if elapsed else None,
+            "timings": timings
+        }
+    }
@@ -0,0 +1,178 @@
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger()
+
+VECTOR_FIELD = "embedding_vector"
+
+# chunk_text overlaps consecutive chunks by 100 characters; look a little
+# further when stitching them back together.
+MAX_OVERLAP = 200
+
+
+def default_lambda() -> float:
+    return float(os.getenv("RERANK_MMR_LAMBDA", "0.7"))
+
+
+def default_per_doc_cap() -> int:
+    return int(os.getenv("RERANK_PER_DOC_CAP", "2"))
+
+
+def _doc_key(source: Dict[str, Any]) -> Optional[str]:
+    return source.get("file_path") or source.get("url")
+
+
+def _unit_rows(vectors: Sequence[Optional[Sequence[float]]]) -> np.ndarray:
+    """
+    Stack candidate vectors into an L2-normalized matrix; missing vectors
+    become zero rows, which are similar to nothing
+    """
+    dim = next((len(v) for v in vectors if v is not None), 0)
+    out = np.zeros((len(vectors), dim), dtype=np.float32)
+    for i, v in enumerate(vectors):
+        if v is not None and len(v) == dim:
+            out[i] = v
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    return out / np.maximum(norms, 1e-12)
+
+
+def mmr(relevance: Sequence[float], vectors: Sequence[Optional[Sequence[float]]], k: int,
+        lambda_: float = 0.7, groups: Optional[Sequence[Any]] = None,
+        per_group_cap: Optional[int] = None) -> List[int]:
+    """
+    Maximal Marginal Relevance selection.
+
+    Greedily picks the candidate maximizing
+    ``lambda_ * relevance - (1 - lambda_) * max cosine similarity to the picks``.
+    Relevance is rescaled to [0, 1] so it is comparable with cosine similarity.
+    With ``groups`` and ``per_group_cap`` no group contributes more than the cap.
+    Returns indices into the candidates in selection order.
+    """
+    n = len(relevance)
+    k = min(k, n)
+    if k <= 0:
+        return []
+
+    rel = np.asarray(relevance, dtype=np.float32)
+    span = float(rel.max() - rel.min())
+    rel = (rel - rel.min()) / span if span > 0 else np.ones(n, dtype=np.float32)
+
+    unit = _unit_rows(vectors)
+    max_sim = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    counts: Dict[Any, int] = {}
+    selected: List[int] = []
+
+    while len(selected) < k and available.any():
+        score = lambda_ * rel - (1 - lambda_) * max_sim
+        score[~available] = -np.inf
+        pick = int(np.argmax(score))
+        selected.append(pick)
+        available[pick] = False
+
+        if groups is not None and per_group_cap:
+            g = groups[pick]
+            counts[g] = counts.get(g, 0) + 1
+            if g is not None and counts[g] >= per_group_cap:
+                available &= np.array([grp != g for grp in groups])
+
+        if unit.shape[1]:
+            np.maximum(max_sim, unit @ unit[pick], out=max_sim)
+
+    return selected
+
+
+def _stitch(left: str, right: str) -> str:
+    """
+    Join two consecutive chunks, dropping the text they share
+    """
+    limit = min(len(left), len(right), MAX_OVERLAP)
+    for size in range(limit, 0, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    # Chunks are stripped, so the overlap may not line up exactly
+    for size in range(limit, 20, -1):
+        idx = left.rfind(right[:size])
+        if idx != -1 and idx >= len(left) - MAX_OVERLAP:
+            return left[:idx] + right
+    return left + "\n" + right
+
+
+def merge_adjacent(passages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Merge passages that are consecutive chunks of the same file.
+
+    The merged passage takes the position of its best-ranked chunk and
+    records the covered range as ``chunk_range``.
+    """
+    by_file: Dict[str, List[int]] = {}
+    for i, p in enumerate(passages):
+        if p.get("file_path") is not None and isinstance(p.get("chunk_index"), int):
+            by_file.setdefault(p["file_path"], []).append(i)
+
+    absorbed = set()
+    merged = {i: p for i, p in enumerate(passages)}
+    for indices in by_file.values():
+        run: List[int] = []
+        for i in sorted(indices, key=lambda j: passages[j]["chunk_index"]):
+            if run and passages[i]["chunk_index"] != passages[run[-1]]["chunk_index"] + 1:
+                _merge_run(passages, run, merged, absorbed)
+                run = []
+            run.append(i)
+        _merge_run(passages, run, merged, absorbed)
+
+    return [merged[i] for i in range(len(passages)) if i not in absorbed]
+
+
+def _merge_run(passages, run, merged, absorbed):
+    if len(run) < 2:
+        return
+    first = passages[run[0]]
+    body = first.get("body", "")
+    for i in run[1:]:
+        body = _stitch(body, passages[i].get("body", ""))
+    head = min(run)
+    merged[head] = {
+        **first,
+        "body": body,
+        "chunk_range": [first["chunk_index"], passages[run[-1]]["chunk_index"]]
+    }
+    if "score" in first:
+        merged[head]["score"] = max(passages[i].get("score", 0) for i in run)
+    absorbed.update(i for i in run if i != head)
+
+
+def rerank(candidates: List[Dict[str, Any]], k: int, lambda_: Optional[float] = None,
+           per_doc_cap: Optional[int] = None, merge: bool = True) -> List[Dict[str, Any]]:
+    """
+    Diversity-aware rerank of fused candidates.
+
+    ``candidates`` are best-first dicts with a ``relevance`` score and the
+    passage ``source`` (whose ``embedding_vector``, when present, is used for
+    similarity and then dropped). Applies MMR with a per-document cap, then
+    merges adjacent chunks of the same file among the picks.
+    """
+    if not candidates:
+        return []
+    lambda_ = default_lambda() if lambda_ is None else lambda_
+    per_doc_cap = default_per_doc_cap() if per_doc_cap is None else per_doc_cap
+
+    sources = [c["source"] for c in candidates]
+    picks = mmr(
+        [c["relevance"] for c in candidates],
+        [s.get(VECTOR_FIELD) for s in sources],
+        k, lambda_=lambda_,
+        groups=[_doc_key(s) for s in sources],
+        per_group_cap=per_doc_cap or None
+    )
+
+    out = [{key: v for key, v in sources[i].items() if key != VECTOR_FIELD} for i in picks]
+    if merge:
+        before = len(out)
+        out = merge_adjacent(out)
+        if len(out) < before:
+            logger.info(f"Merged {before - len(out)} adjacent chunks into neighbours")
+    return out
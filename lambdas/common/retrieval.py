@@ -1,30 +1,210 @@
-import os, requests, json
-from .embeddings import embed
+import asyncio, os, requests, json, logging, time
+from . import aio
+from .embeddings import aembed, embed
+from .error_handler import NonRetryableError
+from .index_admin import resolve_index
+from .rerank import rerank
+from .search_filters import (DEFAULT_PROFILE, MAX_K, POST_FILTER_OVERFETCH, index_profile, knn_query,
+                             lexical_query, matches, normalize_filters, normalize_recency, unpushed)
+
+logger = logging.getLogger()
 
 OS = f"https://{os.getenv('OS_ENDPOINT')}"
 HEADERS = {"Content-Type":"application/json"}
+# Fields a passage needs; everything else (notably the vector) stays on the cluster
+SOURCE_FIELDS = ["title","body","url","source_type","timestamp","file_path","chunk_index","total_chunks"]
+
+def basic_auth():
+    """(user, password) for domains with fine-grained access control, else None"""
+    user = os.getenv("OS_USERNAME")
+    return (user, os.getenv("OS_PASSWORD", "")) if user else None
+
+def os_put(path, doc): return requests.put(OS+path, headers=HEADERS, data=json.dumps(doc), auth=basic_auth(), timeout=10)
+def os_post(path, q):  return requests.post(OS+path, headers=HEADERS, data=json.dumps(q), auth=basic_auth(), timeout=10)
+def os_get(path):      return requests.get(OS+path, headers=HEADERS, auth=basic_auth(), timeout=10)
+
+# Async counterparts on the shared loop and connection pool; they return the parsed body
+async def _os_json(method, path, doc=None):
+    body = json.dumps(doc).encode() if doc is not None else None
+    auth = basic_auth()
+    if auth:
+        import aiohttp
+        auth = aiohttp.BasicAuth(*auth)
+    _, data = await aio.request(method, OS+path, body=body, headers=HEADERS, auth=auth)
+    return json.loads(data)
+async def aos_put(path, doc): return await _os_json("PUT", path, doc)
+async def aos_post(path, q):  return await _os_json("POST", path, q)
+async def aos_get(path):      return await _os_json("GET", path)
+
+# Mapping facts per alias, re-read now and then so a rollout to another engine is picked up
+PROFILE_TTL_SECONDS = 300
+_profiles = {}
+
+def _cached_profile(index):
+    cached = _profiles.get(index)
+    return cached[1] if cached and time.monotonic() - cached[0] < PROFILE_TTL_SECONDS else None
+
+def _remember_profile(index, mappings):
+    if isinstance(mappings, dict) and mappings and "error" not in mappings:
+        profile = index_profile(mappings)
+        if profile != DEFAULT_PROFILE:
+            logger.info(f"{index} filtering: {profile}")
+    else:
+        logger.warning(f"Could not read the {index} mapping; assuming the index spec's: {str(mappings)[:200]}")
+        profile = DEFAULT_PROFILE
+    _profiles[index] = (time.monotonic(), profile)
+    return profile
+
+def _search_hits(resp):
+    if not isinstance(resp, dict) or "hits" not in resp:
+        raise NonRetryableError(f"Search failed: {json.dumps(resp)[:300]}")
+    return resp["hits"]["hits"]
+
+class OpenSearchBackend:
+    """
+    kNN and BM25 legs against the documents index alias.
+
+    The alias mapping decides how filters are applied: inside the graph
+    search on faiss/lucene, as a post-filter on nmslib, and on the returned
+    hits for fields that only some index maps as keyword.
+    """
+    @property
+    def index(self): return resolve_index()
+
+    def profile(self):
+        profile = _cached_profile(self.index)
+        if profile is None:
+            try:
+                mappings = os_get(f"{self.index}/_mapping").json()
+            except Exception as e:
+                mappings = {"error": str(e)}
+            profile = _remember_profile(self.index, mappings)
+        return profile
+
+    def _knn_body(self, vector, size, filters, recency, with_vectors, profile):
+        loose = unpushed(filters or {}, profile)
+        # Filters checked on the hits need more of them
+        n = min(size * POST_FILTER_OVERFETCH, MAX_K) if loose else size
+        fields = SOURCE_FIELDS + ["embedding_vector"] if with_vectors else SOURCE_FIELDS
+        return {"size": n, "_source": fields, "query": knn_query(vector, n, filters or {}, recency, profile=profile)}, loose
+
+    def _lexical_body(self, query, size, filters, recency, profile):
+        loose = unpushed(filters or {}, profile)
+        n = min(size * POST_FILTER_OVERFETCH, MAX_K) if loose else size
+        # Vectors for reranking come from the kNN leg; don't ship them twice
+        return {"size": n, "_source": SOURCE_FIELDS, "query": lexical_query(query, filters or {}, recency, profile=profile)}, loose
+
+    @staticmethod
+    def _filtered(hits, loose, size):
+        if not loose:
+            return hits
+        return [h for h in hits if matches(h["_source"], loose)][:size]
+
+    def knn(self, vector, size, filters=None, recency=None, with_vectors=True):
+        q, loose = self._knn_body(vector, size, filters, recency, with_vectors, self.profile())
+        return self._filtered(_search_hits(os_post(f"{self.index}/_search", q).json()), loose, size)
+
+    def lexical(self, query, size, filters=None, recency=None):
+        q, loose = self._lexical_body(query, size, filters, recency, self.profile())
+        return self._filtered(_search_hits(os_post(f"{self.index}/_search", q).json()), loose, size)
+
+class AsyncOpenSearchBackend(OpenSearchBackend):
+    """The same legs as coroutines, so they can be gathered"""
+    async def aprofile(self):
+        profile = _cached_profile(self.index)
+        if profile is None:
+            try:
+                mappings = await aos_get(f"{self.index}/_mapping")
+            except Exception as e:
+                mappings = {"error": str(e)}
+            profile = _remember_profile(self.index, mappings)
+        return profile
+
+    async def aknn(self, vector, size, filters=None, recency=None, with_vectors=True):
+        q, loose = self._knn_body(vector, size, filters, recency, with_vectors, await self.aprofile())
+        return self._filtered(_search_hits(await aos_post(f"{self.index}/_search", q)), loose, size)
+
+    async def alexical(self, query, size, filters=None, recency=None):
+        q, loose = self._lexical_body(query, size, filters, recency, await self.aprofile())
+        return self._filtered(_search_hits(await aos_post(f"{self.index}/_search", q)), loose, size)
+
+def get_backend():
+    """RETRIEVAL_BACKEND=local serves from a NumPy index at LOCAL_INDEX_PATH instead of OpenSearch"""
+    if os.getenv("RETRIEVAL_BACKEND", "opensearch") == "local":
+        # Imported lazily so OpenSearch deployments never load the store
+        from .vector_store import open_backend
+        return open_backend()
+    return OpenSearchBackend()
+
+def hybrid_search(query, k=8, backend=None, diversify=True, mmr_lambda=None, per_doc_cap=None,
+                  filters=None, recency=None):
+    """
+    ``filters`` (source_type, since/until, file_path_prefix) and ``recency``
+    (exp decay on timestamp) are applied by the backend inside both legs
+    """
+    backend = backend or get_backend()
+    filters, recency = normalize_filters(filters), normalize_recency(recency)
+    # Only MMR needs a deeper pool; filtering happens before ranking, not after
+    size = k*3 if diversify else k
+    try:
+        kv = backend.knn(embed(query), size, filters=filters, recency=recency, with_vectors=diversify)
+    except Exception as e:
+        kv = e
+    try:
+        kb = backend.lexical(query, size, filters=filters, recency=recency)
+    except Exception as e:
+        kb = e
+    return _fuse(*_legs(kv, kb), k, diversify, mmr_lambda, per_doc_cap)
+
+async def ahybrid_search(query, k=8, backend=None, diversify=True, mmr_lambda=None, per_doc_cap=None,
+                         filters=None, recency=None):
+    """
+    hybrid_search on the shared event loop: the BM25 leg runs while the query
+    is embedded, then the kNN leg. Backends without async legs (the local
+    store) are called inline. As in hybrid_search, a failed leg is logged and
+    the other leg's hits are used; only both failing raises.
+    """
+    backend = backend or (get_backend() if os.getenv("RETRIEVAL_BACKEND", "opensearch") == "local"
+                          else AsyncOpenSearchBackend())
+    filters, recency = normalize_filters(filters), normalize_recency(recency)
+    size = k*3 if diversify else k
+    if not hasattr(backend, "aknn"):
+        async def vector_leg():
+            return backend.knn(await aembed(query), size, filters=filters, recency=recency,
+                               with_vectors=diversify)
+        async def lexical_leg():
+            return backend.lexical(query, size, filters=filters, recency=recency)
+    else:
+        async def vector_leg():
+            return await backend.aknn(await aembed(query), size, filters=filters, recency=recency,
+                                      with_vectors=diversify)
+        def lexical_leg():
+            return backend.alexical(query, size, filters=filters, recency=recency)
+    kv, kb = await aio.gather_settled(vector_leg(), lexical_leg())
+    return _fuse(*_legs(kv, kb), k, diversify, mmr_lambda, per_doc_cap)
+
+def _legs(kv, kb):
+    """
+    Hits of each leg, with a failed leg (an exception in its place)
+    contributing none; raises only when both failed
+    """
+    if isinstance(kv, BaseException) and isinstance(kb, BaseException):
+        raise kv
+    for name, leg in (("kNN", kv), ("BM25", kb)):
+        if isinstance(leg, BaseException):
+            logger.warning(f"{name} leg failed, using the other leg only: {str(leg)}")
+    return ([] if isinstance(kv, BaseException) else kv, [] if isinstance(kb, BaseException) else kb)
 
-def os_put(path, doc): return requests.put(OS+path, headers=HEADERS, data=json.dumps(doc), timeout=10)
-def os_post(path, q):  return requests.post(OS+path, headers=HEADERS, data=json.dumps(q), timeout=10)
-
-def hybrid_search(query, k=8):
-    v = embed(query)
-    knn = {
-      "size": k*3,
-      "query": { "knn": { "embedding_vector": { "vector": v, "k": k*3 } } }
-    }
-    bm25 = {
-      "size": k*3,
-      "query": { "multi_match": { "query": query, "fields": ["title^2","body"] } }
-    }
-    kv = os_post("/documents_v1/_search", knn).json()["hits"]["hits"]
-    kb = os_post("/documents_v1/_search", bm25).json()["hits"]["hits"]
+def _fuse(kv, kb, k, diversify, mmr_lambda, per_doc_cap):
     # naive RRF
-    scores, out = {}, []
+    scores, sources = {}, {}
     for i,h in enumerate(kv): scores[h["_id"]] = scores.get(h["_id"],0)+1/(60+i)
     for i,h in enumerate(kb): scores[h["_id"]] = scores.get(h["_id"],0)+1/(60+i)
-    for doc_id in sorted(scores, key=scores.get, reverse=True)[:k]:
-        # fetch source from whichever list contains it
-        src = next((h["_source"] for h in kv if h["_id"]==doc_id), None) or next((h["_source"] for h in kb if h["_id"]==doc_id), None)
-        out.append(src)
-    return out
\ No newline at end of file
+    # prefer the kNN copy of a source, which carries embedding_vector
+    for h in kb + kv: sources[h["_id"]] = h["_source"]
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    if not diversify:
+        return [{f: x for f, x in sources[d].items() if f != "embedding_vector"} for d in ranked[:k]]
+    # MMR over the fused candidates to drop near-identical overlapping chunks
+    candidates = [{"relevance": scores[d], "source": sources[d]} for d in ranked]
+    return rerank(candidates, k, lambda_=mmr_lambda, per_doc_cap=per_doc_cap)
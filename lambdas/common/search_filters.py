@@ -0,0 +1,258 @@
+import logging
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger()
+
+TIMESTAMP_FIELD = "timestamp"
+FILTER_KEYS = ("source_type", "since", "until", "file_path_prefix")
+# Exact-value fields behind the filters, and the filter keys each one serves
+FILTER_FIELDS = {"source_type": ("source_type",), "file_path": ("file_path_prefix",)}
+
+# Engines that apply a k-NN ``filter`` during the graph search; nmslib doesn't
+EFFICIENT_FILTER_ENGINES = ("faiss", "lucene")
+# kNN candidates fetched per requested hit when filters run after the graph search
+POST_FILTER_OVERFETCH = 4
+MAX_K = 10000
+
+# What infra/index-spec.json creates: faiss, keyword filter fields
+DEFAULT_PROFILE = {"efficient": True, "fields": {f: f for f in FILTER_FIELDS}}
+
+# Relative windows such as "7d" or "12h", the subset of OpenSearch date math
+# the planner is asked to use
+_DURATION = re.compile(r"^(\d+)([mhdw])$")
+_UNIT_SECONDS = {"m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def duration_seconds(value: str) -> float:
+    m = _DURATION.match(str(value).strip())
+    if not m:
+        raise ValueError(f"Invalid duration {value!r}; expected e.g. '12h', '7d' or '2w'")
+    return int(m.group(1)) * _UNIT_SECONDS[m.group(2)]
+
+
+def _time_bound(value: Any) -> str:
+    """
+    Canonical form of a time bound: "now-7d" for relative windows, ISO otherwise
+    """
+    value = str(value).strip()
+    if value.startswith("now-"):
+        value = value[4:]
+    if _DURATION.match(value):
+        return f"now-{value}"
+    parse_time(value)
+    return value
+
+
+def parse_time(value: str, now: Optional[float] = None) -> float:
+    """
+    Epoch seconds for an ISO timestamp (naive means UTC) or a "now-7d" bound
+    """
+    if value.startswith("now-"):
+        return (time.time() if now is None else now) - duration_seconds(value[4:])
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def normalize_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Validated, canonical filters.
+
+    Filters usually come from planner output, so unknown keys and
+    unparseable values are dropped with a warning rather than failing the
+    search. Canonical values make identical filters compare (and coalesce)
+    equal.
+    """
+    out: Dict[str, Any] = {}
+    for key, value in (filters or {}).items():
+        if key not in FILTER_KEYS or value in (None, "", []):
+            if key not in FILTER_KEYS:
+                logger.warning(f"Ignoring unknown search filter {key!r}")
+            continue
+        try:
+            if key == "source_type":
+                values = [value] if isinstance(value, str) else list(value)
+                out[key] = sorted({str(v) for v in values})
+            elif key in ("since", "until"):
+                out[key] = _time_bound(value)
+            else:
+                out[key] = str(value)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Ignoring search filter {key}={value!r}: {str(e)}")
+    return out
+
+
+def normalize_recency(recency: Any) -> Optional[Dict[str, Any]]:
+    """
+    Canonical exponential decay on ``timestamp``: a score halves (by default)
+    every ``scale`` after ``offset``. Accepts "30d" as shorthand.
+    """
+    if not recency:
+        return None
+    if isinstance(recency, str):
+        recency = {"scale": recency}
+    try:
+        out = {
+            "scale": str(recency["scale"]),
+            "offset": str(recency.get("offset", "0d")),
+            "decay": float(recency.get("decay", 0.5))
+        }
+        duration_seconds(out["scale"])
+        duration_seconds(out["offset"])
+        if not 0 < out["decay"] < 1:
+            raise ValueError("decay must be between 0 and 1")
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning(f"Ignoring recency {recency!r}: {str(e)}")
+        return None
+    return out
+
+
+def index_profile(mappings: Dict[str, Any], vector_field: str = "embedding_vector") -> Dict[str, Any]:
+    """
+    Filtering capabilities of the indexes in a ``GET <alias>/_mapping`` response.
+
+    ``efficient`` holds when every index's vector field uses an engine that
+    filters during the graph search. ``fields`` maps each exact-value field
+    to the path filters should use (the field, or its ``.keyword`` subfield
+    under dynamic mapping), or None when some index only has it as text.
+    """
+    efficient = bool(mappings)
+    paths: Dict[str, set] = {f: set() for f in FILTER_FIELDS}
+    for index in mappings.values():
+        props = index.get("mappings", {}).get("properties", {})
+        engine = props.get(vector_field, {}).get("method", {}).get("engine")
+        efficient = efficient and engine in EFFICIENT_FILTER_ENGINES
+        for field in FILTER_FIELDS:
+            mapping = props.get(field)
+            if mapping is None:
+                # Unmapped: no document has it, and a query on it matches nothing, as the filter should
+                continue
+            if mapping.get("type") == "keyword":
+                paths[field].add(field)
+            elif mapping.get("fields", {}).get("keyword", {}).get("type") == "keyword":
+                paths[field].add(f"{field}.keyword")
+            else:
+                paths[field].add(None)
+    fields = {f: (next(iter(p)) if len(p) == 1 else None if p else f) for f, p in paths.items()}
+    return {"efficient": efficient, "fields": fields}
+
+
+def unpushed(filters: Dict[str, Any], profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    The filters an index can't apply, to be checked on the hits with ``matches``
+    """
+    fields = (profile or DEFAULT_PROFILE)["fields"]
+    return {key: filters[key] for field, keys in FILTER_FIELDS.items() if fields.get(field) is None
+            for key in keys if filters.get(key)}
+
+
+def matches(source: Dict[str, Any], filters: Dict[str, Any], now: Optional[float] = None) -> bool:
+    """
+    Whether a hit's ``_source`` passes normalized filters
+    """
+    if filters.get("source_type") and str(source.get("source_type") or "") not in filters["source_type"]:
+        return False
+    if filters.get("file_path_prefix") and \
+            not str(source.get("file_path") or "").startswith(filters["file_path_prefix"]):
+        return False
+    if filters.get("since") or filters.get("until"):
+        ts, now = doc_timestamp(source), time.time() if now is None else now
+        if ts is None:
+            return False
+        if filters.get("since") and ts < parse_time(filters["since"], now):
+            return False
+        if filters.get("until") and ts > parse_time(filters["until"], now):
+            return False
+    return True
+
+
+def filter_clauses(filters: Dict[str, Any], profile: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    OpenSearch bool ``filter`` clauses for normalized filters, on the field
+    paths in ``profile``; filters on fields without one are left out
+    """
+    fields = (profile or DEFAULT_PROFILE)["fields"]
+    clauses: List[Dict[str, Any]] = []
+    if filters.get("source_type") and fields.get("source_type"):
+        clauses.append({"terms": {fields["source_type"]: filters["source_type"]}})
+    bounds = {}
+    if filters.get("since"):
+        bounds["gte"] = filters["since"]
+    if filters.get("until"):
+        bounds["lte"] = filters["until"]
+    if bounds:
+        clauses.append({"range": {TIMESTAMP_FIELD: bounds}})
+    if filters.get("file_path_prefix") and fields.get("file_path"):
+        clauses.append({"prefix": {fields["file_path"]: filters["file_path_prefix"]}})
+    return clauses
+
+
+def with_recency(query: Dict[str, Any], recency: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Wrap a query in a ``function_score`` exponential decay on ``timestamp``
+    """
+    if not recency:
+        return query
+    return {
+        "function_score": {
+            "query": query,
+            "functions": [{"exp": {TIMESTAMP_FIELD: {
+                "origin": "now", "scale": recency["scale"],
+                "offset": recency["offset"], "decay": recency["decay"]
+            }}}],
+            "boost_mode": "multiply"
+        }
+    }
+
+
+def knn_query(vector: Sequence[float], size: int, filters: Dict[str, Any],
+              recency: Optional[Dict[str, Any]] = None, field: str = "embedding_vector",
+              profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    k-NN clause with filters applied during the graph search (efficient
+    filtering on faiss/lucene), so k results come back from the filtered set.
+
+    Engines without efficient filtering reject a ``filter`` inside ``knn``;
+    for them (``profile["efficient"]`` false) the filters post-filter an
+    overfetched k nearest instead.
+    """
+    profile = profile or DEFAULT_PROFILE
+    clause: Dict[str, Any] = {"vector": list(vector), "k": size}
+    clauses = filter_clauses(filters, profile)
+    if clauses and not profile["efficient"]:
+        clause["k"] = min(size * POST_FILTER_OVERFETCH, MAX_K)
+        return with_recency({"bool": {"must": [{"knn": {field: clause}}], "filter": clauses}}, recency)
+    if clauses:
+        clause["filter"] = {"bool": {"filter": clauses}}
+    return with_recency({"knn": {field: clause}}, recency)
+
+
+def lexical_query(query: str, filters: Dict[str, Any],
+                  recency: Optional[Dict[str, Any]] = None,
+                  profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    match = {"multi_match": {"query": query, "fields": ["title^2", "body"]}}
+    clauses = filter_clauses(filters, profile)
+    if clauses:
+        match = {"bool": {"must": [match], "filter": clauses}}
+    return with_recency(match, recency)
+
+
+def doc_timestamp(source: Dict[str, Any]) -> Optional[float]:
+    value = source.get(TIMESTAMP_FIELD)
+    if not value:
+        return None
+    try:
+        return parse_time(str(value))
+    except ValueError:
+        return None
+
+
+def search_options(inputs: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    Normalized ``filters`` and ``recency`` from a knowledge task's inputs
+    """
+    return normalize_filters(inputs.get("filters")), normalize_recency(inputs.get("recency"))
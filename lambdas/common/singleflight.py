@@ -0,0 +1,135 @@
+import asyncio
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger()
+
+
+def task_key(task: Dict[str, Any]) -> str:
+    """
+    Identity of a task's work: its type and inputs, ignoring id and wiring
+    """
+    return json.dumps(
+        {"type": task.get("type"), "inputs": task.get("inputs") or {}},
+        sort_keys=True, default=str
+    )
+
+
+def dedupe_tasks(tasks: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """
+    Drop tasks that repeat an earlier task's work.
+
+    Returns the unique tasks (first occurrence wins, order kept) and a map of
+    dropped task id -> surviving task id. Dependencies on dropped tasks are
+    rewritten to point at the survivor.
+    """
+    seen: Dict[str, str] = {}
+    aliases: Dict[str, str] = {}
+    unique = []
+
+    for task in tasks:
+        key = task_key(task)
+        if key in seen:
+            aliases[task.get("id")] = seen[key]
+            continue
+        seen[key] = task.get("id")
+        unique.append(task)
+
+    if aliases:
+        for task in unique:
+            deps = [aliases.get(d, d) for d in task.get("deps", [])]
+            task["deps"] = [d for i, d in enumerate(deps) if d not in deps[:i] and d != task.get("id")]
+        logger.info(f"Deduplicated {len(aliases)} repeated tasks: {json.dumps(aliases)}")
+
+    return unique, aliases
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight block and receive the same result (or exception). Nothing is
+    cached once the call completes.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: str, func: Callable, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        if call.waiters:
+            logger.info(f"Shared one execution of {key[:80]} with {call.waiters} waiters")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines.
+
+    Async work runs on the one shared loop (common.aio), so calls made from
+    different threads via ``aio.run`` still meet here and coalesce, without
+    a lock: the check and the insert happen without an await in between.
+    """
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, func: Callable, *args, **kwargs):
+        call = self._calls.get(key)
+        if call is not None:
+            self.coalesced += 1
+            # shield: one waiter being cancelled must not cancel the shared call
+            return await asyncio.shield(call)
+
+        self.executions += 1
+        call = self._calls[key] = asyncio.ensure_future(func(*args, **kwargs))
+        try:
+            return await asyncio.shield(call)
+        finally:
+            if call.done():
+                del self._calls[key]
+            else:
+                # The leader was cancelled; drop the entry once the call finishes
+                call.add_done_callback(lambda _, key=key, call=call: self._calls.get(key) is call
+                                       and self._calls.pop(key))
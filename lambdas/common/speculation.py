@@ -0,0 +1,116 @@
+import json
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger()
+
+SPECULATIVE_TASK_ID = "speculative"
+
+
+def normalize_query(text: str) -> str:
+    """
+    Canonical form used to decide whether a planned query equals the goal
+    """
+    text = re.sub(r"\s+", " ", (text or "").strip().lower())
+    return text.strip(" .?!")
+
+
+def speculative_task(goal: str) -> Dict[str, Any]:
+    """
+    Knowledge task issued on the raw goal while the planner is still running
+    """
+    return {
+        "id": SPECULATIVE_TASK_ID,
+        "type": "knowledge",
+        "description": "Speculative search on the goal",
+        "inputs": {"query": goal},
+        "deps": []
+    }
+
+
+def matches(task: Dict[str, Any], goal: str) -> bool:
+    """
+    A planned task can reuse the speculative result only if it is a knowledge
+    search on the goal itself with no extra inputs that would change the results
+    """
+    if task.get("type") != "knowledge":
+        return False
+    inputs = task.get("inputs") or {}
+    if set(inputs) - {"query"}:
+        return False
+    return normalize_query(inputs.get("query", "")) == normalize_query(goal)
+
+
+def apply_speculation(tasks: List[Dict[str, Any]], goal: str,
+                      speculative_result: Optional[Dict[str, Any]],
+                      plan_ms: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Attach the speculative result to every matching knowledge task.
+
+    Matching tasks get a ``precomputed`` field carrying the result under their
+    own task id, which the fan-out uses instead of running the search again.
+    Returns the speculation outcome: whether it hit, which tasks reused it, and
+    the retrieval latency that overlapped with planning.
+    """
+    usable = isinstance(speculative_result, dict) and not speculative_result.get("error")
+    matched = [t for t in tasks if usable and matches(t, goal)]
+
+    for task in matched:
+        task["precomputed"] = {**speculative_result, "task_id": task["id"]}
+
+    saved_ms = 0.0
+    if matched:
+        saved_ms = float(speculative_result.get("elapsed_ms") or 0.0)
+        if plan_ms is not None:
+            # Only the part of the search that ran under the planner is saved
+            saved_ms = min(saved_ms, plan_ms)
+
+    return {
+        "hit": bool(matched),
+        "matched_task_ids": [t["id"] for t in matched],
+        "latency_saved_ms": round(saved_ms, 1)
+    }
+
+
+class SpeculationStats:
+    """
+    Running hit rate and latency saved for in-process orchestration
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.hits = 0
+        self.latency_saved_ms = 0.0
+
+    def record(self, outcome: Dict[str, Any]) -> None:
+        with self._lock:
+            self.attempts += 1
+            if outcome.get("hit"):
+                self.hits += 1
+            self.latency_saved_ms += outcome.get("latency_saved_ms", 0.0)
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.attempts if self.attempts else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "attempts": self.attempts,
+                "hits": self.hits,
+                "hit_rate": round(self.hit_rate, 3),
+                "latency_saved_ms": round(self.latency_saved_ms, 1)
+            }
+
+
+stats = SpeculationStats()
+
+
+def log_outcome(outcome: Dict[str, Any]) -> None:
+    """
+    One structured line per execution so hit rate can be aggregated in
+    CloudWatch Logs Insights across containers
+    """
+    logger.info("SPECULATION " + json.dumps(outcome))
@@ -0,0 +1,341 @@
+import json
+import math
+import os
+import re
+import shutil
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .search_filters import doc_timestamp, duration_seconds, parse_time
+
+# Rows dequantized per block when scoring float16/int8 stores; small enough
+# for each float32 copy to stay in cache instead of materializing the matrix.
+BLOCK_ROWS = 4096
+
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN.findall((text or "").lower())
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first, in O(n + k log k)
+    """
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+class VectorStore:
+    """
+    Memory-mapped embedding matrix with a JSONL metadata sidecar.
+
+    Layout of a store directory:
+      manifest.json  - {"dim", "count", "dtype"}
+      vectors.bin    - count x dim matrix, L2-normalized, in ``dtype``
+      scales.bin     - per-row float32 scale (int8 stores only)
+      meta.jsonl     - one document ``_source`` (minus the vector) per row
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+        self.dim = manifest["dim"]
+        self.count = manifest["count"]
+        self.dtype = manifest["dtype"]
+        if self.count:
+            self.vectors = np.memmap(os.path.join(path, "vectors.bin"), mode="r",
+                                     dtype=DTYPES[self.dtype], shape=(self.count, self.dim))
+        else:
+            # mmap cannot map an empty file
+            self.vectors = np.zeros((0, self.dim), dtype=DTYPES[self.dtype])
+        self.scales = None
+        if self.dtype == "int8":
+            self.scales = np.fromfile(os.path.join(path, "scales.bin"), dtype=np.float32)
+        with open(os.path.join(path, "meta.jsonl")) as f:
+            self.docs = [json.loads(line) for line in f]
+
+    @classmethod
+    def build(cls, path: str, vectors, docs: Iterable[Dict[str, Any]],
+              dtype: str = "float32") -> "VectorStore":
+        """
+        Write a store from the embeddings and the matching documents.
+
+        ``vectors`` is an (n, dim) array or an iterable of (rows, dim) blocks,
+        so large stores can be written without holding every vector in memory.
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported dtype: {dtype}")
+        blocks = [vectors] if isinstance(vectors, np.ndarray) else vectors
+        os.makedirs(path, exist_ok=True)
+
+        count, dim = 0, None
+        with open(os.path.join(path, "vectors.bin"), "wb") as vf, \
+                open(os.path.join(path, "scales.bin"), "wb") as sf:
+            for block in blocks:
+                block = np.asarray(block, dtype=np.float32)
+                dim = block.shape[1] if dim is None else dim
+                if block.ndim != 2 or block.shape[1] != dim:
+                    raise ValueError("vector blocks must be 2-D with a consistent dimension")
+                block = block / np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)
+                if dtype == "int8":
+                    scales = np.maximum(np.abs(block).max(axis=1), 1e-12) / 127.0
+                    np.round(block / scales[:, None]).astype(np.int8).tofile(vf)
+                    scales.astype(np.float32).tofile(sf)
+                else:
+                    block.astype(DTYPES[dtype]).tofile(vf)
+                count += block.shape[0]
+        if dtype != "int8":
+            os.remove(os.path.join(path, "scales.bin"))
+
+        written = 0
+        with open(os.path.join(path, "meta.jsonl"), "w") as f:
+            for doc in docs:
+                f.write(json.dumps({k: v for k, v in doc.items() if k != "embedding_vector"}) + "\n")
+                written += 1
+        if written != count:
+            raise ValueError(f"{count} vectors but {written} documents")
+
+        with open(os.path.join(path, "manifest.json"), "w") as f:
+            json.dump({"dim": int(dim or 0), "count": count, "dtype": dtype}, f)
+
+        return cls(path)
+
+    @classmethod
+    def upsert(cls, path: str, vectors, docs: Sequence[Dict[str, Any]],
+               drop: Optional[Callable[[Dict[str, Any]], bool]] = None) -> "VectorStore":
+        """
+        Add documents to the store at ``path``, creating it if it is missing.
+
+        Rows sharing an ``_id`` with an incoming document, and rows for which
+        ``drop(doc)`` is true, are removed first. The store is rewritten beside
+        the old one and swapped in, so open memory maps keep reading the old
+        files; cached backends for ``path`` are discarded.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        ids = {d["_id"] for d in docs if "_id" in d}
+        old = cls(path) if os.path.exists(os.path.join(path, "manifest.json")) else None
+        keep = [] if old is None else [
+            i for i, d in enumerate(old.docs) if d.get("_id") not in ids and not (drop and drop(d))
+        ]
+
+        def blocks():
+            for start in range(0, len(keep), BLOCK_ROWS):
+                yield np.stack([old.vector(i) for i in keep[start:start + BLOCK_ROWS]])
+            if len(vectors):
+                yield vectors
+
+        tmp = f"{path.rstrip(os.sep)}.tmp-{os.getpid()}"
+        cls.build(tmp, blocks(), [old.docs[i] for i in keep] + list(docs),
+                  dtype=old.dtype if old is not None else "float32")
+        if old is not None:
+            retired = f"{path.rstrip(os.sep)}.old-{os.getpid()}"
+            os.rename(path, retired)
+            os.rename(tmp, path)
+            shutil.rmtree(retired)
+        else:
+            os.rename(tmp, path)
+        _backends.pop(path, None)
+        return cls(path)
+
+    def scores(self, vector: Sequence[float]) -> np.ndarray:
+        """
+        Cosine similarity of the query against every row
+        """
+        q = np.asarray(vector, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        if self.dtype == "float32":
+            return np.asarray(self.vectors @ q, dtype=np.float32)
+        out = np.empty(self.count, dtype=np.float32)
+        for start in range(0, self.count, BLOCK_ROWS):
+            block = self.vectors[start:start + BLOCK_ROWS]
+            out[start:start + len(block)] = block.astype(np.float32) @ q
+        if self.scales is not None:
+            out *= self.scales
+        return out
+
+    def search(self, vector: Sequence[float], k: int) -> List[Tuple[int, float]]:
+        scores = self.scores(vector)
+        return [(int(i), float(scores[i])) for i in top_k(scores, k)]
+
+    def vector(self, i: int) -> np.ndarray:
+        """
+        Row ``i`` as float32 (unit length, up to quantization error)
+        """
+        row = np.asarray(self.vectors[i], dtype=np.float32)
+        return row * self.scales[i] if self.scales is not None else row
+
+    def nbytes(self) -> int:
+        size = self.vectors.nbytes
+        if self.scales is not None:
+            size += self.scales.nbytes
+        return size
+
+
+class BM25Index:
+    """
+    In-memory inverted index scored with Okapi BM25.
+
+    Mirrors the OpenSearch ``multi_match`` over ``title^2`` and ``body`` by
+    counting title terms twice.
+    """
+    def __init__(self, docs: Sequence[Dict[str, Any]], k1: float = 1.2, b: float = 0.75,
+                 title_boost: int = 2):
+        self.k1, self.b = k1, b
+        self.count = len(docs)
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        lengths = np.zeros(self.count, dtype=np.float32)
+
+        for i, doc in enumerate(docs):
+            terms = tokenize(doc.get("body", "")) + tokenize(doc.get("title", "")) * title_boost
+            lengths[i] = len(terms)
+            for term, tf in Counter(terms).items():
+                postings[term].append((i, tf))
+
+        self.lengths = lengths
+        self.avgdl = float(lengths.mean()) if self.count else 0.0
+        self.postings = {
+            term: (np.fromiter((d for d, _ in p), dtype=np.int64, count=len(p)),
+                   np.fromiter((t for _, t in p), dtype=np.float32, count=len(p)))
+            for term, p in postings.items()
+        }
+
+    def scores(self, query: str) -> np.ndarray:
+        out = np.zeros(self.count, dtype=np.float32)
+        if not self.count:
+            return out
+        norm = self.k1 * (1 - self.b + self.b * self.lengths / max(self.avgdl, 1e-12))
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            ids, tf = self.postings[term]
+            idf = math.log(1 + (self.count - len(ids) + 0.5) / (len(ids) + 0.5))
+            out[ids] += idf * tf * (self.k1 + 1) / (tf + norm[ids])
+        return out
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        scores = self.scores(query)
+        idx = top_k(scores, k)
+        return [(int(i), float(scores[i])) for i in idx if scores[i] > 0]
+
+
+class LocalBackend:
+    """
+    Retrieval backend over a local VectorStore, returning OpenSearch-shaped hits
+    """
+    def __init__(self, path: str):
+        self.store = VectorStore(path)
+        self.bm25 = BM25Index(self.store.docs)
+        self._columns: Optional[Dict[str, np.ndarray]] = None
+        self._rows: Optional[Dict[str, int]] = None
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """
+        The ``_source`` of a document, with its vector, or None
+        """
+        if self._rows is None:
+            self._rows = {d["_id"]: i for i, d in enumerate(self.store.docs) if "_id" in d}
+        i = self._rows.get(doc_id)
+        if i is None:
+            return None
+        return {**self.store.docs[i], "embedding_vector": self.store.vector(i).tolist()}
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """
+        Filterable metadata as arrays, built on first filtered search
+        """
+        if self._columns is None:
+            docs = self.store.docs
+            ts = [doc_timestamp(d) for d in docs]
+            self._columns = {
+                "source_type": np.array([str(d.get("source_type") or "") for d in docs], dtype=object),
+                "file_path": np.array([str(d.get("file_path") or "") for d in docs], dtype=object),
+                "timestamp": np.array([np.nan if t is None else t for t in ts], dtype=np.float64)
+            }
+        return self._columns
+
+    def mask(self, filters: Dict[str, Any], now: float) -> Optional[np.ndarray]:
+        """
+        Rows passing normalized filters, or None when nothing is filtered
+        """
+        if not filters:
+            return None
+        cols = self.columns()
+        keep = np.ones(self.store.count, dtype=bool)
+        if filters.get("source_type"):
+            keep &= np.isin(cols["source_type"], filters["source_type"])
+        if filters.get("file_path_prefix"):
+            prefix = filters["file_path_prefix"]
+            keep &= np.fromiter((p.startswith(prefix) for p in cols["file_path"]), dtype=bool,
+                                count=self.store.count)
+        ts = cols["timestamp"]
+        # NaN comparisons are False, so undated rows drop out of any time window
+        if filters.get("since"):
+            keep &= ts >= parse_time(filters["since"], now)
+        if filters.get("until"):
+            keep &= ts <= parse_time(filters["until"], now)
+        return keep
+
+    def _rank(self, scores: np.ndarray, size: int, filters: Optional[Dict[str, Any]],
+              recency: Optional[Dict[str, Any]], positive_only: bool = False) -> List[Tuple[int, float]]:
+        now = time.time()
+        if recency:
+            # OpenSearch's exp decay; a missing timestamp counts as the origin
+            ts = self.columns()["timestamp"]
+            distance = np.maximum(0.0, np.abs(now - ts) - duration_seconds(recency["offset"]))
+            weight = np.power(recency["decay"], distance / duration_seconds(recency["scale"]))
+            scores = scores * np.where(np.isnan(ts), 1.0, weight).astype(np.float32)
+        keep = self.mask(filters or {}, now)
+        if positive_only:
+            keep = scores > 0 if keep is None else keep & (scores > 0)
+        if keep is not None:
+            scores = np.where(keep, scores, -np.inf)
+        return [(int(i), float(scores[i])) for i in top_k(scores, size) if np.isfinite(scores[i])]
+
+    def _hits(self, ranked: Iterable[Tuple[int, float]], with_vectors: bool = False) -> List[Dict[str, Any]]:
+        hits = []
+        for i, score in ranked:
+            source = self.store.docs[i]
+            if with_vectors:
+                source = {**source, "embedding_vector": self.store.vector(i).tolist()}
+            hits.append({"_id": source.get("_id", str(i)), "_score": score, "_source": source})
+        return hits
+
+    def knn(self, vector: Sequence[float], size: int, filters: Optional[Dict[str, Any]] = None,
+            recency: Optional[Dict[str, Any]] = None, with_vectors: bool = True) -> List[Dict[str, Any]]:
+        # Like OpenSearch, the kNN leg returns vectors for reranking
+        if not filters and not recency:
+            return self._hits(self.store.search(vector, size), with_vectors=with_vectors)
+        scores = self.store.scores(vector)
+        if recency:
+            # Shift cosine into [0, 1] so the decay can only lower a score
+            scores = (scores + 1) / 2
+        return self._hits(self._rank(scores, size, filters, recency), with_vectors=with_vectors)
+
+    def lexical(self, query: str, size: int, filters: Optional[Dict[str, Any]] = None,
+                recency: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        if not filters and not recency:
+            return self._hits(self.bm25.search(query, size))
+        return self._hits(self._rank(self.bm25.scores(query), size, filters, recency, positive_only=True))
+
+
+_backends: Dict[str, LocalBackend] = {}
+
+
+def open_backend(path: Optional[str] = None) -> LocalBackend:
+    """
+    Open (once per container) the local backend at ``path`` or LOCAL_INDEX_PATH
+    """
+    path = path or os.getenv("LOCAL_INDEX_PATH", "/tmp/local_index")
+    if path not in _backends:
+        _backends[path] = LocalBackend(path)
+    return _backends[path]
@@ -1,13 +1,23 @@
+import asyncio
 import json
+import os
+import sys
 import time
-import requests
 import logging
 from datetime import datetime, timedelta
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from common import aio
+from common.claim_check import offload_if_large
+from common.singleflight import AsyncSingleFlight
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-def handler(event, _):
+feed_flight = AsyncSingleFlight()
+
+HN_API = os.getenv('HN_API_URL', 'https://hacker-news.firebaseio.com/v0')
+
+def handler(event, context):
     try:
         task_id = event.get("id", "data_task")
         feeds = event.get("inputs", {}).get("feeds", [])
@@ -16,26 +26,19 @@ def handler(event, _):
         
         records = []
         
-        for feed in feeds:
-            try:
-                if feed == "hackernews" or feed == "hn_top":
-                    records.extend(fetch_hackernews())
-                elif feed == "aws_pricing":
-                    records.extend(fetch_aws_pricing_info())
-                elif feed == "aws_blogs":
-                    records.extend(fetch_aws_blogs())
-                elif feed == "reddit_aws":
-                    records.extend(fetch_reddit_aws())
-                else:
-                    logger.warning(f"Unknown feed: {feed}")
-                    
-            except Exception as e:
-                logger.error(f"Error fetching {feed}: {str(e)}")
+        # Fetch each distinct feed once, even if listed under an alias, all at the same time
+        distinct = list(dict.fromkeys(canonical_feed(f) for f in feeds))
+        results = aio.run(fetch_feeds(distinct, aio.time_left(context)))
+        for feed, result in zip(distinct, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error fetching {feed}: {str(result) or type(result).__name__}")
                 # Continue with other feeds
+                continue
+            records.extend(result)
                 
         logger.info(f"Fetched {len(records)} records total")
         
-        return {
+        return offload_if_large({
             "task_id": task_id,
             "records": records,
             "metadata": {
@@ -43,7 +46,7 @@ def handler(event, _):
                 "feeds_requested": feeds,
                 "records_count": len(records)
             }
-        }
+        })
         
     except Exception as e:
         logger.error(f"Data fetch error: {str(e)}")
@@ -53,33 +56,70 @@ def handler(event, _):
             "error": str(e)
         }
 
+def canonical_feed(feed):
+    return "hackernews" if feed == "hn_top" else feed
+
+async def fetch_feeds(feeds, timeout=None):
+    """
+    Fetch feeds concurrently; a failed feed, or one still running after
+    ``timeout`` seconds, comes back as its exception
+    """
+    # Concurrent requests for the same feed, from any invocation, share one fetch
+    return await aio.gather_settled(*(asyncio.wait_for(feed_flight.do(feed, afetch_feed, feed), timeout)
+                                      for feed in feeds))
+
+def fetch_feed(feed):
+    """Synchronous wrapper around afetch_feed, kept for existing callers"""
+    return aio.run(afetch_feed(feed))
+
+async def afetch_feed(feed):
+    """Fetch one feed by name"""
+    feed = canonical_feed(feed)
+    if feed == "hackernews":
+        return await afetch_hackernews()
+    elif feed == "aws_pricing":
+        return fetch_aws_pricing_info()
+    elif feed == "aws_blogs":
+        return fetch_aws_blogs()
+    elif feed == "reddit_aws":
+        return fetch_reddit_aws()
+    logger.warning(f"Unknown feed: {feed}")
+    return []
+
 def fetch_hackernews():
+    """Synchronous wrapper around afetch_hackernews, kept for existing callers"""
+    return aio.run(afetch_hackernews())
+
+async def _get_json(url):
+    status, data = await aio.request("GET", url)
+    if status != 200:
+        raise RuntimeError(f"GET {url} returned {status}")
+    return json.loads(data)
+
+async def afetch_hackernews():
     """Fetch top stories from HackerNews API"""
     try:
         # Get top story IDs
-        top_stories_url = "https://hacker-news.firebaseio.com/v0/topstories.json"
-        response = requests.get(top_stories_url, timeout=10)
-        story_ids = response.json()[:10]  # Top 10 stories
+        story_ids = (await _get_json(f"{HN_API}/topstories.json"))[:10]  # Top 10 stories
+        
+        # The story lookups are independent; issue them together
+        stories = await aio.gather_settled(*(_get_json(f"{HN_API}/item/{sid}.json") for sid in story_ids))
         
         records = []
-        for story_id in story_ids:
-            try:
-                story_url = f"https://hacker-news.firebaseio.com/v0/item/{story_id}.json"
-                story_response = requests.get(story_url, timeout=5)
-                story = story_response.json()
-                
-                if story and story.get('title'):
-                    records.append({
-                        "source": "hackernews",
-                        "title": story.get('title', ''),
-                        "url": story.get('url', f"https://news.ycombinator.com/item?id={story_id}"),
-                        "score": story.get('score', 0),
-                        "timestamp": story.get('time', int(time.time())),
-                        "type": "news"
-                    })
-            except Exception as e:
-                logger.warning(f"Error fetching story {story_id}: {str(e)}")
+        for story_id, story in zip(story_ids, stories):
+            if isinstance(story, Exception):
+                logger.warning(f"Error fetching story {story_id}: {str(story)}")
                 continue
+            
+            if story and story.get('title'):
+                records.append({
+                    "source": "hackernews",
+                    "title": story.get('title', ''),
+                    "url": story.get('url', f"https://news.ycombinator.com/item?id={story_id}"),
+                    "score": story.get('score', 0),
+                    "timestamp": story.get('time', int(time.time())),
+                    "type": "news"
+                })
                 
         return records
         
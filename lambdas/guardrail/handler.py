@@ -1,7 +1,22 @@
-import re
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from common.guardrail_engine import GuardrailViolation, check_goal
 
 def handler(event,_):
-    goal = event.get("goal","")
-    if re.search(r'(delete|drop|shutdown)\b', goal, re.I):
-        raise Exception("Unsafe intent")
-    return event
\ No newline at end of file
+    verdict = check_goal(event.get("goal",""))
+    if not verdict["allowed"]:
+        raise GuardrailViolation(verdict["reason"])
+    # PII and secrets never reach the planner or the LLM
+    return {**event, "goal": verdict["redacted"]}
+
+def screen_goals(goals):
+    """Check a batch of goals in one pass; unsafe goals are flagged, not raised"""
+    verdicts = []
+    for goal in goals:
+        verdict = check_goal(goal)
+        verdicts.append({
+            "goal": verdict["redacted"],
+            "allowed": verdict["allowed"],
+            "reason": verdict["reason"]
+        })
+    return verdicts
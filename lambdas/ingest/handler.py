@@ -1,3 +1,4 @@
+import argparse
 import json
 import boto3
 import os
@@ -7,7 +8,10 @@ from datetime import datetime
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from common.embeddings import embed
-from common.retrieval import os_put
+from common.retrieval import OpenSearchBackend, os_get, os_post, os_put
+from common.search_filters import MAX_K
+from common.index_admin import resolve_index
+from common.near_dup import DedupStats, NearDupIndex, default_mode, log_stats, minhash
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -17,74 +21,226 @@ textract = boto3.client('textract')
 
 def handler(event, context):
     """
-    Triggered by S3 uploads to docs bucket
+    Triggered by S3 uploads to (and deletes from) docs bucket
     Processes PDFs/text files and indexes them in OpenSearch
     """
     try:
+        dedup = load_dedup_index()
+        stats = DedupStats()
+        bucket = os.getenv('DOCS_BUCKET')
+
         # Handle S3 event
         if 'Records' in event:
             for record in event['Records']:
                 bucket = record['s3']['bucket']['name']
                 key = record['s3']['object']['key']
                 
-                logger.info(f"Processing document: s3://{bucket}/{key}")
-                
                 # Skip if not a document
                 if not is_document(key):
                     logger.info(f"Skipping non-document: {key}")
                     continue
                 
+                if record.get('eventName', '').startswith('ObjectRemoved'):
+                    logger.info(f"Removing document: s3://{bucket}/{key}")
+                    remove_document(key, dedup)
+                    continue
+                
                 # Process the document
-                process_document(bucket, key)
+                logger.info(f"Processing document: s3://{bucket}/{key}")
+                stats.record(process_document(bucket, key, dedup))
                 
         # Handle direct invocation
         else:
             bucket = event.get('bucket')
             key = event.get('key')
-            if bucket and key:
-                process_document(bucket, key)
+            if bucket and key and event.get('deleted'):
+                remove_document(key, dedup)
+            elif bucket and key:
+                stats.record(process_document(bucket, key, dedup))
             else:
                 return {"error": "Missing bucket or key"}
         
-        return {"status": "success", "message": "Documents processed"}
+        reingested = []
+        if dedup is not None:
+            reingested = reingest_orphans(bucket, dedup, stats)
+            dedup.save(os.environ['ARTIFACTS_BUCKET'], dedup_index_key())
+        log_stats(stats.snapshot())
+        return {"status": "success", "message": "Documents processed", "dedup": stats.snapshot(),
+                "reingested": reingested}
         
     except Exception as e:
         logger.error(f"Document ingestion error: {str(e)}")
         return {"error": str(e)}
 
-def process_document(bucket, key):
-    """Process a single document"""
+def reingest_orphans(bucket, dedup, stats):
+    """
+    Re-ingest the sources of skipped duplicates whose canonical chunk was
+    changed or deleted, so the content they share is indexed again
+    """
+    done = []
+    while True:
+        sources = [s for s in dedup.orphan_sources() if s not in done]
+        if not sources:
+            break
+        for source in sources:
+            done.append(source)
+            logger.info(f"Re-ingesting {source}: its skipped duplicates lost their canonical chunk")
+            try:
+                stats.record(process_document(bucket, source, dedup))
+            except Exception as e:
+                logger.error(f"Could not re-ingest {source}: {str(e)}")
+    orphans = dedup.orphans()
+    if orphans:
+        logger.warning(f"{len(orphans)} skipped duplicates still lost their canonical chunk "
+                       f"(is the source gone?): {orphans[:10]}")
+    return done
+
+def remove_document(key, dedup=None, store=None):
+    """Drop a deleted object's chunks from the index and the near-duplicate index"""
+    store = store or local_store()
+    if store:
+        # Imported lazily so OpenSearch deployments never load the store
+        from common.vector_store import VectorStore
+        VectorStore.upsert(store, [], [], drop=lambda d: d.get("file_path") == key)
+    else:
+        delete_chunks(key)
+    if dedup is not None:
+        dedup.remove_source(key)
+    logger.info(f"Removed chunks of {key}")
+
+def delete_chunks(key):
+    """
+    Delete every chunk indexed under ``key`` from the documents alias.
+
+    Matches on the keyword path the alias maps for file_path, as search
+    filters do; an index that maps it only as text gets its candidates by
+    phrase and deletes the exact matches by id. Returns the deleted count.
+    """
+    path = OpenSearchBackend().profile()["fields"].get("file_path")
+    if path:
+        query = {"term": {path: key}}
+    else:
+        resp = os_post(f"{resolve_index()}/_search", {
+            "size": MAX_K, "_source": ["file_path"], "query": {"match_phrase": {"file_path": key}}
+        }).json()
+        if "hits" not in resp:
+            raise RuntimeError(f"Could not find the chunks of {key}: {json.dumps(resp)[:300]}")
+        ids = [h["_id"] for h in resp["hits"]["hits"] if h["_source"].get("file_path") == key]
+        if not ids:
+            return 0
+        query = {"ids": {"values": ids}}
+    resp = os_post(f"{resolve_index()}/_delete_by_query?refresh=true&conflicts=proceed", {"query": query}).json()
+    if "deleted" not in resp or resp.get("failures"):
+        raise RuntimeError(f"Could not delete the chunks of {key}: {json.dumps(resp)[:300]}")
+    return resp["deleted"]
+
+def dedup_index_key():
+    return os.getenv('NEAR_DUP_INDEX_KEY', 'ingest/near-dup-index.json.gz')
+
+def load_dedup_index():
+    """Near-duplicate index shared across invocations, or None when disabled"""
+    if default_mode() == 'off' or not os.getenv('ARTIFACTS_BUCKET'):
+        return None
+    index = NearDupIndex.load(os.environ['ARTIFACTS_BUCKET'], dedup_index_key())
+    logger.info(f"Loaded near-duplicate index with {len(index)} chunks")
+    return index
+
+def local_store():
+    """Path of the local vector store when RETRIEVAL_BACKEND=local, else None"""
+    if os.getenv('RETRIEVAL_BACKEND', 'opensearch') == 'local':
+        return os.getenv('LOCAL_INDEX_PATH', '/tmp/local_index')
+    return None
+
+def canonical_vector(doc_id, store=None):
+    """Embedding of an already indexed chunk, so a linked duplicate needs no Bedrock call"""
+    try:
+        if store:
+            from common.vector_store import open_backend
+            source = open_backend(store).get(doc_id)
+            return source and source['embedding_vector']
+        resp = os_get(f"{resolve_index()}/_doc/{doc_id}?_source_includes=embedding_vector")
+        if resp.status_code == 200:
+            return resp.json().get('_source', {}).get('embedding_vector')
+    except Exception as e:
+        logger.warning(f"Could not fetch vector for {doc_id}: {str(e)}")
+    return None
+
+def process_document(bucket, key, dedup=None):
+    """Process a single document, returning chunk and duplicate counts"""
+    # Get file extension
+    file_ext = key.lower().split('.')[-1]
+    
+    if file_ext == 'pdf':
+        text = extract_text_from_pdf(bucket, key)
+    elif file_ext in ['txt', 'md']:
+        text = extract_text_from_text_file(bucket, key)
+    else:
+        logger.warning(f"Unsupported file type: {file_ext}")
+        return {"chunks": 0, "duplicates": 0, "linked": 0, "embed_calls_avoided": 0}
+    
+    return index_text(text, key, f"s3://{bucket}/{key}", dedup)
+
+def index_text(text, key, url, dedup=None, store=None):
+    """
+    Chunk, embed and index one document's text under ``key``.
+
+    Chunks go to the documents alias, after the key's previous chunks are
+    deleted, or with RETRIEVAL_BACKEND=local (or an explicit ``store`` path)
+    to the local vector store, replacing the key's previous rows in one
+    rewrite.
+    """
+    stats = {"chunks": 0, "duplicates": 0, "linked": 0, "embed_calls_avoided": 0}
+    store = store or local_store()
+    pending = []
     try:
-        # Get file extension
-        file_ext = key.lower().split('.')[-1]
-        
-        if file_ext == 'pdf':
-            text = extract_text_from_pdf(bucket, key)
-        elif file_ext in ['txt', 'md']:
-            text = extract_text_from_text_file(bucket, key)
-        else:
-            logger.warning(f"Unsupported file type: {file_ext}")
-            return
-        
         if not text or len(text.strip()) < 50:
             logger.warning(f"Insufficient text extracted from {key}")
-            return
+            return stats
         
         # Chunk the text
         chunks = chunk_text(text, max_chunk_size=1000)
+        stats["chunks"] = len(chunks)
+        mode = default_mode()
+        
+        # A re-upload replaces the key's previous chunks rather than matching them
+        if not store:
+            # Chunks now skipped as duplicates, or past the new chunk count, would linger
+            delete_chunks(key)
+        if dedup is not None:
+            dedup.remove_source(key)
         
         # Process each chunk
         for i, chunk in enumerate(chunks):
             try:
+                doc_id = f"{key.replace('/', '_')}_{i}"
+                
+                # Look for a near-duplicate already indexed from another copy
+                signature, match, embedding = None, None, None
+                if dedup is not None:
+                    signature = minhash(chunk)
+                    match = dedup.query(signature)
+                if match and mode == 'skip':
+                    dedup.link(doc_id, match[0], key)
+                    stats["duplicates"] += 1
+                    stats["embed_calls_avoided"] += 1
+                    logger.info(f"Skipped chunk {i+1}/{len(chunks)} of {key}: "
+                                f"duplicate of {match[0]} (similarity {match[1]:.2f})")
+                    continue
+                if match and mode == 'link':
+                    embedding = canonical_vector(match[0], store)
+                    if embedding is None:
+                        # Canonical chunk is gone from the index; treat this one as new
+                        match = None
+                
                 # Generate embedding
-                embedding = embed(chunk)
+                if embedding is None:
+                    embedding = embed(chunk)
                 
                 # Create document for OpenSearch
-                doc_id = f"{key.replace('/', '_')}_{i}"
                 document = {
                     "title": extract_title(key, chunk if i == 0 else ""),
                     "body": chunk,
-                    "url": f"s3://{bucket}/{key}",
+                    "url": url,
                     "source_type": "document",
                     "timestamp": datetime.utcnow().isoformat(),
                     "embedding_vector": embedding,
@@ -92,16 +248,37 @@ def process_document(bucket, key):
                     "total_chunks": len(chunks),
                     "file_path": key
                 }
+                if match:
+                    document["duplicate_of"] = match[0]
+                
+                if store:
+                    # The local store keys rows by _id, which OpenSearch keeps out of _source
+                    pending.append({**document, "_id": doc_id})
+                else:
+                    os_put(f"{resolve_index()}/_doc/{doc_id}", document)
+                    logger.info(f"Indexed chunk {i+1}/{len(chunks)} for {key}")
                 
-                # Index in OpenSearch
-                os_put(f"/documents_v1/_doc/{doc_id}", document)
-                logger.info(f"Indexed chunk {i+1}/{len(chunks)} for {key}")
+                if match:
+                    stats["duplicates"] += 1
+                    stats["linked"] += 1
+                    stats["embed_calls_avoided"] += 1
+                elif signature is not None:
+                    dedup.add(doc_id, signature, key)
                 
             except Exception as e:
                 logger.error(f"Error processing chunk {i} of {key}: {str(e)}")
                 continue
         
-        logger.info(f"Successfully processed {key} into {len(chunks)} chunks")
+        if store:
+            # Imported lazily so OpenSearch deployments never load the store
+            from common.vector_store import VectorStore
+            VectorStore.upsert(store, [d["embedding_vector"] for d in pending], pending,
+                               drop=lambda d: d.get("file_path") == key)
+            logger.info(f"Wrote {len(pending)} chunks for {key} to the local store at {store}")
+        
+        logger.info(f"Successfully processed {key} into {len(chunks)} chunks "
+                    f"({stats['duplicates']} near-duplicates)")
+        return stats
         
     except Exception as e:
         logger.error(f"Error processing document {key}: {str(e)}")
@@ -192,4 +369,25 @@ def extract_title(file_path, first_chunk):
 def is_document(key):
     """Check if file is a supported document type"""
     supported_extensions = ['.pdf', '.txt', '.md', '.doc', '.docx']
-    return any(key.lower().endswith(ext) for ext in supported_extensions)
\ No newline at end of file
+    return any(key.lower().endswith(ext) for ext in supported_extensions)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or update the local vector store from text files")
+    parser.add_argument("files", nargs="+", help=".txt or .md files; each replaces its earlier chunks")
+    parser.add_argument("--store", default=os.getenv('LOCAL_INDEX_PATH', '/tmp/local_index'))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    stats = DedupStats()
+    for path in args.files:
+        if path.lower().split('.')[-1] not in ['txt', 'md']:
+            logger.warning(f"Skipping unsupported file: {path}")
+            continue
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        stats.record(index_text(text, path, f"file://{os.path.abspath(path)}", store=args.store))
+
+    print(json.dumps({"store": args.store, **stats.snapshot()}, indent=2))
+
+if __name__ == "__main__":
+    sys.exit(main())
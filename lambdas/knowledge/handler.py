@@ -1,58 +1,52 @@
 import json
 import os
 import logging
-import requests
+import sys
+import time
 import boto3
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from common import aio, retrieval
+from common.claim_check import offload_if_large
+from common.search_filters import search_options
+from common.singleflight import AsyncSingleFlight
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Inline retrieval functions
-OS = f"https://{os.getenv('OS_ENDPOINT', 'your-opensearch-endpoint.region.es.amazonaws.com')}"
-HEADERS = {"Content-Type":"application/json"}
+search_flight = AsyncSingleFlight()
 
-def hybrid_search(query, k=8):
+def hybrid_search(query, k=8, diversify=True, filters=None, recency=None):
+    """Synchronous wrapper around ahybrid_search, kept for existing callers"""
+    return aio.run(ahybrid_search(query, k=k, diversify=diversify, filters=filters, recency=recency))
+
+async def ahybrid_search(query, k=8, diversify=True, filters=None, recency=None):
+    """
+    Fused kNN + BM25 search on the configured backend (the documents alias,
+    or the local store with RETRIEVAL_BACKEND=local); a failed search yields
+    no passages rather than failing the task
+    """
     try:
-        # Simple text search for now
-        search_query = {
-            "query": {
-                "multi_match": {
-                    "query": query,
-                    "fields": ["title^2", "body"]
-                }
-            },
-            "size": k
-        }
-        
-        response = requests.post(f"{OS}/documents_v1/_search", 
-                               headers=HEADERS, 
-                               json=search_query, 
-                               auth=(os.getenv('OS_USERNAME', 'admin'), os.getenv('OS_PASSWORD', 'your-password')),
-                               timeout=10)
-        
-        if response.status_code == 200:
-            hits = response.json().get('hits', {}).get('hits', [])
-            return [{
-                "title": hit['_source'].get('title', 'Unknown'),
-                "body": hit['_source'].get('body', ''),
-                "url": hit['_source'].get('url', ''),
-                "score": hit['_score']
-            } for hit in hits]
-        else:
-            logger.error(f"Search failed: {response.status_code}")
-            return []
+        # MMR drops near-duplicate overlapping chunks and stitches adjacent ones
+        return await retrieval.ahybrid_search(query, k=k, diversify=diversify,
+                                              filters=filters, recency=recency)
     except Exception as e:
         logger.error(f"Search error: {str(e)}")
         return []
 
 def handler(event, context):
     try:
+        start = time.perf_counter()
         task_id = event.get("id", "knowledge_task")
         query = event.get("inputs", {}).get("query", "aws cloud cost")
+        filters, recency = search_options(event.get("inputs", {}))
         
-        logger.info(f"Searching knowledge base for: {query}")
+        logger.info(f"Searching knowledge base for: {query} (filters={filters}, recency={recency})")
         
-        passages = hybrid_search(query, k=6)
+        # Identical queries in flight at the same time share one search
+        # Bounded by the Lambda's remaining time, so a slow search fails the task cleanly
+        passages = aio.run(search_flight.do(json.dumps([query, 6, filters, recency], sort_keys=True),
+                                            ahybrid_search, query, k=6, filters=filters, recency=recency),
+                           timeout=aio.time_left(context))
         
         citations = []
         for p in passages:
@@ -65,13 +59,16 @@ def handler(event, context):
         
         logger.info(f"Found {len(passages)} relevant passages")
         
-        return {
+        return offload_if_large({
             "task_id": task_id,
             "passages": passages,
             "citations": citations,
             "query": query,
-            "results_count": len(passages)
-        }
+            "filters": filters,
+            "recency": recency,
+            "results_count": len(passages),
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+        })
         
     except Exception as e:
         logger.error(f"Knowledge search error: {str(e)}")
@@ -1,10 +1,15 @@
 import json
 import sys
 import os
+import time
 import uuid
 import logging
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from common.bedrock_client import call_llm
+from common import speculation
+from common.singleflight import dedupe_tasks
+from common.guardrail_engine import screen_tasks
+from common.search_filters import search_options
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -25,13 +30,28 @@ Return STRICT JSON with this structure:
 }
 
 Task types:
-- knowledge: Search documents/knowledge base
+- knowledge: Search documents/knowledge base. Inputs: "query", plus optional
+  "filters" ({"source_type": "document", "since": "30d", "until": "<ISO date>",
+  "file_path_prefix": "reports/"}) and "recency" ("30d" to favour newer documents).
+  Only add filters or recency when the goal asks for them.
 - data: Fetch real-time data from APIs
 - action: Execute actions, generate recommendations
 
 Create 2-5 tasks that logically accomplish the goal."""
 
 def handler(event, _):
+    start = time.perf_counter()
+    result = plan_goal(event)
+    # The LLM's tasks pass the same policy as the goal before anything runs them
+    plan = result["plan"]
+    plan["tasks"], blocked = screen_tasks(plan.get("tasks", []))
+    if blocked:
+        logger.warning(f"Guardrail removed {len(blocked)} planned tasks: {json.dumps(blocked)}")
+        plan["blocked_tasks"] = blocked
+    result["plan_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+def plan_goal(event):
     try:
         goal = event.get("goal", "Analyze current AWS pricing trends")
         logger.info(f"Planning for goal: {goal}")
@@ -65,6 +85,14 @@ def handler(event, _):
                 # Validate task type
                 if task.get("type") not in ["knowledge", "data", "action"]:
                     task["type"] = "knowledge"  # default fallback
+                
+                if task["type"] == "knowledge":
+                    normalize_search_inputs(task)
+            
+            # Identical tasks would do the same work twice in the fan-out
+            plan["tasks"], aliases = dedupe_tasks(plan["tasks"])
+            if aliases:
+                plan["aliases"] = aliases
             
             logger.info(f"Generated plan with {len(plan['tasks'])} tasks")
             return {"plan": plan}
@@ -78,6 +106,18 @@ def handler(event, _):
         logger.error(f"Planning error: {str(e)}")
         return generate_fallback_plan(goal)
 
+def normalize_search_inputs(task):
+    """Canonical filters/recency on a knowledge task; invalid or empty ones are dropped"""
+    inputs = task.get("inputs") or {}
+    filters, recency = search_options(inputs)
+    inputs.pop("filters", None)
+    inputs.pop("recency", None)
+    if filters:
+        inputs["filters"] = filters
+    if recency:
+        inputs["recency"] = recency
+    task["inputs"] = inputs
+
 def generate_fallback_plan(goal):
     """Fallback plan if LLM fails"""
     return {
@@ -106,4 +146,25 @@ def generate_fallback_plan(goal):
                 }
             ]
         }
-    }
\ No newline at end of file
+    }
+
+def reconcile_handler(event, _):
+    """
+    Join the planner with the speculative knowledge search run beside it.
+
+    Receives the Parallel state output ``[plan_branch, speculative_branch]``
+    and returns the task list, with matching knowledge tasks carrying the
+    speculative result as ``precomputed`` so the fan-out skips them.
+    """
+    goal = event.get("goal", "")
+    plan_branch, speculative_result = event.get("branches", [{}, None])
+
+    plan = plan_branch.get("plan") or {}
+    tasks = plan.get("tasks", [])
+
+    outcome = speculation.apply_speculation(
+        tasks, goal, speculative_result, plan_ms=plan_branch.get("plan_ms")
+    )
+    speculation.log_outcome(outcome)
+
+    return {**plan, "tasks": tasks, "speculation": outcome}
@@ -1,6 +1,12 @@
 import json
 import logging
+import os
+import sys
+import time
 import boto3
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from common.claim_check import resolve_all_timed
+from common.guardrail_engine import screen_output
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -43,6 +49,7 @@ Format your response in markdown with clear sections and bullet points where app
 def handler(event, context):
     try:
         logger.info("Starting synthesis of agent outputs")
+        start = time.perf_counter()
         
         # Extract results from previous agents
         fanout_results = event.get("FanOutResults", [])
@@ -55,6 +62,9 @@ def handler(event, context):
                 "status": "no_data"
             }
         
+        # Large agent outputs arrive as S3 claim checks; fetch them in parallel
+        fanout_results, metrics = resolve_all_timed(fanout_results)
+        
         # Prepare context for synthesis
         context = {
             "agent_outputs": fanout_results,
@@ -69,16 +79,23 @@ def handler(event, context):
             max_tokens=1000
         )
         
+        # Retrieved documents and feeds can carry PII into the answer
+        answer_md, findings = screen_output(answer_md)
+        if findings:
+            logger.info(f"Redacted {len(findings)} guardrail matches from the answer")
+        
         # Extract citations from agent outputs
         citations = extract_citations(fanout_results)
         
-        logger.info(f"Synthesis complete with {len(citations)} citations")
+        metrics["synth_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        logger.info(f"Synthesis complete with {len(citations)} citations: {json.dumps(metrics)}")
         
         return {
             "answer_md": answer_md,
             "citations": citations,
             "status": "success",
-            "sources_used": len(citations)
+            "sources_used": len(citations),
+            "metrics": metrics
         }
         
     except Exception as e:
@@ -0,0 +1,59 @@
+import asyncio
+import os
+import socket
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lambdas'))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+from common import aio
+from common.error_handler import RetryableError
+
+
+class FakeContext:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+@pytest.fixture
+def silent_server():
+    """Accepts connections and never answers"""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(16)
+    yield f"http://127.0.0.1:{server.getsockname()[1]}/"
+    server.close()
+
+
+def test_retries_stop_at_the_deadline(silent_server):
+    start = time.monotonic()
+    with pytest.raises(RetryableError):
+        aio.run(aio.request("GET", silent_server, timeout=0.3, deadline=0.5))
+    assert time.monotonic() - start < 1.0
+
+
+def test_default_budget_fits_the_agent_lambda_timeout():
+    assert aio.timeout_seconds() <= 10
+    assert aio.deadline_seconds() < 30
+
+
+def test_run_cancels_work_past_its_timeout():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    with pytest.raises(asyncio.TimeoutError):
+        aio.run(slow(), timeout=aio.time_left(FakeContext(2100)))
+    assert cancelled == [True]
+    assert aio.time_left(None) is None
@@ -0,0 +1,99 @@
+import io
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lambdas'))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+from action import handler as action
+from action.handler import batch_invoke_entrypoint
+from common import pipeline
+
+
+def invoke(body):
+    resp = batch_invoke_entrypoint({"body": body}, None)
+    return resp["statusCode"], json.loads(resp["body"])
+
+
+@pytest.mark.parametrize("body", ["{not json", '"goals"', "{}", '{"goals": []}', '{"goals": "one goal"}'])
+def test_rejects_malformed_bodies(body):
+    status, payload = invoke(body)
+    assert status == 400
+    assert "error" in payload
+
+
+def test_names_invalid_goal_indices():
+    status, payload = invoke(json.dumps({"goals": ["Compare EC2 pricing", 3, "   ", None]}))
+    assert status == 400
+    assert payload["invalid_indices"] == [1, 2, 3]
+
+
+class FakeS3:
+    class exceptions:
+        NoSuchKey = KeyError
+
+    def __init__(self):
+        self.objects, self.writes = {}, []
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body
+        self.writes.append(json.loads(Body))
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+
+class FakeLambda:
+    def __init__(self):
+        self.payloads = []
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        self.payloads.append(json.loads(Payload))
+
+
+class FakeContext:
+    function_name = "agent-batch-runner"
+
+    def __init__(self, remaining_ms):
+        self.remaining_ms = list(remaining_ms)
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms.pop(0)
+
+
+def fake_run_batch(goals, max_concurrency=8):
+    return {"results": [{"goal": g, "answer_md": g.upper()} for g in goals],
+            "metrics": {"goals": len(goals), "blocked": 0, "tasks_planned": len(goals),
+                        "tasks_executed": len(goals), "goals_per_minute": 1.0, "timings": {"plan": 1.0}}}
+
+
+def test_rejects_batches_estimated_past_the_runtime_cap(monkeypatch):
+    monkeypatch.setattr(action, "MAX_BATCH_SECONDS", 60)
+    status, payload = invoke(json.dumps({"goals": [f"goal {i}" for i in range(40)]}))
+    assert status == 400
+    assert payload["estimated_seconds"] == action.estimated_seconds(40) > 60
+
+
+def test_runner_checkpoints_each_chunk_and_hands_off_the_rest(monkeypatch):
+    fake_s3, fake_lambda = FakeS3(), FakeLambda()
+    monkeypatch.setattr(action, "s3", fake_s3)
+    monkeypatch.setattr(action, "lambda_client", fake_lambda)
+    monkeypatch.setattr(action, "BATCH_CHUNK_GOALS", 2)
+    monkeypatch.setattr(pipeline, "run_batch", fake_run_batch)
+    event = {"request_id": "r1", "goals": [f"goal {i}" for i in range(5)]}
+
+    # Room for the second chunk but not the third
+    out = action.batch_handler(event, FakeContext([600_000, 10_000]))
+    assert out["status"] == "continued" and out["completed"] == 4
+    assert [w["completed"] for w in fake_s3.writes] == [2, 4]
+    assert fake_lambda.payloads == [event]
+
+    # The next invocation resumes from the checkpoint
+    out = action.batch_handler(fake_lambda.payloads[0], FakeContext([]))
+    final = fake_s3.writes[-1]
+    assert out["status"] == final["status"] == "complete"
+    assert [r["goal"] for r in final["results"]] == event["goals"]
+    assert final["metrics"]["goals"] == 5 and final["metrics"]["timings"]["plan"] == 3.0
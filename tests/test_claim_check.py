@@ -0,0 +1,52 @@
+import io
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lambdas'))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+from common import claim_check
+
+
+class FakeS3:
+    def __init__(self, fail_reads=False):
+        self.objects = {}
+        self.fail_reads = fail_reads
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body
+
+    def get_object(self, Bucket, Key):
+        if self.fail_reads:
+            raise RuntimeError("AccessDenied")
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+
+def result(task_id, passages):
+    return {"task_id": task_id, "query": "ec2 pricing", "elapsed_ms": 12.0,
+            "passages": [{"title": f"p{i}", "body": "x" * 200} for i in range(passages)]}
+
+
+def test_only_results_over_the_threshold_are_offloaded(monkeypatch):
+    monkeypatch.setattr(claim_check, "s3", FakeS3())
+    small, large = result("t1", 1), result("t2", 20)
+
+    kept = claim_check.offload_if_large(small, threshold=1024, bucket="artifacts")
+    assert kept == {**small, "payload_bytes": claim_check.payload_size(small)}
+
+    claim = claim_check.offload_if_large(large, threshold=1024, bucket="artifacts")
+    assert claim["claim_check"]["key"].startswith("claims/t2/")
+    assert claim["passages_count"] == 20 and "passages" not in claim
+    assert claim["payload_bytes"] < 1024
+    assert claim_check.resolve_all([kept, claim]) == [kept, large]
+
+
+def test_unreadable_claim_degrades_to_its_summary(monkeypatch):
+    monkeypatch.setattr(claim_check, "s3", FakeS3())
+    claim = claim_check.offload_if_large(result("t1", 20), threshold=1024, bucket="artifacts")
+
+    monkeypatch.setattr(claim_check.s3, "fail_reads", True)
+    resolved = claim_check.resolve_all([claim])
+    assert resolved[0]["task_id"] == "t1"
+    assert resolved[0]["passages_count"] == 20
+    assert "claim_check" not in resolved[0]
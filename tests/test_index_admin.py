@@ -0,0 +1,77 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lambdas'))
+
+from common import index_admin
+from common.index_admin import IndexAdmin, build_index_body
+
+SPEC = {"alias": "documents", "vector": {"dimension": 8}}
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+        self.text = json.dumps(body)
+
+    def json(self):
+        return self.body
+
+
+class FakeSession:
+    """Records calls and answers the alias, index, reindex and task APIs"""
+    def __init__(self):
+        self.calls = []
+        self.polls = 0
+
+    def head(self, url, **kwargs):
+        return FakeResponse(404, {})
+
+    def get(self, url, **kwargs):
+        return FakeResponse(200, {"documents_v1": {}})
+
+    def request(self, method, url, params=None, data=None, **kwargs):
+        body = json.loads(data) if data else None
+        self.calls.append((method, url.split("9200", 1)[-1], body))
+        if url.endswith("/_reindex"):
+            assert params["wait_for_completion"] == "false"
+            return FakeResponse(200, {"task": "node:7"})
+        if url.endswith("/_tasks/node:7"):
+            # Each task reports running once before it completes
+            self.polls += 1
+            if self.polls % 2:
+                return FakeResponse(200, {"completed": False})
+            return FakeResponse(200, {"completed": True,
+                                      "response": {"created": 1, "updated": 2, "version_conflicts": 3, "failures": []}})
+        return FakeResponse(200, {"acknowledged": True})
+
+
+def test_rollout_copies_by_version_around_the_swap(monkeypatch):
+    monkeypatch.setattr(index_admin.time, "sleep", lambda seconds: None)
+    admin = IndexAdmin(endpoint="http://localhost:9200")
+    admin.session = FakeSession()
+    out = admin.rollout(SPEC, 2)
+
+    paths = [path for _, path, _ in admin.session.calls]
+    polls = ["/_tasks/node:7"] * 2
+    assert paths == ["/documents_v2", "/_reindex", *polls, "/_aliases", "/_reindex", *polls]
+    for _, path, body in admin.session.calls:
+        if path == "/_reindex":
+            assert body["dest"] == {"index": "documents_v2", "version_type": "external"}
+            assert body["conflicts"] == "proceed"
+            assert "op_type" not in body["dest"]
+    assert out["catch_up"] == {"documents_v1": {"created": 1, "updated": 2, "version_conflicts": 3}}
+
+
+def test_ef_search_goes_where_each_engine_reads_it():
+    def body(engine):
+        return build_index_body({**SPEC, "vector": {"dimension": 8, "engine": engine, "ef_search": 64}})
+
+    faiss, nmslib, lucene = body("faiss"), body("nmslib"), body("lucene")
+    assert faiss["mappings"]["properties"]["embedding_vector"]["method"]["parameters"]["ef_search"] == 64
+    assert "knn.algo_param.ef_search" not in faiss["settings"]["index"]
+    assert nmslib["settings"]["index"]["knn.algo_param.ef_search"] == 64
+    assert "ef_search" not in nmslib["mappings"]["properties"]["embedding_vector"]["method"]["parameters"]
+    assert "knn.algo_param.ef_search" not in lucene["settings"]["index"]
@@ -0,0 +1,64 @@
+import os
+import sys
+import zlib
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lambdas'))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+from common import retrieval
+from common.vector_store import VectorStore
+from ingest import handler as ingest
+from knowledge.handler import handler as knowledge_handler
+
+DIM = 64
+
+EC2 = ("EC2 pricing guide.\nOn-demand instances are billed per second, and savings plans "
+       "trade a one or three year commitment for lower compute rates across instance families.")
+S3 = ("S3 storage classes.\nIntelligent tiering moves objects between access tiers, and "
+      "lifecycle rules expire old versions so buckets stop accumulating storage costs.")
+
+
+def fake_embed(text):
+    v = np.zeros(DIM, dtype=np.float32)
+    for word in text.lower().split():
+        v[zlib.crc32(word.encode()) % DIM] += 1
+    return v.tolist()
+
+
+async def fake_aembed(text):
+    return fake_embed(text)
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_upsert_replaces_by_id_and_drops_matching_rows(tmp_path):
+    store = str(tmp_path / "store")
+    docs = [{"_id": f"d{i}", "file_path": "a" if i < 2 else "b", "body": str(i)} for i in range(3)]
+    VectorStore.upsert(store, np.eye(3, DIM), docs)
+    out = VectorStore.upsert(store, np.eye(1, DIM, 5), [{"_id": "d2", "file_path": "b", "body": "new"}],
+                             drop=lambda d: d["file_path"] == "a")
+    assert [d["body"] for d in out.docs] == ["new"]
+    assert out.search(np.eye(1, DIM, 5)[0], 1)[0][0] == 0
+
+
+def test_knowledge_agent_reads_what_ingest_wrote(tmp_path, monkeypatch):
+    store = str(tmp_path / "store")
+    monkeypatch.setattr(ingest, "embed", fake_embed)
+    monkeypatch.setattr(retrieval, "aembed", fake_aembed)
+    monkeypatch.setenv("RETRIEVAL_BACKEND", "local")
+    monkeypatch.setenv("LOCAL_INDEX_PATH", store)
+
+    ingest.main(["--store", store, write(tmp_path, "ec2.md", EC2), write(tmp_path, "s3.md", S3)])
+    result = knowledge_handler({"id": "k1", "inputs": {"query": "savings plans compute rates"}}, None)
+    assert "error" not in result
+    assert result["passages"][0]["title"] == "EC2 pricing guide."
+
+    # Re-ingesting a file replaces its chunks instead of adding to them
+    ingest.main(["--store", store, write(tmp_path, "ec2.md", EC2.replace("EC2 pricing", "EC2 costs"))])
+    assert sorted(d["title"] for d in VectorStore(store).docs) == ["EC2 costs guide.", "S3 storage classes."]
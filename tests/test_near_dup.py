@@ -0,0 +1,130 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lambdas'))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+from common import retrieval
+from common.near_dup import NearDupIndex, minhash
+from common.vector_store import VectorStore
+from ingest import handler as ingest
+from test_local_retrieval import fake_embed
+from test_search_filters import FakeResponse
+
+SHARED = ("Reserved instances and savings plans both discount steady compute usage, but savings "
+          "plans apply across instance families and regions while reserved instances do not.")
+OTHER = ("Spot instances run on spare capacity at steep discounts and can be interrupted with two "
+         "minutes notice, so they suit batch jobs and stateless workers that checkpoint often.")
+
+
+
+def mapping(file_path):
+    return {"documents_v1": {"mappings": {"properties": {"file_path": file_path}}}}
+
+
+class FakeOpenSearch:
+    """Answers _search and _delete_by_query, recording the queries"""
+    def __init__(self, hits=(), delete=None):
+        self.hits = [{"_id": f"h{i}", "_source": {"file_path": p}} for i, p in enumerate(hits)]
+        self.delete = delete
+        self.queries = []
+
+    def post(self, path, q):
+        self.queries.append((path.split("?")[0], q["query"]))
+        if path.endswith("/_search"):
+            return FakeResponse({"hits": {"hits": self.hits}})
+        return FakeResponse(self.delete or {"deleted": 2, "failures": []})
+
+
+def test_remove_document_deletes_on_the_mapped_keyword_path(monkeypatch):
+    fake = FakeOpenSearch(hits=["docs/a.md", "old/docs/a.md"])
+    monkeypatch.setattr(ingest, "os_post", fake.post)
+    monkeypatch.delenv("RETRIEVAL_BACKEND", raising=False)
+
+    monkeypatch.setattr(retrieval, "_profiles", {})
+    monkeypatch.setattr(retrieval, "os_get", lambda path: FakeResponse(mapping(
+        {"type": "text", "fields": {"keyword": {"type": "keyword"}}})))
+    ingest.remove_document("docs/a.md")
+    assert fake.queries == [("/documents/_delete_by_query", {"term": {"file_path.keyword": "docs/a.md"}})]
+
+    # Text-only file_path: phrase candidates, deleted by id when the key matches exactly
+    fake.queries.clear()
+    monkeypatch.setattr(retrieval, "_profiles", {})
+    monkeypatch.setattr(retrieval, "os_get", lambda path: FakeResponse(mapping({"type": "text"})))
+    ingest.remove_document("docs/a.md")
+    assert fake.queries[1] == ("/documents/_delete_by_query", {"ids": {"values": ["h0"]}})
+
+    fake.delete = {"deleted": 0, "failures": [{"cause": "shard failure"}]}
+    with pytest.raises(RuntimeError):
+        ingest.remove_document("docs/a.md")
+
+
+def test_link_goes_stale_when_the_canonical_content_changes():
+    index = NearDupIndex(threshold=0.8)
+    index.add("a_0", minhash(SHARED), "a.md")
+    index.link("b_0", "a_0", "b.md")
+
+    # Same content re-uploaded under the same doc id keeps the link
+    index.remove_source("a.md")
+    index.add("a_0", minhash(SHARED), "a.md")
+    assert index.orphans() == []
+
+    # New content under the reused doc id does not
+    index.remove_source("a.md")
+    index.add("a_0", minhash(OTHER), "a.md")
+    assert index.orphans() == ["b_0"]
+    assert index.orphan_sources() == ["b.md"]
+
+    restored = NearDupIndex.from_json(index.to_json(), threshold=0.8)
+    assert restored.orphans() == ["b_0"]
+
+
+def test_changed_or_deleted_canonical_reindexes_its_duplicates(tmp_path, monkeypatch):
+    store = str(tmp_path / "store")
+    objects = {"a.md": SHARED, "b.md": SHARED}
+    monkeypatch.setattr(ingest, "embed", fake_embed)
+    monkeypatch.setattr(ingest, "extract_text_from_text_file", lambda bucket, key: objects.get(key, ""))
+    monkeypatch.setenv("RETRIEVAL_BACKEND", "local")
+    monkeypatch.setenv("LOCAL_INDEX_PATH", store)
+    monkeypatch.setenv("NEAR_DUP_MODE", "skip")
+    dedup = NearDupIndex(threshold=0.8)
+
+    def paths():
+        return sorted(d["file_path"] for d in VectorStore(store).docs)
+
+    for key in ("a.md", "b.md"):
+        ingest.process_document("docs", key, dedup)
+    assert paths() == ["a.md"]
+
+    objects["a.md"] = OTHER
+    ingest.process_document("docs", "a.md", dedup)
+    assert ingest.reingest_orphans("docs", dedup, ingest.DedupStats()) == ["b.md"]
+    assert paths() == ["a.md", "b.md"]
+
+    # b is canonical now; deleting it brings back a duplicate of it
+    objects["c.md"] = SHARED
+    ingest.process_document("docs", "c.md", dedup)
+    ingest.remove_document("b.md", dedup)
+    assert ingest.reingest_orphans("docs", dedup, ingest.DedupStats()) == ["c.md"]
+    assert paths() == ["a.md", "c.md"]
+    assert dedup.orphans() == []
+
+
+def test_reupload_to_opensearch_replaces_the_previous_chunks(monkeypatch):
+    fake, puts = FakeOpenSearch(), []
+    monkeypatch.setattr(ingest, "os_post", fake.post)
+    monkeypatch.setattr(ingest, "os_put", lambda path, doc: puts.append(path))
+    monkeypatch.setattr(ingest, "embed", fake_embed)
+    monkeypatch.setattr(retrieval, "_profiles", {})
+    monkeypatch.setattr(retrieval, "os_get", lambda path: FakeResponse(mapping({"type": "keyword"})))
+    monkeypatch.delenv("RETRIEVAL_BACKEND", raising=False)
+    monkeypatch.setenv("NEAR_DUP_MODE", "skip")
+    dedup = NearDupIndex(threshold=0.8)
+    dedup.add("b_0", minhash(SHARED), "b.md")
+
+    # The re-upload's only chunk is now a duplicate, so nothing is written for it
+    ingest.index_text(SHARED, "a.md", "s3://docs/a.md", dedup)
+    assert fake.queries == [("/documents/_delete_by_query", {"term": {"file_path": "a.md"}})]
+    assert puts == []
@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lambdas'))
+
+from common.rerank import _stitch, merge_adjacent, mmr
+
+FIRST = "Savings plans trade a one or three year commitment for lower rates across instance families."
+SECOND = "across instance families. Reserved instances stay tied to one family and region."
+
+
+def test_per_document_cap_makes_room_for_other_documents():
+    # Three orthogonal chunks of a.md outrank everything from b.md
+    vectors = [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1], [0, 0, 0, 1]]
+    groups = ["a.md", "a.md", "a.md", "b.md", "b.md"]
+    relevance = [1.0, 0.95, 0.9, 0.5, 0.4]
+    assert mmr(relevance, vectors, 3, lambda_=0.7) == [0, 1, 2]
+    assert mmr(relevance, vectors, 3, lambda_=0.7, groups=groups, per_group_cap=2) == [0, 1, 3]
+
+
+def test_stitch_drops_the_shared_overlap():
+    assert _stitch(FIRST, SECOND) == FIRST + " Reserved instances stay tied to one family and region."
+    assert _stitch("First chunk.", "Unrelated second chunk.") == "First chunk.\nUnrelated second chunk."
+
+
+def test_merge_adjacent_joins_consecutive_chunks_at_the_best_rank():
+    passages = [
+        {"file_path": "a.md", "chunk_index": 1, "body": SECOND, "score": 0.9},
+        {"file_path": "b.md", "chunk_index": 0, "body": "Spot pricing.", "score": 0.8},
+        {"file_path": "a.md", "chunk_index": 0, "body": FIRST, "score": 0.7},
+        {"file_path": "a.md", "chunk_index": 3, "body": "Far away chunk.", "score": 0.6},
+    ]
+    out = merge_adjacent(passages)
+    assert [p["file_path"] for p in out] == ["a.md", "b.md", "a.md"]
+    assert out[0]["chunk_range"] == [0, 1]
+    assert out[0]["score"] == 0.9
+    assert out[0]["body"].count("across instance families") == 1
+    assert "chunk_range" not in out[2]
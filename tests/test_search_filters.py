@@ -0,0 +1,71 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lambdas'))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+from common import retrieval
+from common.index_admin import build_index_body, load_spec
+from common.search_filters import DEFAULT_PROFILE, index_profile, knn_query, unpushed
+
+SPEC = os.path.join(os.path.dirname(__file__), '..', 'infra', 'index-spec.json')
+
+# What a documents_v1 created before index-spec.json looks like: nmslib, dynamic text fields
+LEGACY = {"documents_v1": {"mappings": {"properties": {
+    "embedding_vector": {"type": "knn_vector", "dimension": 4,
+                         "method": {"name": "hnsw", "engine": "nmslib", "space_type": "l2"}},
+    "source_type": {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}},
+    "file_path": {"type": "text"}
+}}}}
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+def test_spec_index_filters_inside_the_graph_search():
+    mappings = {"documents_v2": {"mappings": build_index_body(load_spec(SPEC))["mappings"]}}
+    assert index_profile(mappings) == DEFAULT_PROFILE
+    query = knn_query([0.1] * 4, 5, {"source_type": ["document"]}, profile=DEFAULT_PROFILE)
+    assert query["knn"]["embedding_vector"]["filter"] == {"bool": {"filter": [{"terms": {"source_type": ["document"]}}]}}
+
+
+def test_legacy_index_post_filters_on_keyword_paths():
+    profile = index_profile(LEGACY)
+    assert profile == {"efficient": False, "fields": {"source_type": "source_type.keyword", "file_path": None}}
+    filters = {"source_type": ["document"], "file_path_prefix": "docs/"}
+    assert unpushed(filters, profile) == {"file_path_prefix": "docs/"}
+
+    query = knn_query([0.1] * 4, 5, filters, profile=profile)
+    knn = query["bool"]["must"][0]["knn"]["embedding_vector"]
+    assert "filter" not in knn and knn["k"] == 20
+    assert query["bool"]["filter"] == [{"terms": {"source_type.keyword": ["document"]}}]
+
+
+def test_backend_adapts_to_the_mapping_and_keeps_the_lexical_leg(monkeypatch):
+    sent = []
+    hits = [{"_id": str(i), "_score": 1.0, "_source": {"title": f"t{i}", "file_path": path, "source_type": "document"}}
+            for i, path in enumerate(["docs/a.md", "other/b.md", "docs/c.md"])]
+
+    def os_post(path, q):
+        sent.append(q)
+        if "knn" in str(q):
+            return FakeResponse({"error": {"type": "search_phase_execution_exception"}, "status": 400})
+        return FakeResponse({"hits": {"hits": hits}})
+
+    monkeypatch.setattr(retrieval, "_profiles", {})
+    monkeypatch.setattr(retrieval, "os_get", lambda path: FakeResponse(LEGACY))
+    monkeypatch.setattr(retrieval, "os_post", os_post)
+    monkeypatch.setattr(retrieval, "embed", lambda text: [0.1] * 4)
+
+    out = retrieval.hybrid_search("pricing", k=2, backend=retrieval.OpenSearchBackend(), diversify=False,
+                                  filters={"source_type": "document", "file_path_prefix": "docs/"})
+    assert [p["title"] for p in out] == ["t0", "t2"]
+    knn, lexical = sent
+    assert "filter" not in knn["query"]["bool"]["must"][0]["knn"]["embedding_vector"]
+    assert lexical["size"] == 8
+    assert lexical["query"]["bool"]["filter"] == [{"terms": {"source_type.keyword": ["document"]}}]
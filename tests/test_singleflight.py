@@ -0,0 +1,87 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lambdas'))
+
+from common.singleflight import AsyncSingleFlight, SingleFlight, dedupe_tasks
+
+
+def task(task_id, query, deps=()):
+    return {"id": task_id, "type": "knowledge", "inputs": {"query": query}, "deps": list(deps)}
+
+
+def test_dedupe_rewrites_dependencies_onto_the_survivor():
+    tasks = [task("t1", "ec2 pricing"), task("t2", "ec2 pricing"),
+             task("t3", "s3 tiers", deps=["t1", "t2"]), task("t4", "spot", deps=["t2"])]
+    unique, aliases = dedupe_tasks(tasks)
+    assert [t["id"] for t in unique] == ["t1", "t3", "t4"]
+    assert aliases == {"t2": "t1"}
+    assert unique[1]["deps"] == ["t1"]
+    assert unique[2]["deps"] == ["t1"]
+
+
+def run_together(flight, func, key, callers=4):
+    """Start one leader, let the other callers join it, then release it"""
+    started, release = threading.Event(), threading.Event()
+
+    def gated():
+        started.set()
+        release.wait(5)
+        return func(key)
+
+    joined = flight.coalesced + callers - 1
+    with ThreadPoolExecutor(callers) as pool:
+        futures = [pool.submit(flight.do, key, gated)]
+        started.wait(5)
+        futures += [pool.submit(flight.do, key, gated) for _ in range(callers - 1)]
+        while flight.coalesced < joined:
+            time.sleep(0.001)
+        release.set()
+    return futures
+
+
+def test_concurrent_callers_share_one_execution_and_its_error():
+    flight, calls = SingleFlight(), []
+
+    def search(query):
+        calls.append(query)
+        if query == "boom":
+            raise RuntimeError("backend down")
+        return {"query": query}
+
+    assert [f.result() for f in run_together(flight, search, "ec2")] == [{"query": "ec2"}] * 4
+    for f in run_together(flight, search, "boom"):
+        with pytest.raises(RuntimeError, match="backend down"):
+            f.result()
+    assert calls == ["ec2", "boom"]
+    assert (flight.executions, flight.coalesced) == (2, 6)
+
+
+def test_async_callers_share_one_execution_and_its_error():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def fetch(url):
+        calls.append(url)
+        await asyncio.sleep(0.01)
+        if url.endswith("bad"):
+            raise ValueError("feed unavailable")
+        return url.upper()
+
+    async def main():
+        ok = await asyncio.gather(*[flight.do("a", fetch, "feed/a") for _ in range(4)])
+        bad = await asyncio.gather(*[flight.do("b", fetch, "feed/bad") for _ in range(3)],
+                                   return_exceptions=True)
+        return ok, bad
+
+    ok, bad = asyncio.run(main())
+    assert ok == ["FEED/A"] * 4
+    assert all(isinstance(e, ValueError) for e in bad)
+    assert calls == ["feed/a", "feed/bad"]
+    assert (flight.executions, flight.coalesced) == (2, 5)
@@ -0,0 +1,39 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'lambdas'))
+
+from common.speculation import apply_speculation, matches
+
+GOAL = "Find current EC2 pricing tips for GPU batch compute"
+RESULT = {"task_id": "speculative", "passages": [{"title": "EC2 pricing"}], "elapsed_ms": 900.0}
+
+
+def knowledge(task_id, **inputs):
+    return {"id": task_id, "type": "knowledge", "inputs": inputs, "deps": []}
+
+
+def test_only_a_plain_search_on_the_goal_matches():
+    assert matches(knowledge("t1", query="  find current EC2 pricing tips for GPU batch compute? "), GOAL)
+    assert not matches(knowledge("t1", query="EC2 spot interruption rates"), GOAL)
+    # Filters change the results, so the unfiltered speculative search can't stand in
+    assert not matches(knowledge("t1", query=GOAL, filters={"source_type": "document"}), GOAL)
+    assert not matches({"id": "t2", "type": "data", "inputs": {"query": GOAL}}, GOAL)
+
+
+def test_hit_precomputes_matching_tasks_and_caps_savings_at_plan_time():
+    tasks = [knowledge("t1", query=GOAL), knowledge("t2", query=GOAL, filters={"since": "30d"})]
+    outcome = apply_speculation(tasks, GOAL, RESULT, plan_ms=600.0)
+    assert outcome == {"hit": True, "matched_task_ids": ["t1"], "latency_saved_ms": 600.0}
+    assert tasks[0]["precomputed"]["task_id"] == "t1"
+    assert "precomputed" not in tasks[1]
+
+
+def test_miss_or_failed_speculation_leaves_the_plan_alone():
+    tasks = [knowledge("t1", query="EC2 spot interruption rates")]
+    assert apply_speculation(tasks, GOAL, RESULT)["hit"] is False
+
+    tasks = [knowledge("t1", query=GOAL)]
+    outcome = apply_speculation(tasks, GOAL, {"error": "speculative search failed"})
+    assert outcome == {"hit": False, "matched_task_ids": [], "latency_saved_ms": 0.0}
+    assert "precomputed" not in tasks[0]